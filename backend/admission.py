@@ -0,0 +1,180 @@
+# backend/admission.py
+
+''' load shedding for cleanup drives, when hundreds of volunteers post at the same moment.
+
+    AdmissionMiddleware looks at two signals before anything runs (no auth, no DB, no upload parsing):
+        ML backlog     classifier jobs running in this worker (metrics.backlog). new posts and
+                       uploads are what feed it, so writes under /posts and /images get a 503 past ML_BACKLOG_LIMIT
+        pool pressure  requests waiting for a DB connection right now and the recent wait time
+                       (database.pool_pressure). writes are shed early, reads only once it's far worse,
+                       so browsing the map and feed keeps working while posting backs off
+    RateLimiter is a per user token bucket used as a route dependency on the write endpoints (429), the two
+    idempotent ones call it inside their work() so a replayed response costs no token (see idempotency.py).
+    every refusal is fast and carries Retry-After. all state is per worker process, like the response cache.
+'''
+
+import os
+import math
+import time
+import json
+from collections import OrderedDict
+from fastapi import HTTPException, Request, status
+from jose import JWTError, jwt
+
+import metrics
+from database import pool_pressure
+from auth_utils import SECRET_KEY, ALGORITHM
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "True") == "True"
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True") == "True"
+
+ML_BACKLOG_LIMIT = int(os.getenv("ML_BACKLOG_LIMIT", "50"))
+# writes give way first, reads only when the pool is badly stuck
+WRITE_POOL_WAIT_MS = float(os.getenv("WRITE_POOL_WAIT_MS", "250"))
+READ_POOL_WAIT_MS = float(os.getenv("READ_POOL_WAIT_MS", "2000"))
+WRITE_POOL_WAITERS = int(os.getenv("WRITE_POOL_WAITERS", "10"))
+READ_POOL_WAITERS = int(os.getenv("READ_POOL_WAITERS", "100"))
+MAX_RETRY_AFTER = int(os.getenv("MAX_RETRY_AFTER", "60"))
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+ML_WRITE_PREFIXES = ("/posts", "/images")
+EXEMPT_PATHS = {"/", "/metrics", "/cache/stats", "/debug/traces"}
+
+
+def _retry_after(seconds: float) -> int:
+    return max(1, min(MAX_RETRY_AFTER, math.ceil(seconds)))
+
+
+# --- ADMISSION ---
+
+#(reason, retry_after) when the request should be shed, None when it can go through
+def check(method: str, path: str):
+    is_read = method in READ_METHODS
+
+    if not is_read and path.startswith(ML_WRITE_PREFIXES) and metrics.backlog.pending >= ML_BACKLOG_LIMIT:
+        #jobs run concurrently, so the backlog drains in about (backlog / limit) job durations
+        return "ml_backlog", _retry_after(metrics.backlog.ewma_seconds * metrics.backlog.pending / ML_BACKLOG_LIMIT)
+
+    wait_limit, waiters_limit = (READ_POOL_WAIT_MS, READ_POOL_WAITERS) if is_read else (WRITE_POOL_WAIT_MS, WRITE_POOL_WAITERS)
+    wait_ms = pool_pressure.wait_ms()
+    if wait_ms >= wait_limit or pool_pressure.waiting >= waiters_limit:
+        return "db_pool", _retry_after(2 * wait_ms / 1000)
+    return None
+
+
+class AdmissionMiddleware:
+    '''pure ASGI, answers 503 + Retry-After before routing when the worker is overloaded'''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_ENABLED or scope["path"] in EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+
+        verdict = check(scope["method"], scope["path"])
+        if verdict is None:
+            return await self.app(scope, receive, send)
+
+        reason, retry_after = verdict
+        metrics.ADMISSION_REJECTED.labels(reason, "read" if scope["method"] in READ_METHODS else "write").inc()
+        body = json.dumps({"detail": "Server is busy, please retry shortly", "reason": reason}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# --- RATE LIMITS ---
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens, self.updated = tokens, now
+
+
+class RateLimiter:
+    ''' per user token bucket, used as a route dependency:
+            @router.post("/", dependencies=[Depends(admission.post_writes)])
+        the user comes from the bearer token's subject (one HMAC check, no DB lookup), anonymous or
+        invalid tokens are keyed by client address and then rejected by the real auth dependency
+    '''
+
+    def __init__(self, name: str, per_minute: float, burst: int, max_keys: int = 10000):
+        self.name = name
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+
+    #seconds until the next token, 0 when this call may go ahead (and a token was taken)
+    def take(self, key: str) -> float:
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.burst, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / self.rate
+
+    async def __call__(self, request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+        wait = self.take(client_key(request))
+        if wait:
+            metrics.RATE_LIMITED.labels(self.name).inc()
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, slow down",
+                headers={"Retry-After": str(_retry_after(wait))},
+            )
+
+
+def client_key(request: Request) -> str:
+    auth = request.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        try:
+            subject = jwt.decode(auth[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+            if subject:
+                return f"user:{subject}"
+        except JWTError:
+            pass
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+# posts: create, start / submit / approve, edits. uploads: the image endpoints. exports: GET /posts/export
+# syncs: GET /sync pages, a first sync of a big board is a few dozen of them in a row
+post_writes = RateLimiter(
+    "posts",
+    per_minute=float(os.getenv("RATE_LIMIT_POSTS_PER_MIN", "20")),
+    burst=int(os.getenv("RATE_LIMIT_POSTS_BURST", "5")),
+)
+upload_writes = RateLimiter(
+    "uploads",
+    per_minute=float(os.getenv("RATE_LIMIT_UPLOADS_PER_MIN", "30")),
+    burst=int(os.getenv("RATE_LIMIT_UPLOADS_BURST", "10")),
+)
+exports = RateLimiter(
+    "exports",
+    per_minute=float(os.getenv("RATE_LIMIT_EXPORTS_PER_MIN", "2")),
+    burst=int(os.getenv("RATE_LIMIT_EXPORTS_BURST", "3")),
+)
+syncs = RateLimiter(
+    "syncs",
+    per_minute=float(os.getenv("RATE_LIMIT_SYNCS_PER_MIN", "60")),
+    burst=int(os.getenv("RATE_LIMIT_SYNCS_BURST", "30")),
+)
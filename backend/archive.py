@@ -0,0 +1,89 @@
+# backend/archive.py
+
+''' moves old COMPLETED / CANCELLED posts (with their comments and likes) into the *_archive tables,
+    so the live posts table only grows with the active board. runs as a scheduler job (see scheduler.py),
+    every ARCHIVE_INTERVAL_SECONDS on the leader worker. batches are still claimed with SKIP LOCKED on postgres,
+    so a manual run next to it never moves the same rows twice.
+'''
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, insert, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import cache
+import tiles
+from database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+ARCHIVER_ENABLED = os.getenv("ARCHIVER_ENABLED", "True") == "True"
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+#INSERT INTO x_archive (...) SELECT ... FROM x, every column but archived_at (models.utcnow, once per statement)
+def _copy(model, archive_model, where):
+    names = [c.name for c in archive_model.__table__.columns if c.name != "archived_at"]
+    source = select(*[model.__table__.c[n] for n in names]).where(where)
+    return insert(archive_model.__table__).from_select(names, source)
+
+#moves one batch, returns how many posts were archived
+async def archive_batch(db: AsyncSession, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    claim = (
+        select(models.Post.id, models.Post.latitude, models.Post.longitude, models.Post.status, models.Post.predicted_class)
+        .where(
+            models.Post.status.in_(models.FINISHED_STATUSES),
+            models.Post.created_at < cutoff,
+        )
+        .order_by(models.Post.created_at)
+        .limit(batch_size)
+    )
+    if db.bind.dialect.name == "postgresql":
+        claim = claim.with_for_update(skip_locked=True)
+    claimed = (await db.execute(claim)).all()
+    ids = [row.id for row in claimed]
+    if not ids:
+        await db.rollback()
+        return 0
+
+    try:
+        await db.execute(_copy(models.Post, models.ArchivedPost, models.Post.id.in_(ids)))
+        await db.execute(_copy(models.Comment, models.ArchivedComment, models.Comment.post_id.in_(ids)))
+        await db.execute(_copy(models.Like, models.ArchivedLike, models.Like.post_id.in_(ids)))
+
+        #live duplicates can't point at a row that is leaving, the archive copy keeps the link
+        await db.execute(
+            update(models.Post)
+            .where(models.Post.duplicate_of_id.in_(ids), models.Post.id.notin_(ids))
+            .values(duplicate_of_id=None)
+        )
+        await db.execute(delete(models.Like).where(models.Like.post_id.in_(ids)))
+        await db.execute(delete(models.Comment).where(models.Comment.post_id.in_(ids)))
+        await db.execute(delete(models.Post).where(models.Post.id.in_(ids)))
+        #map clusters only count live posts, same transaction so they never drift
+        await tiles.apply_many(db, [(r.latitude, r.longitude, r.status, r.predicted_class) for r in claimed], -1)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return len(ids)
+
+#archives everything past the cutoff, batch by batch (each batch is its own short transaction)
+async def archive_old_posts(older_than_days: int = ARCHIVE_AFTER_DAYS) -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    total = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            moved = await archive_batch(db, cutoff)
+            total += moved
+            if moved < ARCHIVE_BATCH_SIZE:
+                break
+            await asyncio.sleep(0)    # let requests in between batches
+    if total:
+        await cache.bump("posts", "comments")
+        logger.info(f"[Archiver] moved {total} finished posts to the archive")
+    return total
@@ -3,7 +3,6 @@
 import os
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer 
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,6 +11,7 @@ import logging
 from database import get_db
 import crud
 import schemas
+import passwords
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -25,17 +25,17 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 40000  # around 30 days
 
 # --- 1. PASSWORD HASHING (Argon2) ---
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# the shared context lives in passwords.py
 
 # --- 2. OAUTH CONFIG ---
 # This specific URL fixes the "Authorize" button in Swagger UI
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return passwords.verify_password(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return passwords.hash_password(password)
 
 async def authenticate_user(db: AsyncSession, username: str, password: str):
     # We look up by username because the login form sends 'username' field
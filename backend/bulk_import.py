@@ -0,0 +1,246 @@
+# backend/bulk_import.py
+
+''' POST /posts/bulk: partner survey dumps, one report per NDJSON line (the PostCreate shape).
+
+    the body is read as it streams in and validated line by line, nothing is buffered past one batch.
+    every BULK_BATCH_SIZE valid rows go in with one executemany INSERT .. RETURNING id, one summed
+    tile_aggregates upsert and the job's counters, committed together. a failure only loses the
+    batch in flight, earlier batches stay. the first MAX_REPORTED_ERRORS bad lines are kept with
+    their line number and reason, the rest are only counted.
+
+    each committed batch queues ONE background job that classifies its posts (BULK_CLASSIFY_CONCURRENCY
+    calls at a time, the classifier batches them on its side) and writes all results in one transaction.
+    the batches run one after another after the response, so an import never has more than
+    BULK_CLASSIFY_CONCURRENCY classifier calls open. they are kept out of metrics.backlog: a 50k row
+    import is 100 jobs, and counting them would make admission.py shed every interactive post and
+    upload on the worker until the import is classified.
+    progress lives in import_jobs, so GET /posts/bulk/{job_id} works from any worker.
+    rows skip the near-duplicate lookup, the duplicate index picks them up by primary key later. their
+    image_hash is the one image_hashes already has for the user's own upload (one query per batch), if any.
+'''
+
+import os
+import json
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timezone
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, engine
+import models
+import schemas
+import storage
+import tiles
+import cache
+import dedup
+import metrics
+
+logger = logging.getLogger(__name__)
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "50000"))
+BULK_MAX_LINE_BYTES = int(os.getenv("BULK_MAX_LINE_BYTES", str(16 * 1024)))
+BULK_CLASSIFY_CONCURRENCY = int(os.getenv("BULK_CLASSIFY_CONCURRENCY", "4"))
+MAX_REPORTED_ERRORS = 100
+SQLITE = engine.dialect.name == "sqlite"
+
+
+class LineTooLong(Exception):
+    pass
+
+#splits the streamed body into lines without ever holding more than one partial line
+async def iter_lines(stream):
+    pending = b""
+    async for chunk in stream:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line
+        if len(pending) > BULK_MAX_LINE_BYTES:
+            raise LineTooLong()
+    if pending:
+        yield pending
+
+def _row_error(e: ValidationError) -> str:
+    first = e.errors()[0]
+    where = ".".join(str(part) for part in first["loc"])
+    return f"{where}: {first['msg']}" if where else first["msg"]
+
+
+class Importer:
+    def __init__(self, db: AsyncSession, user_id: int, classify, background_tasks):
+        self.db = db
+        self.user_id = user_id
+        self.classify = classify
+        self.background_tasks = background_tasks
+        self.job_id = uuid.uuid4().hex
+        self.batch = []
+        self.rows_read = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line_no: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_no, "error": error})
+
+    #PostCreate -> insert parameters, or an error message
+    def to_row(self, post: schemas.PostCreate):
+        image_url = post.image_url
+        if storage.SIGNED_UPLOADS:
+            #same rule as a single post, but without a storage round trip per row: the upload must be
+            #the user's own and its url is rebuilt from the public_id instead of trusting the row
+            if not storage.owns_public_id(post.image_public_id, self.user_id):
+                return None, "image_public_id: not an upload of this user"
+            image_url = storage.get_storage().url(post.image_public_id)
+        return {
+            "image_url": image_url,
+            "image_public_id": post.image_public_id,
+            "caption": post.caption,
+            "latitude": post.latitude,
+            "longitude": post.longitude,
+            "predicted_class": "Analysing",
+            "points": 0,
+            "author_id": self.user_id,
+            "status": models.TaskStatus.OPEN,
+            "import_job_id": self.job_id,   # the sweeper leaves these to classify_batch while the job runs
+        }, None
+
+    async def run(self, stream) -> models.ImportJob:
+        self.db.add(models.ImportJob(id=self.job_id, user_id=self.user_id, status="importing"))
+        await self.db.commit()
+
+        line_no = 0
+        try:
+            async for line in iter_lines(stream):
+                line_no += 1
+                if not line.strip():
+                    continue
+                if self.rows_read >= BULK_MAX_ROWS:
+                    self.reject(line_no, f"more than {BULK_MAX_ROWS} rows, the rest of the file was ignored")
+                    break
+                self.rows_read += 1
+                try:
+                    row, error = self.to_row(schemas.PostCreate.model_validate_json(line))
+                except ValidationError as e:
+                    row, error = None, _row_error(e)
+                if error:
+                    self.reject(line_no, error)
+                    continue
+                self.batch.append(row)
+                if len(self.batch) >= BULK_BATCH_SIZE:
+                    await self.flush()
+            await self.flush()
+        except LineTooLong:
+            self.reject(line_no + 1, f"line longer than {BULK_MAX_LINE_BYTES} bytes, the rest of the file was ignored")
+            await self.flush()
+        except Exception:
+            await self.db.rollback()
+            await self.finish("failed")
+            raise
+        return await self.finish()
+
+    #one bounded transaction: the posts, their tile counts and the job's progress
+    async def flush(self):
+        if not self.batch:
+            await self.save_progress(0)
+            await self.db.commit()
+            return
+        rows, self.batch = self.batch, []
+        own = [r["image_public_id"] for r in rows if storage.owns_public_id(r["image_public_id"], self.user_id)]
+        hashes = await dedup.known_hashes(self.db, own)
+        for r in rows:
+            r["image_hash"] = hashes.get(r["image_public_id"])
+        #postgres batches the ordered RETURNING with insertmanyvalues. sqlite can't guarantee the order and
+        #would fall back to one INSERT per row, but it gives out rowids in insert order (max + 1, single
+        #writer), so the sorted ids line up with the rows
+        result = await self.db.execute(
+            insert(models.Post).returning(models.Post.id, sort_by_parameter_order=not SQLITE), rows
+        )
+        ids = result.scalars().all()
+        if SQLITE:
+            ids = sorted(ids)
+        await tiles.apply_many(self.db, [(r["latitude"], r["longitude"], r["status"], r["predicted_class"]) for r in rows], +1)
+        await self.save_progress(len(ids))
+        await self.db.commit()
+        await cache.bump("posts")
+
+        items = [(post_id, storage.classifier_image_url(r["image_public_id"], r["image_url"])) for post_id, r in zip(ids, rows)]
+        metrics.queue_job(self.background_tasks, "classify_bulk", classify_batch, self.job_id, items, self.classify, interactive=False)
+
+    async def save_progress(self, inserted: int):
+        job = models.ImportJob
+        await self.db.execute(
+            update(job).where(job.id == self.job_id).values(
+                rows_read=self.rows_read,
+                rejected=self.rejected,
+                inserted=job.inserted + inserted,
+                errors=json.dumps(self.errors) if self.errors else None,
+            )
+        )
+
+    async def finish(self, status: str = None) -> models.ImportJob:
+        job = await self.db.get(models.ImportJob, self.job_id, populate_existing=True)
+        job.rows_read, job.rejected = self.rows_read, self.rejected
+        job.errors = json.dumps(self.errors) if self.errors else None
+        job.status = status or ("classifying" if job.inserted else "done")
+        if job.status != "classifying":
+            job.finished_at = datetime.now(timezone.utc)
+        await self.db.commit()
+        return job
+
+
+''' background job for one committed batch. classify(post_id, url) is the single post classifier call
+    (routers/posts.request_classification): a dict, None when the classifier answered with an error
+    (the post stays "Analysing", like a single post) or an exception (the post becomes "ERROR")
+'''
+async def classify_batch(job_id: str, items, classify):
+    gate = asyncio.Semaphore(BULK_CLASSIFY_CONCURRENCY)
+
+    async def one(post_id, url):
+        async with gate:
+            try:
+                return post_id, await classify(post_id, url)
+            except Exception as e:
+                logger.error(f"[Bulk {job_id}] ML Error for post {post_id}: {e}")
+                return post_id, e
+
+    results = dict(await asyncio.gather(*(one(post_id, url) for post_id, url in items)))
+
+    async with AsyncSessionLocal() as db:
+        posts = (await db.execute(select(models.Post).where(models.Post.id.in_(results)))).scalars().all()
+        before, after = [], []
+        classified = failed = 0
+        for post in posts:
+            data = results[post.id]
+            if isinstance(data, dict):
+                classified += 1
+                new_class, points = data.get("predicted_class", "Unknown"), int(data.get("points", 0))
+            else:
+                failed += 1
+                if data is None:
+                    continue
+                new_class, points = "ERROR", 0
+            before.append((post.latitude, post.longitude, post.status, post.predicted_class))
+            post.predicted_class, post.points = new_class, points
+            after.append((post.latitude, post.longitude, post.status, post.predicted_class))
+        await tiles.move_many(db, before, after)
+
+        job = models.ImportJob
+        await db.execute(
+            update(job).where(job.id == job_id).values(
+                classified=job.classified + classified,
+                classify_failed=job.classify_failed + failed,
+            )
+        )
+        await db.execute(
+            update(job)
+            .where(job.id == job_id, job.status == "classifying", job.classified + job.classify_failed >= job.inserted)
+            .values(status="done", finished_at=datetime.now(timezone.utc))
+        )
+        await db.commit()
+    await cache.bump("posts")
+    logger.info(f"[Bulk {job_id}] classified {classified} posts, {failed} failed")
@@ -0,0 +1,188 @@
+# backend/cache.py
+
+''' HTTP response cache for the endpoints the app polls: feed, leaderboard, comments.
+
+    every cached route depends on a few "resources" (posts, comments, points). each resource has a
+    version counter that the mutating endpoints bump after commit. the ETag of a response is derived
+    from the path, query and the versions, so:
+      - If-None-Match with the current ETag  -> 304, no DB work at all
+      - same ETag rendered before             -> body straight from the LRU, no DB work
+      - anything else                         -> normal request, body stored under its ETag
+
+    versions live in this process by default (single worker). with REDIS_URL set they live in redis
+    so every worker sees every bump, and rendered bodies are shared too.
+'''
+
+import os
+import time
+import uuid
+import hashlib
+import logging
+from collections import OrderedDict
+
+try:
+    import redis.asyncio as aioredis  # optional dependency, only for multi worker setups
+except ImportError:
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "True") == "True"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))              # bodies kept in the LRU
+RESPONSE_CACHE_MAX_BODY = int(os.getenv("RESPONSE_CACHE_MAX_BODY", str(512 * 1024)))
+# without redis other workers can't see our bumps, so in-process ETags also roll over every TTL seconds
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "30"))
+REDIS_URL = os.getenv("REDIS_URL")
+
+# path -> (resources it depends on, DB statements one uncached request costs)
+CACHED_ROUTES = {
+    "/posts/": (("posts", "comments", "points"), 6),   # main query + 5 selectinloads
+    "/users/leaderboard": (("points",), 1),
+    "/comments/": (("comments", "points"), 2),         # comments + their authors
+}
+
+
+class ResponseCache:
+    def __init__(self):
+        self.versions = {}
+        self.bodies = OrderedDict()     # etag -> (body, content_type)
+        self.boot = uuid.uuid4().hex[:8]    # a restart must never turn an old ETag into a 304
+        self.redis = aioredis.from_url(REDIS_URL) if (REDIS_URL and aioredis) else None
+        self.stats = {"hits": 0, "not_modified": 0, "misses": 0, "db_queries_avoided": 0}
+
+    async def bump(self, *resources):
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                for r in resources:
+                    pipe.incr(f"cache:version:{r}")
+                await pipe.execute()
+                return
+            except Exception as e:
+                logger.error(f"[Cache] redis bump failed, falling back to local versions: {e}")
+        for r in resources:
+            self.versions[r] = self.versions.get(r, 0) + 1
+
+    async def etag(self, path: str, query: str, resources) -> str:
+        if self.redis is not None:
+            try:
+                values = await self.redis.mget([f"cache:version:{r}" for r in resources])
+                versions = ":".join((v or b"0").decode() for v in values)
+                return self._hash(path, query, "redis", versions)
+            except Exception as e:
+                logger.error(f"[Cache] redis unavailable: {e}")
+        versions = ":".join(str(self.versions.get(r, 0)) for r in resources)
+        bucket = int(time.time() // RESPONSE_CACHE_TTL)
+        return self._hash(path, query, self.boot, versions, bucket)
+
+    @staticmethod
+    def _hash(*parts) -> str:
+        return '"' + hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:20] + '"'
+
+    async def get_body(self, etag: str):
+        entry = self.bodies.get(etag)
+        if entry is not None:
+            self.bodies.move_to_end(etag)
+            return entry
+        if self.redis is not None:
+            try:
+                stored = await self.redis.hgetall(f"cache:body:{etag}")
+                if stored:
+                    entry = (stored[b"body"], stored[b"type"])
+                    self._remember(etag, entry)
+                    return entry
+            except Exception:
+                pass
+        return None
+
+    async def put_body(self, etag: str, body: bytes, content_type: bytes):
+        self._remember(etag, (body, content_type))
+        if self.redis is not None:
+            try:
+                key = f"cache:body:{etag}"
+                pipe = self.redis.pipeline()
+                pipe.hset(key, mapping={"body": body, "type": content_type})
+                pipe.expire(key, RESPONSE_CACHE_TTL * 10)
+                await pipe.execute()
+            except Exception:
+                pass
+
+    def _remember(self, etag, entry):
+        self.bodies[etag] = entry
+        self.bodies.move_to_end(etag)
+        while len(self.bodies) > RESPONSE_CACHE_SIZE:
+            self.bodies.popitem(last=False)
+
+    def report(self) -> dict:
+        served = self.stats["hits"] + self.stats["not_modified"]
+        total = served + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": round(served / total, 4) if total else 0.0,
+            "entries": len(self.bodies),
+            "backend": "redis" if self.redis is not None else "local",
+        }
+
+
+cache = ResponseCache()
+
+async def bump(*resources):
+    await cache.bump(*resources)
+
+
+class ETagCacheMiddleware:
+    '''pure ASGI middleware in front of the CACHED_ROUTES, everything else passes straight through'''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        route = CACHED_ROUTES.get(scope.get("path")) if scope["type"] == "http" else None
+        if route is None or not RESPONSE_CACHE_ENABLED or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+
+        resources, statements = route
+        query = scope.get("query_string", b"").decode()
+        query = "&".join(sorted(query.split("&"))) if query else ""
+        etag = await cache.etag(scope["path"], query, resources)
+        if_none_match = dict(scope["headers"]).get(b"if-none-match", b"").decode()
+
+        if etag in [t.strip() for t in if_none_match.split(",")]:
+            cache.stats["not_modified"] += 1
+            cache.stats["db_queries_avoided"] += statements
+            return await self._send(send, 304, b"", None, etag)
+
+        entry = await cache.get_body(etag)
+        if entry is not None:
+            cache.stats["hits"] += 1
+            cache.stats["db_queries_avoided"] += statements
+            return await self._send(send, 200, entry[0], entry[1], etag)
+
+        cache.stats["misses"] += 1
+        captured = {"status": None, "type": None, "body": []}
+
+        async def capturing_send(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                headers = list(message.get("headers", []))
+                captured["type"] = dict(headers).get(b"content-type")
+                if message["status"] == 200:
+                    headers += [(b"etag", etag.encode()), (b"cache-control", b"no-cache")]
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                captured["body"].append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, capturing_send)
+
+        body = b"".join(captured["body"])
+        if captured["status"] == 200 and len(body) <= RESPONSE_CACHE_MAX_BODY:
+            await cache.put_body(etag, body, captured["type"] or b"application/json")
+
+    async def _send(self, send, status, body, content_type, etag):
+        headers = [(b"etag", etag.encode()), (b"cache-control", b"no-cache")]
+        if content_type:
+            headers.append((b"content-type", content_type))
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -3,14 +3,8 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload # <--- Imported for relationship loading
-from passlib.context import CryptContext
 import models, schemas
-
-# Setup password hashing (Argon2)
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
+from passwords import hash_password as get_password_hash
 
 # --- USER OPERATIONS ---
 
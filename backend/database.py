@@ -1,11 +1,21 @@
 # backend/database.py
 
 import os
+import re
+import time
 import logging
 import ssl
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from dotenv import load_dotenv
+import tracing
 
 load_dotenv()
 
@@ -42,16 +52,248 @@ if "postgresql" in DATABASE_URL:
     
     connect_args["ssl"] = ctx
 
-# Create the engine with the SSL args
-engine = create_async_engine(
-    DATABASE_URL,
-    connect_args=connect_args,
-    echo=False # Set to True if you want to see SQL queries in logs
-)
+# --- POOL PRESSURE ---
+''' how long requests wait for a pooled connection. TimedQueuePool wraps every checkout,
+    admission.py reads waiting (right now) and wait_ms() (recent, decays while nobody checks out)
+    to shed load before the pool becomes everyone's bottleneck
+'''
+POOL_WAIT_HALF_LIFE = float(os.getenv("POOL_WAIT_HALF_LIFE", "2"))   # seconds
+
+class PoolPressure:
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.waiting = 0
+        self.ewma_ms = 0.0
+        self.updated = time.monotonic()
+
+    @contextmanager
+    def measure(self):
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.waiting -= 1
+            self.observe((time.perf_counter() - start) * 1000)
+
+    def observe(self, ms: float):
+        current = self.wait_ms()
+        self.ewma_ms = current + self.alpha * (ms - current)
+        self.updated = time.monotonic()
+
+    def wait_ms(self) -> float:
+        return self.ewma_ms * 0.5 ** ((time.monotonic() - self.updated) / POOL_WAIT_HALF_LIFE)
+
+pool_pressure = PoolPressure()
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    #_do_get is where every checkout blocks when the pool is exhausted
+    def _do_get(self):
+        with pool_pressure.measure():
+            return super()._do_get()
+
+# --- SQLITE PROFILE ---
+''' single node deployments on a sqlite file. every connection gets WAL (readers and the writer stop blocking
+    each other), synchronous=NORMAL (safe with WAL, fsyncs at checkpoints instead of every commit), a
+    busy_timeout, mmap and a bigger page cache.
+    writes go through ONE writer connection per process (a pool of 1, so writers queue in the pool, and
+    pool_pressure / admission see the queue, instead of fighting over the file lock). its transactions start
+    with BEGIN IMMEDIATE, so they hold the write lock from the first statement rather than failing with
+    "database is locked" when a read turns into a write. reads use SQLITE_READERS query_only connections.
+    RoutingSession sends a transaction's statements to the readers until it writes something, from then on
+    to the writer, so a transaction always sees its own writes. several uvicorn workers each get their own
+    writer and wait for each other through busy_timeout. SQLITE_TUNING=False gives the plain aiosqlite engine.
+'''
+SQLITE_TUNING = os.getenv("SQLITE_TUNING", "True") == "True"
+SQLITE_READERS = int(os.getenv("SQLITE_READERS", "8"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", str(64 * 1024)))
+
+#in-memory databases can't be shared between connections, they keep the plain engine
+def _sqlite_file(url: str) -> bool:
+    database = make_url(url).database
+    return bool(database) and database != ":memory:" and "mode=memory" not in url
+
+def _tune_sqlite(async_engine, writer: bool):
+    pragmas = [
+        "journal_mode=WAL",
+        "synchronous=NORMAL",
+        f"busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"mmap_size={SQLITE_MMAP_BYTES}",
+        f"cache_size=-{SQLITE_CACHE_KB}",   # negative = KiB
+        "temp_store=MEMORY",
+    ]
+    if not writer:
+        pragmas.append("query_only=ON")   # a write that missed the writer fails loudly
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None   # the driver's own implicit BEGIN is off, _begin decides
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+
+    @event.listens_for(async_engine.sync_engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if writer else "BEGIN")
+
+SQLITE_PROFILE = "sqlite" in DATABASE_URL and SQLITE_TUNING and _sqlite_file(DATABASE_URL)
+
+if SQLITE_PROFILE:
+    engine = create_async_engine(DATABASE_URL, poolclass=TimedQueuePool, pool_size=1, max_overflow=0)
+    read_engine = create_async_engine(DATABASE_URL, poolclass=TimedQueuePool, pool_size=SQLITE_READERS, max_overflow=0)
+    _tune_sqlite(engine, writer=True)
+    _tune_sqlite(read_engine, writer=False)
+else:
+    # Create the engine with the SSL args
+    engine = create_async_engine(
+        DATABASE_URL,
+        connect_args=connect_args,
+        poolclass=TimedQueuePool if "postgresql" in DATABASE_URL else None,   # sqlite keeps its default pool
+        echo=False # Set to True if you want to see SQL queries in logs
+    )
+    read_engine = engine
+ENGINES = [engine] if read_engine is engine else [engine, read_engine]
+
+async def dispose_engines():
+    for e in ENGINES:
+        await e.dispose()
 # ------------------------------
 
+# --- QUERY INSTRUMENTATION ---
+''' every statement the engine runs is counted and timed against the current request (a contextvar
+    set by QueryStatsMiddleware). with SQL_DEBUG=True the totals go out as X-DB-Statements / X-DB-Time-Ms
+    response headers. the same statement shape running N_PLUS_ONE_THRESHOLD+ times in one request is
+    logged as a likely N+1, statements slower than SLOW_QUERY_MS are logged with their parameters redacted
+'''
+SQL_DEBUG = os.getenv("SQL_DEBUG") == "True"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement: str, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.shapes[statement_shape(statement)] += 1
+
+    def n_plus_one(self):
+        return [(shape, n) for shape, n in self.shapes.items() if n >= N_PLUS_ONE_THRESHOLD]
+
+query_stats: ContextVar = ContextVar("query_stats", default=None)
+
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|\$\d+|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|\$\d+|%\(\w+\)s|:\w+))*\s*\)")
+_NUMBERED = re.compile(r"\$\d+")
+_SPACES = re.compile(r"\s+")
+
+#"same query, different ids": placeholders and IN lists collapse so repeats compare equal
+def statement_shape(statement: str) -> str:
+    shape = _NUMBERED.sub("?", _SPACES.sub(" ", statement).strip())
+    return _PLACEHOLDER_LIST.sub("(?)", shape)
+
+#only the parameter types make it into the logs, never the values (passwords, emails, tokens)
+def redact(parameters):
+    if isinstance(parameters, dict):
+        return {k: type(v).__name__ for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):    # executemany
+            return f"<{len(parameters)} rows>"
+        return [type(v).__name__ for v in parameters]
+    return type(parameters).__name__
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+    stats = query_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed_ms)
+    if tracing.is_sampled():
+        tracing.record("db", elapsed_ms, statement=statement_shape(statement)[:300])
+    if elapsed_ms >= SLOW_QUERY_MS:
+        logger.warning(f"[SQL] slow query {elapsed_ms:.1f}ms: {statement_shape(statement)[:500]} params={redact(parameters)}")
+
+#the failed statement never reaches after_cursor_execute, drop its start time
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get("query_start"):
+        context.connection.info["query_start"].pop()
+
+for _engine in ENGINES:
+    event.listen(_engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(_engine.sync_engine, "handle_error", _handle_error)
+
+
+class QueryStatsMiddleware:
+    '''pure ASGI, gives every request its own QueryStats'''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats()
+        token = query_stats.set(stats)
+
+        async def send_wrapper(message):
+            if SQL_DEBUG and message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"x-db-statements", str(stats.count).encode()),
+                    (b"x-db-time-ms", f"{stats.total_ms:.2f}".encode()),
+                ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            query_stats.reset(token)
+            for shape, n in stats.n_plus_one():
+                logger.warning(f"[SQL] possible N+1 on {scope['method']} {scope['path']}: {n}x {shape[:300]}")
+
+
+''' for tests and benches: counts everything run inside the block and fails past the budget
+        with statement_budget(4):
+            await get_feed(skip=0, limit=20, db=db)
+'''
+@contextmanager
+def statement_budget(max_statements: int):
+    stats = QueryStats()
+    token = query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        query_stats.reset(token)
+    if stats.count > max_statements:
+        raise AssertionError(
+            f"{stats.count} SQL statements, budget is {max_statements}: "
+            + "; ".join(f"{n}x {shape[:120]}" for shape, n in stats.shapes.most_common(5))
+        )
+
+#sqlite profile: reads on the reader pool until the transaction writes, then everything on the writer
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.info.get("wrote") or self._flushing or isinstance(clause, UpdateBase):
+            self.info["wrote"] = True
+            return engine.sync_engine
+        return read_engine.sync_engine
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_routing(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("wrote", None)
+
 AsyncSessionLocal = sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False
+    engine, class_=AsyncSession, expire_on_commit=False,
+    sync_session_class=RoutingSession if SQLITE_PROFILE else Session
 )
 
 Base = declarative_base()
@@ -0,0 +1,183 @@
+# backend/dedup.py
+
+''' near duplicate report detection.
+    every open task with an image_hash lives in an in-process BK-tree keyed by hamming distance,
+    a lookup is "hashes within N bits" (tree search, sub-millisecond) + "within X meters" (haversine on the few hits)
+    hashes are ours, never the client's: image_hashes keeps the dhash of every upload by public_id, filled when
+    /images/upload/ (or the local stand-in) stores the image, or by hashing the stored image for signed uploads
+'''
+
+import os
+import math
+import asyncio
+import logging
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import storage
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_MAX_HAMMING = int(os.getenv("DUPLICATE_MAX_HAMMING", "10"))          # out of 64 bits
+DUPLICATE_RADIUS_METERS = float(os.getenv("DUPLICATE_RADIUS_METERS", "50"))
+
+# a report can only duplicate a task nobody has finished yet
+ACTIVE_STATUSES = models.ACTIVE_STATUSES
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+def distance_meters(lat1, lon1, lat2, lon2) -> float:
+    r = 6371000.0
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * r * math.asin(math.sqrt(a))
+
+
+class BKTree:
+    '''metric tree over 64 bit hashes, children are keyed by their distance to the parent'''
+
+    def __init__(self):
+        self.root = None    # [hash, [post_ids], {distance: child}]
+        self.size = 0
+
+    def add(self, value: int, post_id: int):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [post_id], {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(value, node[0])
+            if d == 0:
+                node[1].append(post_id)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [post_id], {}]
+                return
+            node = child
+
+    #every (distance, post_id) within radius bits of value
+    def search(self, value: int, radius: int):
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            d = hamming(value, node[0])
+            if d <= radius:
+                found.extend((d, post_id) for post_id in node[1])
+            #triangle inequality: only children with |k - d| <= radius can hold matches
+            for k, child in node[2].items():
+                if d - radius <= k <= d + radius:
+                    stack.append(child)
+        return found
+
+
+class DuplicateIndex:
+    ''' one per worker. it catches up with the posts table by primary key on every lookup
+        (posts created by other workers included), removals are lazy: a hit whose task is no
+        longer active is dropped when we check it against the DB
+    '''
+
+    def __init__(self):
+        self.tree = BKTree()
+        self.locations = {}     # post_id -> (hash, lat, lon), only live entries
+        self.last_post_id = 0
+        self.lock = asyncio.Lock()
+
+    def add(self, post_id: int, image_hash: str, lat: float, lon: float):
+        if post_id in self.locations:
+            return
+        value = int(image_hash, 16)
+        self.tree.add(value, post_id)
+        self.locations[post_id] = (value, lat, lon)
+
+    def discard(self, post_id: int):
+        self.locations.pop(post_id, None)
+        #dead entries stay in the tree until they outnumber the live ones, then rebuild
+        if self.tree.size > 2 * len(self.locations) + 1000:
+            self._rebuild()
+
+    def _rebuild(self):
+        self.tree = BKTree()
+        for post_id, (value, _, _) in self.locations.items():
+            self.tree.add(value, post_id)
+
+    #loads originals (not duplicates) with a hash created since the last sync, an indexed PK range
+    async def sync(self, db: AsyncSession):
+        async with self.lock:
+            #cap the range first so rows committed mid-sync are picked up next time, not skipped
+            newest = (await db.execute(select(func.max(models.Post.id)))).scalar() or 0
+            query = (
+                select(models.Post.id, models.Post.image_hash, models.Post.latitude, models.Post.longitude)
+                .where(
+                    models.Post.id > self.last_post_id,
+                    models.Post.id <= newest,
+                    models.Post.image_hash.isnot(None),
+                    models.Post.duplicate_of_id.is_(None),
+                    models.Post.status.in_(ACTIVE_STATUSES),
+                )
+                .order_by(models.Post.id)
+            )
+            for post_id, image_hash, lat, lon in (await db.execute(query)).all():
+                self.add(post_id, image_hash, lat, lon)
+            self.last_post_id = max(self.last_post_id, newest)
+
+    #post_ids of candidates, closest hash first then closest location
+    def candidates(self, image_hash: str, lat: float, lon: float):
+        value = int(image_hash, 16)
+        hits = []
+        for d, post_id in self.tree.search(value, DUPLICATE_MAX_HAMMING):
+            entry = self.locations.get(post_id)
+            if entry is None:
+                continue
+            meters = distance_meters(lat, lon, entry[1], entry[2])
+            if meters <= DUPLICATE_RADIUS_METERS:
+                hits.append((d, meters, post_id))
+        return [post_id for _, _, post_id in sorted(hits)]
+
+
+index = DuplicateIndex()
+
+#returns the open task this report duplicates, or None
+async def find_duplicate(db: AsyncSession, image_hash: str, lat: float, lon: float):
+    await index.sync(db)
+    for post_id in index.candidates(image_hash, lat, lon):
+        result = await db.execute(select(models.Post).where(models.Post.id == post_id))
+        original = result.scalars().first()
+        if original and original.status in ACTIVE_STATUSES:
+            return original
+        index.discard(post_id)
+    return None
+
+
+# --- SERVER SIDE HASHES ---
+
+#the caller commits
+async def remember_hash(db: AsyncSession, public_id: str, image_hash: str):
+    await db.merge(models.ImageHash(public_id=public_id, image_hash=image_hash))
+
+#the hash of an upload, from image_hashes or, for a signed upload nobody has hashed yet, from the stored image
+async def hash_for(db: AsyncSession, public_id: str):
+    row = await db.get(models.ImageHash, public_id)
+    if row is not None:
+        return row.image_hash
+    if not (storage.SIGNED_UPLOADS and storage.is_managed(public_id)):
+        return None
+    image_hash = await storage.hash_stored_image(public_id)
+    if image_hash:
+        await remember_hash(db, public_id, image_hash)
+    return image_hash
+
+#public_id -> hash for the ones already hashed, one query (bulk import rows)
+async def known_hashes(db: AsyncSession, public_ids) -> dict:
+    if not public_ids:
+        return {}
+    query = select(models.ImageHash.public_id, models.ImageHash.image_hash).where(models.ImageHash.public_id.in_(set(public_ids)))
+    return dict((await db.execute(query)).all())
@@ -0,0 +1,231 @@
+# backend/export.py
+
+''' GET /posts/export and `python export.py`: dumps of posts for partners (locations, classes, durations,
+    before / after photos, points), live and archived alike, as NDJSON, CSV or Parquet.
+
+    rows come off a server-side cursor (db.stream + yield_per), EXPORT_CHUNK_ROWS at a time, and every
+    chunk is encoded and handed on before the next one is fetched, so memory stays flat whatever the
+    table size. the live posts table is read first, then posts_archive (where finished posts move after
+    ARCHIVE_AFTER_DAYS), each in id order. Parquet writes one row group per chunk and needs pyarrow,
+    which is only imported when a Parquet export is asked for.
+
+        python export.py --format csv --status COMPLETED --since 2026-01-01 --out cleanups.csv
+        python export.py --format parquet --bbox 77.4,12.8,77.8,13.1 --out bengaluru.parquet
+'''
+
+import os
+import io
+import csv
+import sys
+import asyncio
+import argparse
+from datetime import datetime, timezone
+import orjson
+from sqlalchemy import select
+
+import models
+from database import AsyncSessionLocal, dispose_engines
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "2000"))
+
+COLUMNS = (
+    "id", "status", "predicted_class", "caption", "latitude", "longitude", "created_at",
+    "image_url", "start_image_url", "end_image_url", "proof_image_url",
+    "volunteer_start_timestamp", "volunteer_end_timestamp", "cleanup_duration_minutes", "cleanliness_delta",
+    "points", "verified_points", "author_id", "volunteer_id", "resolved_by_id",
+)
+DATE_FIELDS = {"created": "created_at", "completed": "volunteer_end_timestamp"}
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class ExportError(ValueError):
+    pass
+
+#"min_lon,min_lat,max_lon,max_lat" -> tuple of floats
+def parse_bbox(value: str):
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in value.split(","))
+    except ValueError:
+        raise ExportError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ExportError("bbox minimums must not be larger than its maximums")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+# --- QUERY ---
+
+def export_query(table, since=None, until=None, date_field="created", statuses=None, bbox=None):
+    c = table.c
+    query = select(*[c[name] for name in COLUMNS])
+    date_column = c[DATE_FIELDS[date_field]]
+    if since:
+        query = query.where(date_column >= since)
+    if until:
+        query = query.where(date_column < until)
+    if statuses:
+        query = query.where(c.status.in_(statuses))
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        query = query.where(c.longitude.between(min_lon, max_lon), c.latitude.between(min_lat, max_lat))
+    return query.order_by(c.id)
+
+#lists of row tuples, EXPORT_CHUNK_ROWS at a time, status as its plain value
+async def chunks(**filters):
+    status_at = COLUMNS.index("status")
+    async with AsyncSessionLocal() as db:
+        for table in (models.Post.__table__, models.ArchivedPost.__table__):
+            query = export_query(table, **filters).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+            result = await db.stream(query)
+            async for partition in result.partitions():
+                rows = [tuple(row) for row in partition]
+                for i, row in enumerate(rows):
+                    if row[status_at] is not None:
+                        rows[i] = row[:status_at] + (row[status_at].value,) + row[status_at + 1:]
+                yield rows
+
+
+# --- WRITERS ---
+# each takes the chunks() iterator and yields bytes, one piece per chunk
+
+async def ndjson_writer(source):
+    async for rows in source:
+        yield b"".join(orjson.dumps(dict(zip(COLUMNS, row)), option=orjson.OPT_UTC_Z) + b"\n" for row in rows)
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)   # sqlite hands back naive utc
+        return value.isoformat()
+    return value
+
+async def csv_writer(source):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    async for rows in source:
+        writer.writerows([_csv_value(v) for v in row] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():   # header only, nothing matched
+        yield buffer.getvalue().encode()
+
+
+class _Spool:
+    '''write-only file object for ParquetWriter, take() hands over what was written since the last call'''
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportError("Parquet export needs pyarrow, install it or use format=ndjson / csv")
+    return pyarrow, pyarrow.parquet
+
+def parquet_schema(pa):
+    timestamp = pa.timestamp("us", tz="UTC")
+    types = {
+        "id": pa.int64(), "latitude": pa.float64(), "longitude": pa.float64(),
+        "created_at": timestamp, "volunteer_start_timestamp": timestamp, "volunteer_end_timestamp": timestamp,
+        "cleanup_duration_minutes": pa.int64(), "cleanliness_delta": pa.float64(),
+        "points": pa.int64(), "verified_points": pa.int64(),
+        "author_id": pa.int64(), "volunteer_id": pa.int64(), "resolved_by_id": pa.int64(),
+    }
+    return pa.schema([(name, types.get(name, pa.string())) for name in COLUMNS])
+
+async def parquet_writer(source):
+    pa, pq = require_pyarrow()
+    schema = parquet_schema(pa)
+    spool = _Spool()
+    writer = pq.ParquetWriter(spool, schema, compression="zstd")
+    try:
+        async for rows in source:
+            columns = list(zip(*rows))
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+            )
+            writer.write_batch(batch)   # one row group per chunk
+            yield spool.take()
+    finally:
+        writer.close()   # footer
+    yield spool.take()
+
+WRITERS = {"ndjson": ndjson_writer, "csv": csv_writer, "parquet": parquet_writer}
+
+#checks the format up front (so the endpoint can still answer 400), returns the byte stream
+def stream(format: str, **filters):
+    if format not in WRITERS:
+        raise ExportError(f"format must be one of {', '.join(WRITERS)}")
+    if format == "parquet":
+        require_pyarrow()
+    return WRITERS[format](chunks(**filters))
+
+def filename(format: str) -> str:
+    return f"posts-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.{FORMATS[format][1]}"
+
+
+# --- CLI ---
+
+def _date(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+async def main(args):
+    out = open(args.out, "wb") if args.out else sys.stdout.buffer
+    written = 0
+    try:
+        async for data in stream(
+            args.format, since=args.since, until=args.until, date_field=args.date_field,
+            statuses=[models.TaskStatus[s] for s in args.status] or None, bbox=args.bbox,
+        ):
+            out.write(data)
+            written += len(data)
+    finally:
+        if args.out:
+            out.close()
+        await dispose_engines()
+    print(f"exported {written} bytes", file=sys.stderr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=tuple(WRITERS), default="ndjson")
+    parser.add_argument("--out", default=None, help="file to write, stdout when left out")
+    parser.add_argument("--since", type=_date, default=None, help="ISO date / datetime, inclusive (utc when no offset)")
+    parser.add_argument("--until", type=_date, default=None, help="ISO date / datetime, exclusive")
+    parser.add_argument("--date-field", choices=tuple(DATE_FIELDS), default="created")
+    parser.add_argument("--status", nargs="*", default=[], choices=[s.name for s in models.TaskStatus])
+    parser.add_argument("--bbox", type=parse_bbox, default=None, help="min_lon,min_lat,max_lon,max_lat")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except ExportError as e:
+        parser.error(str(e))
@@ -0,0 +1,35 @@
+# backend/http_client.py
+
+''' one httpx.AsyncClient per worker process, opened and closed by the lifespan in main.py.
+    the classifier calls reuse its keep-alive connections instead of paying a new TCP (and TLS)
+    handshake for every post
+'''
+
+import os
+import httpx
+
+CLASSIFIER_MAX_CONNECTIONS = int(os.getenv("CLASSIFIER_MAX_CONNECTIONS", "20"))
+
+client: httpx.AsyncClient = None
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=30.0,
+        limits=httpx.Limits(max_connections=CLASSIFIER_MAX_CONNECTIONS, max_keepalive_connections=CLASSIFIER_MAX_CONNECTIONS),
+    )
+
+def open_client():
+    global client
+    if client is None:
+        client = _new_client()
+    return client
+
+#the lifespan's client, or a fresh one when running outside the app (scripts, bench)
+def get() -> httpx.AsyncClient:
+    return client or open_client()
+
+async def close_client():
+    global client
+    if client is not None:
+        await client.aclose()
+        client = None
@@ -0,0 +1,236 @@
+# backend/idempotency.py
+
+''' Idempotency-Key on POST /images/upload/ and POST /posts/, the two calls the app retries on flaky networks.
+
+    a key belongs to one user and one endpoint. the first request with it claims a row in idempotency_keys
+    (status_code NULL while it runs), does the work and stores its response in that row and in an
+    in-process LRU. a retry within IDEMPOTENCY_TTL_HOURS gets the stored response back, marked with
+    Idempotent-Replayed: true, without re-encoding, re-uploading, inserting or classifying anything.
+
+    the route's rate limit is taken inside work(), so only the request that claimed the key pays for it:
+    a replay or a wait never spends a token, a 429 gives the claim up like any other failure.
+
+    a duplicate that turns up while the first request is still running waits for it: on a future when both
+    are in the same worker, by polling the row when they're not, for up to IDEMPOTENCY_WAIT_SECONDS (then
+    409, try again). only 2xx responses are kept, a request that fails gives its claim up so the retry does
+    the work for real. the same key with a different payload is a client bug and gets 422. a claim older
+    than IDEMPOTENCY_CLAIM_SECONDS was left by a worker that died mid-request and is taken over.
+    expired rows are deleted by the scheduler (purge_expired).
+'''
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, Response
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+
+import models
+from database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "True") == "True"
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "1024"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+IDEMPOTENCY_CLAIM_SECONDS = float(os.getenv("IDEMPOTENCY_CLAIM_SECONDS", "120"))
+IDEMPOTENCY_PURGE_SECONDS = int(os.getenv("IDEMPOTENCY_PURGE_SECONDS", "3600"))
+POLL_SECONDS = 0.2
+MAX_KEY_LENGTH = 255
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def scope(user_id: int, endpoint: str, key: str) -> str:
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+    return hashlib.sha256(f"{user_id}|{endpoint}|{key}".encode()).hexdigest()
+
+#hash of whatever identifies the request's payload
+def fingerprint(*parts) -> str:
+    return hashlib.sha256("|".join(str(p) for p in parts).encode()).hexdigest()
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)   # sqlite hands back naive utc
+
+
+class Stored:
+    __slots__ = ("status_code", "body", "fingerprint", "expires_at")
+
+    def __init__(self, status_code: int, body: bytes, fingerprint: str, expires_at: float):
+        self.status_code, self.body, self.fingerprint, self.expires_at = status_code, body, fingerprint, expires_at
+
+    #the replay of a retry
+    def response(self, fingerprint: str) -> Response:
+        if fingerprint != self.fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        return Response(content=self.body, status_code=self.status_code, media_type="application/json",
+                        headers={REPLAYED_HEADER: "true"})
+
+#a new exception every time, starlette/fastapi keep state on the instance that is raised
+def in_progress() -> HTTPException:
+    return HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress, retry shortly")
+
+
+# --- DATABASE ---
+# every step is its own short transaction on its own session, never the request's
+
+async def _claim(id: str, user_id: int, fingerprint: str):
+    ''' -> ("claimed", None) | ("done", Stored) | ("busy", fingerprint) | ("again", None)
+        "again": an expired or abandoned row was just cleared, claim once more
+    '''
+    now = models.utcnow()
+    async with AsyncSessionLocal() as db:
+        db.add(models.IdempotencyKey(
+            id=id, user_id=user_id, fingerprint=fingerprint, claimed_at=now,
+            expires_at=now + timedelta(hours=IDEMPOTENCY_TTL_HOURS),
+        ))
+        try:
+            await db.commit()
+            return "claimed", None
+        except IntegrityError:
+            await db.rollback()
+
+        row = await db.get(models.IdempotencyKey, id)
+        if row is None:   # finished and released between our insert and this read
+            return "again", None
+        expires_at = _aware(row.expires_at)
+        abandoned = row.status_code is None and _aware(row.claimed_at) < now - timedelta(seconds=IDEMPOTENCY_CLAIM_SECONDS)
+        if expires_at <= now or abandoned:
+            #only if nobody else got there first, the claim we saw is the one removed
+            await db.execute(delete(models.IdempotencyKey).where(
+                models.IdempotencyKey.id == id, models.IdempotencyKey.claimed_at == row.claimed_at
+            ))
+            await db.commit()
+            if abandoned:
+                logger.warning(f"[Idempotency] taking over a claim abandoned since {row.claimed_at}")
+            return "again", None
+        if row.status_code is None:
+            return "busy", row.fingerprint
+        return "done", Stored(row.status_code, row.body, row.fingerprint, expires_at.timestamp())
+
+async def _complete(id: str, stored: Stored):
+    async with AsyncSessionLocal() as db:
+        row = await db.get(models.IdempotencyKey, id)
+        if row is None:   # purged or taken over meanwhile, the LRU still has it
+            return
+        row.status_code, row.body = stored.status_code, stored.body
+        await db.commit()
+
+async def _release(id: str):
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(models.IdempotencyKey).where(
+                models.IdempotencyKey.id == id, models.IdempotencyKey.status_code.is_(None)
+            ))
+            await db.commit()
+    except Exception as e:   # the claim runs out after IDEMPOTENCY_CLAIM_SECONDS anyway
+        logger.error(f"[Idempotency] could not release a claim: {e}")
+
+#scheduler job
+async def purge_expired() -> int:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(delete(models.IdempotencyKey).where(models.IdempotencyKey.expires_at < models.utcnow()))
+        await db.commit()
+    if result.rowcount:
+        logger.info(f"[Idempotency] purged {result.rowcount} expired keys")
+    return result.rowcount
+
+
+# --- STORE ---
+
+class IdempotencyStore:
+    def __init__(self):
+        self.results = OrderedDict()   # scope id -> Stored, completed responses
+        self.running = {}              # scope id -> Future, requests in progress in this worker
+
+    def _cached(self, id: str):
+        stored = self.results.get(id)
+        if stored is None:
+            return None
+        if stored.expires_at <= time.time():
+            del self.results[id]
+            return None
+        self.results.move_to_end(id)
+        return stored
+
+    def _remember(self, id: str, stored: Stored):
+        self.results[id] = stored
+        self.results.move_to_end(id)
+        while len(self.results) > IDEMPOTENCY_CACHE_SIZE:
+            self.results.popitem(last=False)
+
+    def _finish(self, id: str, future):
+        if self.running.get(id) is future:
+            del self.running[id]
+        future.set_result(None)
+
+    async def run(self, user_id: int, endpoint: str, key: str, fingerprint: str, work) -> Response:
+        ''' work() does the request for real and returns (status_code, body bytes) '''
+        id = scope(user_id, endpoint, key)
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            stored = self._cached(id)
+            if stored is not None:
+                return stored.response(fingerprint)
+
+            running = self.running.get(id)
+            if running is not None:
+                #same worker: wait for it, then look again (if it failed its claim is gone and we may take it)
+                try:
+                    await asyncio.wait_for(asyncio.shield(running), max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    raise in_progress()
+                continue
+
+            #registered before the first await, so a duplicate arriving meanwhile waits on us
+            future = asyncio.get_running_loop().create_future()
+            self.running[id] = future
+            try:
+                state, value = await _claim(id, user_id, fingerprint)
+            except BaseException:
+                self._finish(id, future)
+                raise
+            if state == "claimed":
+                break
+            self._finish(id, future)
+            if state == "done":
+                self._remember(id, value)
+                return value.response(fingerprint)
+            if state == "busy":
+                #another worker has it
+                if value != fingerprint:
+                    raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+                if time.monotonic() >= deadline:
+                    raise in_progress()
+                await asyncio.sleep(POLL_SECONDS)
+
+        try:
+            status_code, body = await work()
+        except BaseException:
+            await _release(id)
+            self._finish(id, future)
+            raise
+        try:
+            if 200 <= status_code < 300:
+                stored = Stored(status_code, body, fingerprint, time.time() + IDEMPOTENCY_TTL_HOURS * 3600)
+                self._remember(id, stored)
+                try:
+                    await _complete(id, stored)
+                except Exception as e:   # the work is done and answered, other workers just won't see it
+                    logger.error(f"[Idempotency] could not store a response: {e}")
+            else:
+                await _release(id)
+        finally:
+            self._finish(id, future)
+        return Response(content=body, status_code=status_code, media_type="application/json")
+
+store = IdempotencyStore()
+
+#no key (or the feature off): the route runs as it always did
+def wanted(key) -> bool:
+    return IDEMPOTENCY_ENABLED and key is not None
@@ -0,0 +1,173 @@
+# backend/image_utils.py
+
+from __future__ import annotations
+
+import io
+import os
+import warnings
+from typing import TYPE_CHECKING
+from fastapi import HTTPException, UploadFile, status
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# --- LIMITS ---
+# everything is checked BEFORE the full decode so a single huge/bomb upload can't OOM a worker
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(15 * 1024 * 1024)))      # 15 MB
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "50000000"))                  # 50 MP, the biggest phone cameras
+MAX_IMAGE_DIMENSION = int(os.getenv("MAX_IMAGE_DIMENSION", "12000"))
+
+#PIL is only needed by the upload path, so it's imported on the first upload instead of at startup
+def _pil():
+    from PIL import Image
+    # PIL's own decompression bomb guard, it raises past 2x this value and warns past 1x (we turn the warning into an error)
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    return Image
+
+FULL_SIZE = (1920, 1080)
+THUMB_SIZE = (480, 480)         # feed thumbnail, keeps aspect ratio
+CLASSIFIER_SIZE = (224, 224)    # exactly what the classifier feeds MobileNetV2, no resize needed there
+
+# magic bytes of the formats we accept
+MAGIC_BYTES = {
+    b"\xff\xd8\xff": "jpeg",
+    b"\x89PNG\r\n\x1a\n": "png",
+    b"GIF87a": "gif",
+    b"GIF89a": "gif",
+}
+
+def sniff_image_type(head: bytes):
+    for magic, kind in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return kind
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+#rejects based on the size the multipart parser already counted, nothing is read into memory
+def check_upload_size(file: UploadFile):
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+        )
+
+''' opens an image LAZILY: only the magic bytes and the header are read here.
+    fp can be the spooled upload file or a BytesIO, the pixels are decoded later
+    (and for jpeg at a reduced scale thanks to draft())
+'''
+def open_image(fp, target_size=FULL_SIZE) -> Image.Image:
+    Image = _pil()
+    head = fp.read(16)
+    fp.seek(0)
+    if sniff_image_type(head) is None:
+        raise HTTPException(status_code=400, detail="File provided is not an image.")
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            img = Image.open(fp)
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Image dimensions are too large")
+    except Exception:
+        raise HTTPException(status_code=400, detail="File provided is not an image.")
+
+    width, height = img.size
+    if width * height > MAX_IMAGE_PIXELS or max(width, height) > MAX_IMAGE_DIMENSION:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Image dimensions are too large")
+
+    img.draft("RGB", target_size)     # lets jpeg decode straight at a reduced scale
+    return img
+
+
+#the ONE decode: rgb, capped at FULL_SIZE. variants and the hash are all built from this
+def prepare_image(img: Image.Image) -> Image.Image:
+    img = img.convert("RGB")
+    img.thumbnail(FULL_SIZE)
+    return img
+
+#encodes the full image and every variant from the prepared image
+def build_variants(img: Image.Image) -> dict:
+    def encode(image, quality):
+        out = io.BytesIO()
+        image.save(out, format='WEBP', quality=quality)
+        return out.getvalue()
+
+    thumb = img.copy()
+    thumb.thumbnail(THUMB_SIZE)
+    return {
+        "full": encode(img, 85),
+        "thumb": encode(thumb, 75),
+        "224": encode(img.resize(CLASSIFIER_SIZE), 90),
+    }
+
+#64 bit difference hash as 16 hex chars, near identical photos end up a few bits apart
+def dhash(img: Image.Image) -> str:
+    small = img.convert("L").resize((9, 8), _pil().Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return f"{value:016x}"
+
+
+# --- REQUEST BODY CAP ---
+class LimitUploadSize:
+    ''' pure ASGI middleware, counts body bytes AS THEY ARRIVE on the given path prefixes
+        and answers 413 once the cap is passed, before the multipart parser spools the rest to disk
+    '''
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES + 64 * 1024, paths=("/images/",)):  # + multipart overhead
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            return await self.app(scope, receive, send)
+
+        #fast path: the client told us up front
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                return await self._reject(send)
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise _BodyTooLarge()
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except _BodyTooLarge:
+            if not response_started:
+                await self._reject(send)
+
+    async def _reject(self, send):
+        body = b'{"detail":"Request body too large"}'
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+#an HTTPException so FastAPI's body parsing re-raises it as a 413 instead of "error parsing the body"
+class _BodyTooLarge(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Request body too large")
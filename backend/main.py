@@ -1,11 +1,19 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
 import uvicorn
 from pathlib import Path
 from dotenv import load_dotenv
-from database import engine, Base
+from database import engine, dispose_engines, QueryStatsMiddleware
+from image_utils import LimitUploadSize
+from cache import ETagCacheMiddleware
+from metrics import MetricsMiddleware
+from admission import AdmissionMiddleware
+import cache
+import metrics
+import tracing
+import http_client
 #makes .env vars avaible to router files also
 BASE_DIR = Path(__file__).resolve().parent
 load_dotenv(BASE_DIR / ".env")
@@ -18,17 +26,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-from routers import auth, posts, comments, images, users
+from routers import auth, posts, comments, images, users, sync
+import archive
+import sweeper
+import idempotency
+from scheduler import Scheduler, SCHEDULER_ENABLED
+import migrations
 
 # --- Lifespan event for startup ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logging.info("Application startup...")
-    async with engine.begin() as conn: #creates new databases table if not already there
-        await conn.run_sync(Base.metadata.create_all)
-    logging.info("Database tables created/verified.")
+    await migrations.ensure_schema(engine) #one query when the schema is current, see migrations.py
+    logging.info("Database schema verified.")
+    http_client.open_client()
+    metrics.watch_pool(engine)
+    #periodic jobs, only the worker that wins the scheduler lock runs them (see scheduler.py)
+    scheduler = Scheduler(engine)
+    scheduler.every("release_stale_tasks", sweeper.SWEEP_INTERVAL_SECONDS, sweeper.release_stale_tasks)
+    scheduler.every("requeue_unclassified", sweeper.SWEEP_INTERVAL_SECONDS, lambda: sweeper.requeue_unclassified(posts.process_post_ml))
+    scheduler.every("purge_idempotency_keys", idempotency.IDEMPOTENCY_PURGE_SECONDS, idempotency.purge_expired)
+    if archive.ARCHIVER_ENABLED:
+        scheduler.every("archive_old_posts", archive.ARCHIVE_INTERVAL_SECONDS, archive.archive_old_posts)
+    if SCHEDULER_ENABLED:
+        scheduler.start()
     yield
+    #uvicorn only gets here once in-flight requests and their background ML jobs are done (see serve.py)
     logging.info("Application shutdown...")
+    await scheduler.stop()
+    await http_client.close_client()
+    await dispose_engines()
+    metrics.mark_process_dead()
 
 app = FastAPI(
     lifespan=lifespan,
@@ -36,6 +64,14 @@ app = FastAPI(
     version="6.9"
 )
 
+# load shedding (see admission.py), innermost so 304s and cached feed pages are still served under load
+# and the 503s go out through CORS and the metrics
+app.add_middleware(AdmissionMiddleware)
+
+# ETag / 304 cache for the feed, leaderboard and comments (see cache.py)
+# added before CORS so cached responses still go out through the CORS middleware
+app.add_middleware(ETagCacheMiddleware)
+
 # CORS configuration
 origins = ["*"] # Allow all for mobile app development 
 
@@ -47,12 +83,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# caps request bodies on the upload routes while they stream in
+app.add_middleware(LimitUploadSize, paths=("/images/",))
+
+# per request SQL statement counts, N+1 warnings (and X-DB-* headers with SQL_DEBUG=True)
+app.add_middleware(QueryStatsMiddleware)
+
+# root span per request, continues the caller's trace from traceparent (see tracing.py)
+app.add_middleware(tracing.TracingMiddleware)
+
+# latency / status / in flight per route, added last so it is outermost and sees cache hits and 413s too
+app.add_middleware(MetricsMiddleware)
+
 # Register Routers 
 app.include_router(auth.router, prefix="/auth") #handles authenitcation
 app.include_router(users.router)    # handles users data and stats
 app.include_router(posts.router)   # handles the posts router
 app.include_router(comments.router) # self explainatory ig
 app.include_router(images.router) #uploads images to cloudinary
+app.include_router(sync.router)  # delta sync for the mobile app
 '''TODO : in /images router use TRASH_CLASSIFIER microservice 
         to judge how muh points the user gets, based on the type 
         of trash they post  
@@ -64,6 +113,24 @@ app.include_router(images.router) #uploads images to cloudinary
 def read_root():
     return {"message": "App API is running"}
 
+#prometheus scrape endpoint
+@app.get("/metrics", tags=["Health Check"], include_in_schema=False)
+def prometheus_metrics():
+    return metrics.metrics_response(engine)
+
+#recent traces, only with TRACE_EXPORTER=memory (local debugging)
+@app.get("/debug/traces", tags=["Health Check"], include_in_schema=False)
+def recent_traces(limit: int = 20):
+    if not isinstance(tracing.exporter, tracing.MemoryExporter):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return tracing.exporter.traces(limit)
+
+#hit ratio and DB statements the response cache saved
+@app.get("/cache/stats", tags=["Health Check"])
+def cache_stats():
+    return cache.cache.report()
+
+#dev server with the reloader, production runs serve.py
 if __name__ == "__main__":
     logger.info("http://127.0.0.1:8080") #this should produce a link
     uvicorn.run(
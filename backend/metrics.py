@@ -0,0 +1,154 @@
+# backend/metrics.py
+
+''' prometheus metrics for the API, scraped from GET /metrics.
+    per route latency histograms, status code counters and in flight gauges come from MetricsMiddleware,
+    the rest (db pool, background jobs, classifier calls) is recorded where it happens.
+    routes are labelled with their template ("/posts/{post_id}/approve"), never the raw path,
+    so the number of series stays fixed.
+    with several uvicorn workers serve.py points PROMETHEUS_MULTIPROC_DIR at an empty directory before they
+    start: every worker writes its samples there and /metrics adds them up, whichever worker answers.
+    without it (one worker, the dev server) the registry is the process' own.
+'''
+
+import os
+import time
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from starlette.responses import Response
+
+import tracing
+
+# latency buckets in seconds, tuned for an API that mostly answers in 5-500ms
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route"], buckets=BUCKETS)
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served", ["method"], multiprocess_mode="livesum")
+
+JOBS_QUEUED = Gauge("background_jobs_queued", "background tasks started but not finished", ["job"], multiprocess_mode="livesum")
+JOB_DURATION = Histogram("background_job_duration_seconds", "background task run time", ["job"], buckets=BUCKETS)
+JOB_ERRORS = Counter("background_job_errors_total", "background tasks that raised", ["job"])
+SCHEDULER_LEADER = Gauge("scheduler_leader", "1 while this worker holds the scheduler lock and runs the periodic jobs", multiprocess_mode="livemax")
+
+CLASSIFIER_LATENCY = Histogram("classifier_request_duration_seconds", "calls to the trash classifier", ["endpoint"], buckets=BUCKETS)
+
+ADMISSION_REJECTED = Counter("admission_rejected_total", "requests shed before any work was done", ["reason", "kind"])
+RATE_LIMITED = Counter("rate_limited_total", "writes refused by the per user token buckets", ["bucket"])
+
+DB_POOL_SIZE = Gauge("db_pool_size", "connections kept in the pool", multiprocess_mode="livesum")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "connections currently in use", multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "connections opened past pool_size", multiprocess_mode="livesum")
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+
+class MetricsMiddleware:
+    '''pure ASGI so it adds one perf_counter pair and a few dict lookups per request'''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = [500]  # stays 500 if the app raises before sending anything
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        in_flight = IN_FLIGHT.labels(method)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+            #the router puts the matched route into the scope on the way down
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            LATENCY.labels(method, route).observe(elapsed)
+            REQUESTS.labels(method, route, str(status[0])).inc()
+
+
+class JobBacklog:
+    '''this process' running background jobs and how long one takes, read by admission.py'''
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.pending = 0
+        self.ewma_seconds = 1.0
+
+    def observe(self, seconds: float):
+        self.ewma_seconds += self.alpha * (seconds - self.ewma_seconds)
+
+backlog = JobBacklog()
+
+
+#the returned coroutine function runs fn, counted from the moment it starts until it ends. counting at
+#queue time would leak: BackgroundTasks of a request that raises after queuing (a client dropping a bulk
+#upload mid-stream) never run, and the count would stay up for the life of the worker.
+#interactive=False keeps a job out of the backlog admission.py sheds on (bulk imports), it is still measured
+def tracked_job(name: str, fn, *args, interactive: bool = True, **kwargs):
+    async def run():
+        JOBS_QUEUED.labels(name).inc()
+        if interactive:
+            backlog.pending += 1
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"job.{name}"):
+                await fn(*args, **kwargs)
+        except Exception:
+            JOB_ERRORS.labels(name).inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            JOB_DURATION.labels(name).observe(elapsed)
+            JOBS_QUEUED.labels(name).dec()
+            if interactive:
+                backlog.pending -= 1
+                backlog.observe(elapsed)
+
+    return run
+
+''' schedules fn on FastAPI's BackgroundTasks and keeps background_jobs_queued up to date.
+    a request's BackgroundTasks start as soon as its response is sent, so a burst of posts shows up here
+    right away, one running job per request
+'''
+def queue_job(background_tasks, name: str, fn, *args, interactive: bool = True, **kwargs):
+    background_tasks.add_task(tracked_job(name, fn, *args, interactive=interactive, **kwargs))
+
+
+def _collect_pool(engine):
+    pool = engine.pool
+    #StaticPool / NullPool (sqlite in memory, tests) don't track any of this
+    for gauge, attr in ((DB_POOL_SIZE, "size"), (DB_POOL_CHECKED_OUT, "checkedout"), (DB_POOL_OVERFLOW, "overflow")):
+        fn = getattr(pool, attr, None)
+        if fn is not None:
+            gauge.set(fn())
+
+#multiprocess: a scrape only reaches one worker, so every worker keeps its pool gauges current on checkout / checkin
+def watch_pool(engine):
+    if not MULTIPROC_DIR:
+        return
+    _collect_pool(engine)
+    event.listen(engine.sync_engine, "checkout", lambda *args: _collect_pool(engine))
+    event.listen(engine.sync_engine, "checkin", lambda *args: _collect_pool(engine))
+
+#lifespan shutdown, drops this worker's live gauges from the sums
+def mark_process_dead():
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+def metrics_response(engine) -> Response:
+    if not MULTIPROC_DIR:
+        _collect_pool(engine)
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,261 @@
+# backend/migrations.py
+
+''' versioned schema migrations, replacing Base.metadata.create_all on every worker start.
+
+    MIGRATIONS is append only: (version, description, fn). fn gets a sync Connection (via run_sync) and
+    has to be safe on a database that already has the change, because databases made by the old
+    create_all have no schema_version table and replay every step once. the helpers below
+    (create_tables, add_column, create_index) all check first.
+
+    every step makes only its own change, also on a new database: a table created by a step has the
+    shape it had at that version (BASELINE for step 1, the archive tables of step 4), never the current
+    models' with columns that later steps add.
+
+    startup only reads max(version) from schema_version, one round trip instead of create_all's catalog
+    lookup per table. when it's behind, MIGRATE_ON_STARTUP=True (default) upgrades in place, under a
+    postgres advisory lock so workers starting together don't race. with False the worker refuses to
+    start until the release step has run:
+
+        python migrations.py            upgrade to the latest version
+        python migrations.py status     current and latest version
+'''
+
+import os
+import sys
+import asyncio
+import logging
+from sqlalchemy import Table, Column, Integer, String, Text, Float, Enum, DateTime, ForeignKey, MetaData
+from sqlalchemy import inspect, insert, select, update, func, text
+from sqlalchemy.exc import DBAPIError
+
+from database import Base, engine
+import models
+import tiles
+
+logger = logging.getLogger(__name__)
+
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "True") == "True"
+ADVISORY_LOCK_ID = 72_410_001   # any constant, only migrations take it
+
+# own metadata so nothing else ever creates or drops it
+schema_version = Table(
+    "schema_version", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200)),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+# --- BASELINE ---
+# users, posts, comments and likes as the first release made them with create_all, version 1
+
+BASELINE = MetaData()
+
+Table(
+    "users", BASELINE,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String(50), unique=True, index=True),
+    Column("email", String(100), unique=True, index=True),
+    Column("hashed_password", String(255)),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("points", Integer),
+)
+Table(
+    "posts", BASELINE,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("image_url", String(500), nullable=False),
+    Column("image_public_id", String(255), nullable=False),
+    Column("caption", Text, nullable=True),
+    Column("latitude", Float, nullable=True),
+    Column("longitude", Float, nullable=True),
+    Column("predicted_class", String(50), nullable=True),
+    Column("points", Integer),
+    Column("status", Enum(models.TaskStatus)),
+    Column("author_id", Integer, ForeignKey("users.id")),
+    Column("volunteer_id", Integer, ForeignKey("users.id"), nullable=True),
+    Column("start_image_url", String(500), nullable=True),
+    Column("volunteer_start_timestamp", DateTime(timezone=True), nullable=True),
+    Column("verified_points", Integer, nullable=True),
+    Column("end_image_url", String(500), nullable=True),
+    Column("volunteer_end_timestamp", DateTime(timezone=True), nullable=True),
+    Column("cleanup_duration_minutes", Integer, nullable=True),
+    Column("proof_image_url", String(500), nullable=True),
+    Column("resolved_by_id", Integer, ForeignKey("users.id"), nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+Table(
+    "comments", BASELINE,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("content", Text),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("author_id", Integer, ForeignKey("users.id")),
+    Column("post_id", Integer, ForeignKey("posts.id")),
+)
+Table(
+    "likes", BASELINE,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("post_id", Integer, ForeignKey("posts.id")),
+)
+
+# the archive tables as step 4 made them, before the columns of steps 6, 7 and 11 and the archived_at index of step 6
+ARCHIVE_V4 = MetaData()
+models.archive_table(
+    models.Post.__table__, "posts_archive", "author_id", "volunteer_id", "resolved_by_id", metadata=ARCHIVE_V4,
+    skip=("updated_at", "cleanliness_delta", "import_job_id", "classify_attempted_at"),
+)
+models.archive_table(models.Comment.__table__, "comments_archive", "post_id", metadata=ARCHIVE_V4, skip=("updated_at",))
+models.archive_table(models.Like.__table__, "likes_archive", "post_id", metadata=ARCHIVE_V4)
+
+
+# --- HELPERS ---
+
+def create_tables(conn, *tables):
+    Base.metadata.create_all(conn, tables=list(tables))   # checkfirst, also creates the tables' indexes
+
+#adds a column declared in models.py to an existing table, nothing if it's already there
+def add_column(conn, table, name):
+    if name in {c["name"] for c in inspect(conn).get_columns(table.name)}:
+        return
+    column = table.c[name]
+    ddl = f"ALTER TABLE {table.name} ADD COLUMN {name} {column.type.compile(dialect=conn.dialect)}"
+    for fk in column.foreign_keys:
+        ddl += f" REFERENCES {fk.column.table.name} ({fk.column.name})"
+    conn.execute(text(ddl))
+
+def create_index(conn, table, name):
+    index = next(i for i in table.indexes if i.name == name)
+    index.create(conn, checkfirst=True)
+
+
+# --- MIGRATIONS ---
+
+def _base_tables(conn):
+    BASELINE.create_all(conn)   # checkfirst, a database from the old create_all already has them
+
+def _duplicate_columns(conn):
+    add_column(conn, models.Post.__table__, "image_hash")
+    add_column(conn, models.Post.__table__, "duplicate_of_id")
+
+def _tile_aggregates(conn):
+    create_tables(conn, models.TileAggregate.__table__)
+    tiles.backfill_if_empty(conn)   # posts from before tiles existed
+
+def _feed_indexes_and_archive(conn):
+    create_index(conn, models.Post.__table__, "ix_posts_active_created_at")
+    create_index(conn, models.Post.__table__, "ix_posts_status_created_at")
+    ARCHIVE_V4.create_all(conn)
+
+def _import_jobs(conn):
+    create_tables(conn, models.ImportJob.__table__)
+
+def _updated_at(conn):
+    now = models.utcnow()
+    for model in (models.User, models.Post, models.Comment):
+        table = model.__table__
+        add_column(conn, table, "updated_at")
+        #one shared value for the old rows, a first sync pages through them by id
+        conn.execute(update(table).where(table.c.updated_at.is_(None)).values(updated_at=now))
+        create_index(conn, table, f"ix_{table.name}_updated_at")
+    add_column(conn, models.ArchivedPost.__table__, "updated_at")
+    add_column(conn, models.ArchivedComment.__table__, "updated_at")
+    create_index(conn, models.ArchivedPost.__table__, "ix_posts_archive_archived_at")
+
+def _cleanliness_delta(conn):
+    add_column(conn, models.Post.__table__, "cleanliness_delta")
+    add_column(conn, models.ArchivedPost.__table__, "cleanliness_delta")
+
+def _sweeper_indexes(conn):
+    create_index(conn, models.Post.__table__, "ix_posts_status_volunteer_start")
+    create_index(conn, models.Post.__table__, "ix_posts_analysing_created_at")
+
+def _idempotency_keys(conn):
+    create_tables(conn, models.IdempotencyKey.__table__)
+
+def _image_hashes(conn):
+    create_tables(conn, models.ImageHash.__table__)
+
+def _requeue_by_attempt(conn):
+    posts = models.Post.__table__
+    for table in (posts, models.ArchivedPost.__table__):
+        add_column(conn, table, "import_job_id")
+        add_column(conn, table, "classify_attempted_at")
+    #posts waiting for the classifier right now were last queued when they were made
+    conn.execute(
+        update(posts)
+        .where(posts.c.predicted_class == "Analysing", posts.c.classify_attempted_at.is_(None))
+        .values(classify_attempted_at=posts.c.created_at, updated_at=posts.c.updated_at)
+    )
+    create_index(conn, posts, "ix_posts_analysing_attempted_at")
+
+MIGRATIONS = [
+    (1, "users, posts, comments and likes", _base_tables),
+    (2, "duplicate report columns on posts", _duplicate_columns),
+    (3, "map tile aggregates", _tile_aggregates),
+    (4, "partial feed index and archive tables", _feed_indexes_and_archive),
+    (5, "bulk import jobs", _import_jobs),
+    (6, "updated_at columns and sync indexes", _updated_at),
+    (7, "cleanliness_delta on posts", _cleanliness_delta),
+    (8, "stale task and stuck classification indexes", _sweeper_indexes),
+    (9, "idempotency keys", _idempotency_keys),
+    (10, "server side image hashes", _image_hashes),
+    (11, "import job of a post and stuck classifications by last attempt", _requeue_by_attempt),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+# --- RUNNER ---
+
+async def current_version(engine) -> int:
+    async with engine.connect() as conn:
+        try:
+            return (await conn.execute(select(func.max(schema_version.c.version)))).scalar() or 0
+        except DBAPIError:   # no schema_version yet: a new database or one made by create_all
+            return 0
+
+def _upgrade(conn) -> list:
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+    schema_version.create(conn, checkfirst=True)
+    #read again under the lock, another worker may have just done it
+    current = conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version <= current:
+            continue
+        logger.info(f"Migrating schema to version {version}: {description}")
+        fn(conn)
+        conn.execute(insert(schema_version).values(version=version, description=description))
+        applied.append(version)
+    return applied
+
+#one transaction, on postgres a failed step leaves the schema where it was
+async def upgrade(engine) -> list:
+    async with engine.begin() as conn:
+        return await conn.run_sync(_upgrade)
+
+#the startup check
+async def ensure_schema(engine):
+    version = await current_version(engine)
+    if version == LATEST:
+        return
+    if version > LATEST:
+        logger.warning(f"Database schema is at version {version}, newer than this build ({LATEST})")
+        return
+    if not MIGRATE_ON_STARTUP:
+        raise RuntimeError(f"Database schema is at version {version}, this build needs {LATEST}: run python migrations.py")
+    applied = await upgrade(engine)
+    logger.info(f"Schema migrated to version {LATEST} (applied {applied or 'nothing, another worker did'})")
+
+
+async def main(command: str):
+    if command == "status":
+        print(f"current: {await current_version(engine)}  latest: {LATEST}")
+    else:
+        applied = await upgrade(engine)
+        print(f"applied: {applied or 'nothing'}  now at: {LATEST}")
+    await engine.dispose()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "upgrade"))
@@ -1,9 +1,11 @@
 # backend/models.py
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Float, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Float, Enum, Index, UniqueConstraint, Table, LargeBinary
+from sqlalchemy.orm import relationship, foreign
+from sqlalchemy.types import SchemaType
 from sqlalchemy.sql import func
 from database import Base
+from datetime import datetime, timezone
 import enum
 
 class TaskStatus(str, enum.Enum):
@@ -13,6 +15,15 @@ class TaskStatus(str, enum.Enum):
     COMPLETED = "completed"           # points paid
     CANCELLED = "cancelled"           # if volunteer decides to cancel 
 
+# tasks still on the board vs finished ones (the archiver moves finished ones out of the hot tables)
+ACTIVE_STATUSES = (TaskStatus.OPEN, TaskStatus.IN_PROGRESS, TaskStatus.PENDING_APPROVAL)
+FINISHED_STATUSES = (TaskStatus.COMPLETED, TaskStatus.CANCELLED)
+
+# updated_at / archived_at are set here and not by the database, so every backend stores them with the same
+# clock and precision (sqlite's CURRENT_TIMESTAMP has whole seconds in another format) and sync.py can page on them
+def utcnow():
+    return datetime.now(timezone.utc)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -22,6 +33,7 @@ class User(Base):
     hashed_password = Column(String(255))
     # is_active REMOVED
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
     
     points = Column(Integer, default=0)
     
@@ -34,6 +46,8 @@ class User(Base):
     volunteer_tasks = relationship("Post", back_populates="volunteer", foreign_keys="Post.volunteer_id")
     contribution_tasks = relationship("Post", back_populates="resolved_by", foreign_keys="Post.resolved_by_id")
 
+Index("ix_users_updated_at", User.updated_at, User.id)
+
 class Post(Base):
     __tablename__ = "posts"
 
@@ -48,6 +62,10 @@ class Post(Base):
     predicted_class = Column(String(50), nullable=True)
     points = Column(Integer, default=0)
     status = Column(Enum(TaskStatus), default=TaskStatus.OPEN)
+
+    #duplicate reports: 64 bit dHash of the photo (hex) and the original this post was matched to
+    image_hash = Column(String(16), nullable=True)           # copied from image_hashes, never from the client
+    duplicate_of_id = Column(Integer, ForeignKey("posts.id"), nullable=True)
     
     author_id = Column(Integer, ForeignKey("users.id"))
     author = relationship("User", back_populates="posts", foreign_keys=[author_id])
@@ -64,23 +82,57 @@ class Post(Base):
     end_image_url = Column(String(500), nullable=True)          # the "after" photo basically proof
     volunteer_end_timestamp = Column(DateTime(timezone=True), nullable=True)
     cleanup_duration_minutes = Column(Integer, nullable=True)   # calculated duration
+    cleanliness_delta = Column(Float, nullable=True)            # ML before/after check, shown to the author as a hint
+    import_job_id = Column(String(32), nullable=True)           # set on rows from POST /posts/bulk (see bulk_import.py)
+    classify_attempted_at = Column(DateTime(timezone=True), default=utcnow, nullable=True)   # last time the classifier call was queued, see sweeper.py
     
     proof_image_url = Column(String(500), nullable=True)
     resolved_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     resolved_by = relationship("User", back_populates="contribution_tasks", foreign_keys=[resolved_by_id])
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)    # any change, see sync.py
     
     comments = relationship("Comment", back_populates="post", cascade="all, delete")
     likes = relationship("Like", back_populates="post", cascade="all, delete")
 
 
+# the feed: active tasks newest first. partial, so finished posts never bloat it
+# (the feed query must use the exact same predicate for the planner to pick it)
+Index(
+    "ix_posts_active_created_at",
+    Post.created_at.desc(),
+    postgresql_where=Post.status.in_(ACTIVE_STATUSES),
+    sqlite_where=Post.status.in_(ACTIVE_STATUSES),
+)
+# the archiver's range: finished posts older than the cutoff
+Index("ix_posts_status_created_at", Post.status, Post.created_at)
+# the sweeper (sweeper.py): abandoned IN_PROGRESS tasks by start time, posts stuck waiting for the classifier
+Index("ix_posts_status_volunteer_start", Post.status, Post.volunteer_start_timestamp)
+Index(
+    "ix_posts_analysing_created_at",
+    Post.created_at,
+    postgresql_where=Post.predicted_class == "Analysing",
+    sqlite_where=Post.predicted_class == "Analysing",
+)
+Index(
+    "ix_posts_analysing_attempted_at",
+    Post.classify_attempted_at,
+    Post.id,
+    postgresql_where=Post.predicted_class == "Analysing",
+    sqlite_where=Post.predicted_class == "Analysing",
+)
+# GET /sync: everything changed after the client's (updated_at, id) cursor
+Index("ix_posts_updated_at", Post.updated_at, Post.id)
+
+
 class Comment(Base):
     __tablename__ = "comments"
     
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
     
     author_id = Column(Integer, ForeignKey("users.id"))
     post_id = Column(Integer, ForeignKey("posts.id"))
@@ -88,6 +140,8 @@ class Comment(Base):
     author = relationship("User", back_populates="comments")
     post = relationship("Post", back_populates="comments")
 
+Index("ix_comments_updated_at", Comment.updated_at, Comment.id)
+
 class Like(Base):
     __tablename__ = "likes"
     
@@ -99,3 +153,103 @@ class Like(Base):
     user = relationship("User", back_populates="likes")
     post = relationship("Post", back_populates="likes")
 
+
+# --- ARCHIVE ---
+# same columns as the live tables minus the foreign keys between them, so rows can leave posts/comments/likes freely.
+# migrations.py builds the shape an older schema version had on its own metadata, leaving out the later columns
+def archive_table(table, name, *indexes, metadata=Base.metadata, skip=()):
+    columns = [
+        Column(
+            c.name,
+            c.type.copy() if isinstance(c.type, SchemaType) else c.type,
+            primary_key=c.primary_key,
+            autoincrement=False,
+            nullable=c.nullable
+        )
+        for c in table.columns
+        if c.name not in skip
+    ]
+    columns.append(Column("archived_at", DateTime(timezone=True), default=utcnow, server_default=func.now()))
+    archive = Table(name, metadata, *columns)
+    for column in indexes:
+        Index(f"ix_{name}_{column}", archive.c[column])
+    return archive
+
+class ArchivedPost(Base):
+    __table__ = archive_table(Post.__table__, "posts_archive", "author_id", "volunteer_id", "resolved_by_id", "archived_at")
+
+    author = relationship("User", primaryjoin=lambda: foreign(ArchivedPost.author_id) == User.id, viewonly=True)
+    volunteer = relationship("User", primaryjoin=lambda: foreign(ArchivedPost.volunteer_id) == User.id, viewonly=True)
+    resolved_by = relationship("User", primaryjoin=lambda: foreign(ArchivedPost.resolved_by_id) == User.id, viewonly=True)
+    comments = relationship("ArchivedComment", primaryjoin=lambda: foreign(ArchivedComment.post_id) == ArchivedPost.id, viewonly=True)
+    likes = relationship("ArchivedLike", primaryjoin=lambda: foreign(ArchivedLike.post_id) == ArchivedPost.id, viewonly=True)
+
+class ArchivedComment(Base):
+    __table__ = archive_table(Comment.__table__, "comments_archive", "post_id")
+
+    author = relationship("User", primaryjoin=lambda: foreign(ArchivedComment.author_id) == User.id, viewonly=True)
+
+class ArchivedLike(Base):
+    __table__ = archive_table(Like.__table__, "likes_archive", "post_id")
+
+
+# per zoom level counts for the map, kept up to date on every post create / status / class change (see tiles.py)
+class TileAggregate(Base):
+    __tablename__ = "tile_aggregates"
+    __table_args__ = (
+        UniqueConstraint("zoom", "tile_x", "tile_y", "status", "predicted_class", name="uq_tile_bucket"),
+        Index("ix_tile_aggregates_tile", "zoom", "tile_x", "tile_y"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    zoom = Column(Integer, nullable=False)
+    tile_x = Column(Integer, nullable=False)
+    tile_y = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False)
+    predicted_class = Column(String(50), nullable=False)
+
+    count = Column(Integer, nullable=False, default=0)
+    lat_sum = Column(Float, nullable=False, default=0.0)     # sums, so the cluster marker can sit on the centroid
+    lon_sum = Column(Float, nullable=False, default=0.0)
+
+
+# one POST /posts/bulk upload and how far its rows got (see bulk_import.py)
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+
+    id = Column(String(32), primary_key=True)               # uuid4 hex, handed back to the client
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(String(20), nullable=False, default="importing")   # importing -> classifying -> done | failed
+
+    rows_read = Column(Integer, nullable=False, default=0)
+    inserted = Column(Integer, nullable=False, default=0)
+    rejected = Column(Integer, nullable=False, default=0)
+    classified = Column(Integer, nullable=False, default=0)
+    classify_failed = Column(Integer, nullable=False, default=0)
+    errors = Column(Text, nullable=True)                     # JSON list of the first rejected rows {"line", "error"}
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+# the perceptual hash (dhash) of an upload, computed by us from the stored image (see dedup.py)
+class ImageHash(Base):
+    __tablename__ = "image_hashes"
+
+    public_id = Column(String(255), primary_key=True)
+    image_hash = Column(String(16), nullable=False)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+
+
+# the stored response of a request sent with an Idempotency-Key (see idempotency.py)
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    id = Column(String(64), primary_key=True)               # sha256 of user, endpoint and the client's key
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    fingerprint = Column(String(64), nullable=False)         # hash of the request payload, a reused key must match it
+    status_code = Column(Integer, nullable=True)             # NULL while the first request is still running
+    body = Column(LargeBinary, nullable=True)
+
+    claimed_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
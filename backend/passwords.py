@@ -0,0 +1,18 @@
+# backend/passwords.py
+
+''' the one argon2 CryptContext of the app (auth_utils and crud used to build one each).
+    built on first use, so starting a worker doesn't pay for passlib and its backend lookup
+'''
+
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["argon2"], deprecated="auto")
+
+def hash_password(password: str) -> str:
+    return context().hash(password)
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return context().verify(plain_password, hashed_password)
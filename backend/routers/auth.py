@@ -8,6 +8,7 @@ from datetime import timedelta
 from typing import Annotated
 
 import schemas, crud
+import cache
 from database import get_db
 from auth_utils import (
     authenticate_user, 
@@ -53,7 +54,9 @@ async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(get
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # --- MODIFIED: Added await for the async function ---
-    return await crud.create_user(db=db, user=user)
+    new_user = await crud.create_user(db=db, user=user)
+    await cache.bump("points")  #a new 0 pt user can still show up on a short leaderboard
+    return new_user
 
 # Get current user
 # @router.get("/users/me/", response_model=schemas.User)
@@ -5,6 +5,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 import schemas, crud
+import cache
+import serializers
 from database import get_db
 from auth_utils import get_current_active_user
 
@@ -27,12 +29,14 @@ async def create_comment(
         raise HTTPException(status_code=404, detail="Post not found")
 
     # 2. Create comment (FIXED ARGUMENTS)
-    return await crud.create_comment(
+    db_comment = await crud.create_comment(
         db=db, 
         comment=comment,           # Matches crud.py definition
         user_id=current_user.id,   # Matches crud.py definition (not author_id)
         post_id=post_id
     )
+    await cache.bump("comments")
+    return db_comment
 
 # --- Get Comments for a Post ---
 @router.get("/", response_model=List[schemas.Comment])
@@ -40,4 +44,6 @@ async def read_comments(
     post_id: int,
     db: AsyncSession = Depends(get_db)
 ):
+    if serializers.FAST_SERIALIZATION:
+        return serializers.FastJSONResponse(await serializers.project_comments(db, post_id))
     return await crud.get_comments_by_post(db, post_id=post_id)
\ No newline at end of file
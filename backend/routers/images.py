@@ -1,13 +1,18 @@
 # backend/routers/images.py
 
-import os
-import cloudinary
-import cloudinary.uploader
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from PIL import Image
-import io
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Request, status, UploadFile, File, Form
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import orjson
+from database import get_db
 from auth_utils import get_current_active_user
+from image_utils import check_upload_size
 import schemas
+import storage
+import admission
+import dedup
+import idempotency
 import logging
 logger = logging.getLogger(__name__)
 
@@ -16,59 +21,132 @@ router = APIRouter(
     tags=["Images"]
 )
 
-# Check for Test Mode
-USE_MOCK_CLOUD = os.getenv("USE_MOCK_CLOUD") == "True"
-
-cloudinary.config(
-      cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME"),
-      api_key = os.getenv("CLOUDINARY_API_KEY"),
-      api_secret = os.getenv("CLOUDINARY_API_SECRET")
-    )
+USE_MOCK_CLOUD = storage.USE_MOCK_CLOUD
 
+#with an Idempotency-Key a retried upload gets the first one's url back, without encoding or storing the image again.
+#only the request that does the work is rate limited, a replay never spends a token
 @router.post("/upload/")
 async def upload_image(
+    request: Request,
     file: UploadFile = File(...),
-    current_user: schemas.User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_active_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
+    if not idempotency.wanted(idempotency_key):
+        await admission.upload_writes(request)
+        return await store_upload(file, db, current_user)
+
+    async def work():
+        await admission.upload_writes(request)   # a 429 gives the claim up again, like any failure
+        return status.HTTP_200_OK, orjson.dumps(await store_upload(file, db, current_user))
+    #the same file sent again, not the bytes themselves: hashing them is the work a retry is meant to skip
+    fingerprint = idempotency.fingerprint(file.filename, file.content_type, file.size)
+    return await idempotency.store.run(current_user.id, "POST /images/upload/", idempotency_key, fingerprint, work)
+
+async def store_upload(file: UploadFile, db: AsyncSession, current_user: schemas.User) -> dict:
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File provided is not an image.")
     if USE_MOCK_CLOUD:
         logger.warning(f" MOCK UPLOAD: Pretending to upload {file.filename}")
-        # Return a fake URL 
+        # Return a fake URL
         return {    #made up values
             "message": "Mock Image uploaded successfully!",
-            "url": f"https://res.cloudinary.com/dcgsvilo0/image/upload/v1767363674/community_app_posts/taqhlxcaoqozzhd2xgqw.webp", 
+            "url": f"https://res.cloudinary.com/dcgsvilo0/image/upload/v1767363674/community_app_posts/taqhlxcaoqozzhd2xgqw.webp",
             "public_id": "mock_id_fake_id",
-            "judgement" :{ "predicted_class": "paper", 
-                            "confidence": "33.84%", 
+            "judgement" :{ "predicted_class": "paper",
+                            "confidence": "33.84%",
                             "recommended_dustbin":  " Blue Dustbin (Dry Waste / Recyclable)",
-                            "points": 5 } 
+                            "points": 5 }
         }
 
+    check_upload_size(file)
     try:
-        contents = await file.read()
-        img = Image.open(io.BytesIO(contents))
-        img.thumbnail((1920, 1080))
-        
-        processed_image_io = io.BytesIO()
-        img.save(processed_image_io, format='WEBP', quality=85)
-        processed_image_io.seek(0)
-
-        upload_result = cloudinary.uploader.upload(
-            processed_image_io,
-            folder="community_app_posts"
-        )
-        # print("CLODUINARY SEEMS FINE")
+        public_id = storage.new_public_id(current_user.id)
+        stored = await storage.store_image(file.file, public_id)
+        await dedup.remember_hash(db, public_id, stored["image_hash"])   # looked up again when the post is created
+        await db.commit()
         # judgement = await calculate_points(upload_result.get("secure_url"),upload_result.get("public_id"))
         return {
             "message": "Image uploaded successfully!",
-            "url": upload_result.get("secure_url"),
-            "public_id": upload_result.get("public_id"),
+            "url": stored["url"],
+            "public_id": public_id,
+            "variants": stored["variants"],
             # "judgement": judgement
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error uploading file: {e}"
         )
-    
+
+
+# --- SIGNED DIRECT UPLOADS ---
+''' the image bytes skip our workers entirely:
+    1. client asks /images/sign/ for a short lived signature
+    2. client posts the file + "fields" straight to "upload_url"
+    3. client confirms via /images/confirm/ (or just creates the post, which verifies the public_id)
+'''
+@router.post("/sign/", dependencies=[Depends(admission.upload_writes)])
+async def sign_image_upload(
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    try:
+        return storage.sign_upload(current_user.id)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+
+@router.post("/confirm/", dependencies=[Depends(admission.upload_writes)])
+async def confirm_image_upload(
+    public_id: str = Body(..., embed=True),
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    url = await storage.verify_upload(public_id, current_user.id)
+    if not url:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    #the image went straight to storage, hash it now so creating the post doesn't have to
+    await dedup.hash_for(db, public_id)
+    await db.commit()
+    return {
+        "message": "Image uploaded successfully!",
+        "url": url,
+        "public_id": public_id,
+    }
+
+
+# --- LOCAL STORAGE STAND-IN ---
+# plays the role of cloudinary when the local backend is on, for offline dev, tests and benchmarks
+@router.post("/local/{public_id:path}", dependencies=[Depends(admission.upload_writes)])
+async def local_storage_upload(
+    public_id: str,
+    token: str = Form(...),
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db)
+):
+    if not storage.USE_LOCAL_STORAGE:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not storage.check_local_upload_token(token, public_id):
+        raise HTTPException(status_code=403, detail="Invalid or expired upload signature")
+
+    check_upload_size(file)
+    stored = await storage.store_image(file.file, public_id)
+    await dedup.remember_hash(db, public_id, stored["image_hash"])
+    await db.commit()
+
+    return {"public_id": public_id, "secure_url": stored["url"]}
+
+@router.get("/local/{public_id:path}")
+async def local_storage_download(public_id: str):
+    # public_id here can also be a variant key, e.g. <public_id>_224. only keys we issued, only under the storage dir
+    if not storage.USE_LOCAL_STORAGE or not storage.is_managed(public_id):
+        raise HTTPException(status_code=404, detail="Not Found")
+    try:
+        path = storage.get_storage().path(public_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Not Found")
+    return FileResponse(path, media_type="image/webp")
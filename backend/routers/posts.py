@@ -2,14 +2,27 @@
 
 from urllib.parse import urljoin
 from zoneinfo import ZoneInfo
-from fastapi import APIRouter, BackgroundTasks, Body, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
 from sqlalchemy.orm import selectinload 
-from typing import List
+from typing import List, Literal, Optional
 import httpx
 from database import get_db, AsyncSessionLocal
 import schemas, models
+import storage
+import dedup
+import tiles
+import cache
+import serializers
+import metrics
+import tracing
+import http_client
+import admission
+import bulk_import
+import export
+import idempotency
 from database import get_db
 from auth_utils import get_current_active_user
 import os
@@ -19,6 +32,8 @@ logger = logging.getLogger(__name__)
 
 CLASSIFIER_MICORSERVICE = os.getenv("CLASSIFIER_MICORSERVICE") 
 ml_url = urljoin(CLASSIFIER_MICORSERVICE, "/predict_with_urls")
+similar_url = urljoin(CLASSIFIER_MICORSERVICE, "/similar")
+verify_url = urljoin(CLASSIFIER_MICORSERVICE, "/verify_cleanup")
 logger.info(CLASSIFIER_MICORSERVICE)
 
 router = APIRouter(
@@ -27,18 +42,29 @@ router = APIRouter(
 )
 
 
+#one classifier call: the parsed prediction, None if the classifier answered with an error status
+async def request_classification(post_id: int, image_url: str):
+    #calling ML service and passing the public link thatt cloudinary gave 
+    #post_id lets the classifier keep the embedding for "similar reports"
+    with metrics.CLASSIFIER_LATENCY.labels("predict").time(), tracing.span("classifier.predict", post_id=post_id) as span:
+        resp = await http_client.get().post(ml_url, json={"image_url": image_url, "post_id": post_id},
+                                            headers=tracing.inject(), timeout=30.0)
+        span.set("http.status_code", resp.status_code)
+    if resp.status_code != 200:
+        logger.warning(f" [Background-----] ML Service returned {resp.status_code}")
+        return None
+    return resp.json()
+
+
 #this runs in the background. it calls the ML service and updates the DB
 async def process_post_ml(post_id: int, image_url: str):
     
     try:
-        #calling ML service and passing the public link thatt cloudinary gave 
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(ml_url, json={"image_url": image_url}, timeout=30.0)
+        data = await request_classification(post_id, image_url)
             
-        if resp.status_code == 200:
-            data = resp.json()
+        if data is not None:
             #extract data
-            logger.info("ML SERVICE RESPONSE",data) 
+            logger.info(f"ML SERVICE RESPONSE for post {post_id}: {data}")
             pred_class = data.get("predicted_class", "Unknown") 
             #if cat is misssing , defaults to unknown , points is converted to integer
             points = int(data.get("points", 0))         
@@ -49,12 +75,13 @@ async def process_post_ml(post_id: int, image_url: str):
                 result = await db.execute(select(models.Post).where(models.Post.id == post_id))
                 post = result.scalars().first()
                 if post:
+                    old_class = post.predicted_class
                     post.predicted_class = pred_class
                     post.points = points
+                    await tiles.track(db, post, post.status, old_class)
                     await db.commit()
+                    await cache.bump("posts")
                     logger.info(f"[Background] Post {post_id} updated: {pred_class} ({points} pts)")
-        else:
-            logger.warning(f" [Background-----] ML Service returned {resp.status_code}")
 
     except Exception as e:
         logger.error(f"[Background-----] ML Error: {e}")
@@ -64,9 +91,12 @@ async def process_post_ml(post_id: int, image_url: str):
             result = await db.execute(select(models.Post).where(models.Post.id == post_id))
             post = result.scalars().first()
             if post:
+                old_class = post.predicted_class
                 post.predicted_class = "ERROR"
                 post.points = 0
+                await tiles.track(db, post, post.status, old_class)
                 await db.commit()
+                await cache.bump("posts")
 
 
 # GET FEED for community folks - FIXED with volunteer selectinload
@@ -76,6 +106,16 @@ async def get_feed(
     limit: int = 20, 
     db: AsyncSession = Depends(get_db)
 ):
+    if serializers.FAST_SERIALIZATION:
+        query = (
+            serializers.post_select()
+            .where(models.Post.status.in_(models.ACTIVE_STATUSES))
+            .order_by(desc(models.Post.created_at))
+            .offset(skip)
+            .limit(limit)
+        )
+        return serializers.FastJSONResponse(await serializers.project_posts(db, query))
+
     query = (
         select(models.Post)
         .options(
@@ -85,7 +125,7 @@ async def get_feed(
             selectinload(models.Post.resolved_by),
             selectinload(models.Post.volunteer)  # FIXED: Added to prevent async lazy loading error
         )
-        .where(models.Post.status != models.TaskStatus.COMPLETED)
+        .where(models.Post.status.in_(models.ACTIVE_STATUSES)) # same predicate as ix_posts_active_created_at
         .order_by(desc(models.Post.created_at))
         .offset(skip)
         .limit(limit)
@@ -94,11 +134,60 @@ async def get_feed(
     return result.scalars().all()
 
 
+# MAP TILES: clustered counts by status and class for one slippy map tile
+@router.get("/tiles/{z}/{x}/{y}")
+async def get_map_tile(
+    z: int,
+    x: int,
+    y: int,
+    db: AsyncSession = Depends(get_db)
+):
+    if not 0 <= z <= tiles.MAX_ZOOM or not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    return await tiles.get_tile(db, z, x, y)
+
+
+# SIMILAR REPORTS, nearest image embeddings from the classifier's vector index
+@router.get("/{post_id}/similar", response_model=List[schemas.Post])
+async def get_similar_posts(
+    post_id: int,
+    k: int = 10,
+    db: AsyncSession = Depends(get_db)
+):
+    try:
+        with metrics.CLASSIFIER_LATENCY.labels("similar").time(), tracing.span("classifier.similar", post_id=post_id):
+            resp = await http_client.get().post(similar_url, json={"post_id": post_id, "k": k}, headers=tracing.inject(), timeout=10.0)
+    except httpx.HTTPError as e:
+        logger.error(f"Similar posts lookup failed: {e}")
+        raise HTTPException(status_code=503, detail="Classifier is unavailable")
+    if resp.status_code == 404:
+        return []
+    if resp.status_code != 200:
+        raise HTTPException(status_code=502, detail="Classifier returned an error")
+
+    ids = [r["post_id"] for r in resp.json().get("results", [])]
+    if not ids:
+        return []
+    query = (
+        select(models.Post)
+        .options(
+            selectinload(models.Post.author),
+            selectinload(models.Post.likes),
+            selectinload(models.Post.comments).selectinload(models.Comment.author),
+            selectinload(models.Post.resolved_by),
+            selectinload(models.Post.volunteer)
+        )
+        .where(models.Post.id.in_(ids))
+    )
+    posts = {p.id: p for p in (await db.execute(query)).scalars().all()}
+    return [posts[i] for i in ids if i in posts]   # keep the similarity order
+
+
 ''' just in case ML spits wrong result we give author option 
     to change it manually,  
     it calls this enpoint passing post id and new cat
 '''
-@router.patch("/{post_id}", response_model=schemas.Post)
+@router.patch("/{post_id}", response_model=schemas.Post, dependencies=[Depends(admission.post_writes)])
 async def author_update_post(
     post_id: int,
     post_update: schemas.PostUpdate,
@@ -121,13 +210,16 @@ async def author_update_post(
 
     #apply updates
     if post_update.predicted_class is not None:
+        old_class = post.predicted_class
         post.predicted_class = post_update.predicted_class
+        await tiles.track(db, post, post.status, old_class)
     if post_update.points is not None:
         post.points = post_update.points
     if post_update.caption is not None:
         post.caption = post_update.caption
 
     await db.commit()
+    await cache.bump("posts")
     
     #CRITICAL FIX: Re-fetch with relationships loaded
     query = (
@@ -150,9 +242,9 @@ async def author_update_post(
 #NEW BACKGROUND TASK: VERIFY VOLUNTEER PHOTO , phase1
 async def verify_volunteer_post_ml(post_id: int, image_url: str):
     try:
-        async with httpx.AsyncClient() as client:
-            # call the same ML service to check the new photo
-            resp = await client.post(ml_url, json={"image_url": image_url}, timeout=30.0)
+        # call the same ML service to check the new photo
+        with metrics.CLASSIFIER_LATENCY.labels("verify").time(), tracing.span("classifier.verify", post_id=post_id):
+            resp = await http_client.get().post(ml_url, json={"image_url": image_url}, headers=tracing.inject(), timeout=30.0)
             
         if resp.status_code == 200:
             data = resp.json()
@@ -165,13 +257,43 @@ async def verify_volunteer_post_ml(post_id: int, image_url: str):
                     #we save this as "verified_points" for comparison later
                     post.verified_points = points 
                     await db.commit()
+                    await cache.bump("posts")
                     logger.info(f"[Verification-----] Post {post_id} check: ML found {points} pts")
     except Exception as e:
         logger.error(f"[Verification-----] Error: {e}")
 
 
+#NEW BACKGROUND TASK: BEFORE / AFTER CHECK at proof submission, phase 2
+#original + start + end photos in one classifier call, images it has already classified come from its cache
+async def verify_cleanup_ml(post_id: int, original_url: str, start_url: str, end_url: str):
+    try:
+        with metrics.CLASSIFIER_LATENCY.labels("verify_cleanup").time(), tracing.span("classifier.verify_cleanup", post_id=post_id) as span:
+            resp = await http_client.get().post(
+                verify_url,
+                json={"original_url": original_url, "start_url": start_url, "end_url": end_url, "post_id": post_id},
+                headers=tracing.inject(), timeout=30.0
+            )
+            span.set("http.status_code", resp.status_code)
+        if resp.status_code != 200:
+            logger.warning(f"[Verification-----] Post {post_id} cleanup check returned {resp.status_code}")
+            return
+        data = resp.json()
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(models.Post).where(models.Post.id == post_id))
+            post = result.scalars().first()
+            if post:
+                post.cleanliness_delta = float(data["cleanliness_delta"])
+                if post.verified_points is None and "start" in data["images"]:   # the start_work check never landed
+                    post.verified_points = int(data["images"]["start"].get("points", 0))
+                await db.commit()
+                await cache.bump("posts")
+                logger.info(f"[Verification-----] Post {post_id} cleanup check: delta {post.cleanliness_delta:.2f} ({data.get('inferred')} images inferred)")
+    except Exception as e:
+        logger.error(f"[Verification-----] Cleanup check error: {e}")
+
 # START WORK (Clock In) by volunteer
-@router.post("/{post_id}/start_work", response_model=schemas.Post)
+@router.post("/{post_id}/start_work", response_model=schemas.Post, dependencies=[Depends(admission.post_writes)])
 async def start_cleanup_work(
     post_id: int,
     background_tasks: BackgroundTasks,
@@ -193,11 +315,13 @@ async def start_cleanup_work(
     post.volunteer_id = current_user.id
     post.start_image_url = start_image_url
     post.volunteer_start_timestamp = datetime.now(ZoneInfo("Asia/Kolkata"))
+    await tiles.track(db, post, models.TaskStatus.OPEN, post.predicted_class)
     
     await db.commit()
+    await cache.bump("posts")
     
     #triggers background verification
-    background_tasks.add_task(verify_volunteer_post_ml, post.id, start_image_url)
+    metrics.queue_job(background_tasks, "verify_volunteer", verify_volunteer_post_ml, post.id, start_image_url)
     
     #CRITICAL FIX: Re-fetch with relationships
     query = (
@@ -216,9 +340,10 @@ async def start_cleanup_work(
 
 
 # SUBMIT PROOF (Clock Out) 
-@router.post("/{post_id}/submit_proof", response_model=schemas.Post)
+@router.post("/{post_id}/submit_proof", response_model=schemas.Post, dependencies=[Depends(admission.post_writes)])
 async def submit_cleanup_proof(
     post_id: int,
+    background_tasks: BackgroundTasks,
     end_image_url: str = Body(..., embed=True),
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
@@ -248,8 +373,14 @@ async def submit_cleanup_proof(
     post.end_image_url = end_image_url
     post.volunteer_end_timestamp = end_time
     post.cleanup_duration_minutes = duration_min
+    await tiles.track(db, post, models.TaskStatus.IN_PROGRESS, post.predicted_class)
     
     await db.commit()
+    await cache.bump("posts")
+
+    #before / after check, so the author isn't approving blind
+    original_url = storage.classifier_image_url(post.image_public_id, post.image_url)   # the url the post was classified with
+    metrics.queue_job(background_tasks, "verify_cleanup", verify_cleanup_ml, post.id, original_url, post.start_image_url, end_image_url)
     
     #CRITICAL FIX: Re-fetch
     query = (
@@ -268,10 +399,10 @@ async def submit_cleanup_proof(
 
 
 # APPROVE & PAY (Resolution) 
-@router.post("/{post_id}/approve", response_model=schemas.Post)
+@router.post("/{post_id}/approve", response_model=schemas.Post, dependencies=[Depends(admission.post_writes)])
 async def approve_work(
     post_id: int,
-    final_points: int = Body(..., embed=True),
+    final_points: int = Body(..., embed=True),   # the author decides, cleanliness_delta on the post is only a hint
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
@@ -293,11 +424,14 @@ async def approve_work(
          
     post.status = models.TaskStatus.COMPLETED
     post.points = final_points 
+    dedup.index.discard(post.id)
+    await tiles.track(db, post, models.TaskStatus.PENDING_APPROVAL, post.predicted_class)
     
     if post.volunteer:
         post.volunteer.points += final_points
     
     await db.commit()
+    await cache.bump("posts", "points")    #leaderboard moves with the payout
 
     #CRITICAL FIX: Re-fetch
     query = (
@@ -315,29 +449,76 @@ async def approve_work(
     return result.scalars().first()
 
 
+#an Idempotency-Key makes app retries safe: a repeat gets the first response back instead of a second post
+#and a second classifier call, a repeat that overlaps the first waits for it (see idempotency.py).
+#the rate limit only applies to the request that does the work, a replay never spends a token
 @router.post("/", response_model=schemas.Post, status_code=status.HTTP_201_CREATED)
 async def author_create_request(
+    request: Request,
     post_data: schemas.PostCreate,
     background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    current_user: models.User = Depends(get_current_active_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
+    if not idempotency.wanted(idempotency_key):
+        await admission.post_writes(request)
+        return await create_post(post_data, background_tasks, db, current_user)
+
+    async def work():
+        await admission.post_writes(request)   # a 429 gives the claim up again, like any failure
+        post = await create_post(post_data, background_tasks, db, current_user)
+        return status.HTTP_201_CREATED, schemas.Post.model_validate(post).model_dump_json().encode()
+    return await idempotency.store.run(
+        current_user.id, "POST /posts/", idempotency_key, idempotency.fingerprint(post_data.model_dump_json()), work
+    )
+
+async def create_post(post_data: schemas.PostCreate, background_tasks: BackgroundTasks, db: AsyncSession, current_user: models.User):
+    image_url = post_data.image_url
+    #signed uploads: the image never passed through us, so make sure it really landed in storage
+    if storage.SIGNED_UPLOADS:
+        image_url = await storage.verify_upload(post_data.image_public_id, current_user.id)
+        if not image_url:
+            raise HTTPException(status_code=400, detail="Image upload could not be verified")
+
+    #same pile of trash reported again near an open task? flag it and reuse the original's classification.
+    #the hash is the one we computed from the user's own upload, a client can't pick the task it matches
+    image_hash = None
+    if storage.owns_public_id(post_data.image_public_id, current_user.id):
+        image_hash = await dedup.hash_for(db, post_data.image_public_id)
+    original = None
+    if image_hash:
+        original = await dedup.find_duplicate(db, image_hash, post_data.latitude, post_data.longitude)
+    reuse_classification = original is not None and original.predicted_class not in (None, "Analysing", "ERROR")
+
     new_post = models.Post(
-        image_url=post_data.image_url,
+        image_url=image_url,
         image_public_id=post_data.image_public_id,
         caption=post_data.caption,
         latitude=post_data.latitude,
         longitude=post_data.longitude,
-        predicted_class="Analysing", 
-        points=0,
+        predicted_class=original.predicted_class if reuse_classification else "Analysing",
+        points=original.points if reuse_classification else 0,
         author_id=current_user.id,
-        status=models.TaskStatus.OPEN
+        status=models.TaskStatus.OPEN,
+        image_hash=image_hash,
+        duplicate_of_id=original.id if original else None
     )
     db.add(new_post)
+    await tiles.apply(db, new_post.latitude, new_post.longitude, new_post.status, new_post.predicted_class, +1)
     await db.commit()
+    await cache.bump("posts")
     await db.refresh(new_post)
-    
-    background_tasks.add_task(process_post_ml, new_post.id, new_post.image_url)
+
+    if original:
+        logger.info(f"Post {new_post.id} looks like a duplicate of post {original.id}")
+    elif new_post.image_hash:
+        dedup.index.add(new_post.id, new_post.image_hash, new_post.latitude, new_post.longitude)
+
+    if not reuse_classification:
+        #the classifier gets the small pre-resized variant instead of the full photo
+        classifier_url = storage.classifier_image_url(new_post.image_public_id, new_post.image_url)
+        metrics.queue_job(background_tasks, "classify_post", process_post_ml, new_post.id, classifier_url)
     
     # FIX: Re-fetch with ALL relationships including volunteer and comment authors
     query = (
@@ -352,4 +533,55 @@ async def author_create_request(
         .where(models.Post.id == new_post.id)
     )
     result = await db.execute(query)
-    return result.scalars().first()
\ No newline at end of file
+    return result.scalars().first()
+
+
+# --- BULK IMPORT ---
+#partner survey dumps as NDJSON, one PostCreate per line (see bulk_import.py). answers once the whole body
+#is stored, classification carries on in the background: poll GET /posts/bulk/{job_id}
+@router.post("/bulk", response_model=schemas.ImportJob, status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(admission.post_writes)])
+async def bulk_import_posts(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    importer = bulk_import.Importer(db, current_user.id, request_classification, background_tasks)
+    return await importer.run(request.stream())
+
+@router.get("/bulk/{job_id}", response_model=schemas.ImportJob)
+async def bulk_import_progress(
+    job_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    job = await db.get(models.ImportJob, job_id)
+    if not job or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
+# --- EXPORT ---
+#partner dumps of live and archived posts, streamed off a server-side cursor (see export.py)
+@router.get("/export", dependencies=[Depends(admission.exports)])
+async def export_posts(
+    format: Literal["ndjson", "csv", "parquet"] = "ndjson",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    date_field: Literal["created", "completed"] = "created",
+    statuses: Optional[List[models.TaskStatus]] = Query(None, alias="status"),
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    try:
+        body = export.stream(
+            format, since=since, until=until, date_field=date_field,
+            statuses=statuses, bbox=export.parse_bbox(bbox) if bbox else None,
+        )
+    except export.ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        body,
+        media_type=export.FORMATS[format][0],
+        headers={"Content-Disposition": f'attachment; filename="{export.filename(format)}"'},
+    )
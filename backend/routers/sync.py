@@ -0,0 +1,36 @@
+# backend/routers/sync.py
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+import schemas
+import models
+import serializers
+import sync
+import admission
+from database import get_db
+from auth_utils import get_current_active_user
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["Sync"]
+)
+
+# --- DELTA SYNC (mobile refresh) ---
+# rows changed since the token from the last call, see sync.py. no since = a full first sync, page by page.
+# it hands out completed posts and archive tombstones the public feed hides, so only to signed in users
+@router.get("", response_model=schemas.SyncPage, dependencies=[Depends(admission.syncs)])
+async def get_changes(
+    since: Optional[str] = None,
+    limit: int = sync.SYNC_PAGE_SIZE,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    if not 1 <= limit <= sync.SYNC_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {sync.SYNC_PAGE_SIZE}")
+    try:
+        page = await sync.changes(db, since, limit)
+    except sync.InvalidToken:
+        raise HTTPException(status_code=400, detail="Invalid sync token, start over without since")
+    return serializers.FastJSONResponse(page)
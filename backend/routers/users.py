@@ -7,6 +7,7 @@ from sqlalchemy.orm import selectinload
 from typing import List
 
 import schemas, models
+import serializers
 from database import get_db
 from auth_utils import get_current_active_user
 
@@ -28,51 +29,58 @@ async def get_my_stats(
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
+    # finished tasks may already live in the archive tables, every read below covers both
+    Post, Archived = models.Post, models.ArchivedPost
+
     # 1. Tasks I created
-    created_q = select(func.count()).where(models.Post.author_id == current_user.id)
-    created_res = await db.execute(created_q)
-    created_count = created_res.scalar()
+    created_q = select(
+        select(func.count()).where(Post.author_id == current_user.id).scalar_subquery(),
+        select(func.count()).where(Archived.author_id == current_user.id).scalar_subquery()
+    )
+    created_count = sum((await db.execute(created_q)).one())
 
     # 2. Tasks I solved (Completed contributions)
-    solved_q = select(func.count()).where(models.Post.resolved_by_id == current_user.id)
-    solved_res = await db.execute(solved_q)
-    solved_count = solved_res.scalar()
+    solved_q = select(
+        select(func.count()).where(Post.resolved_by_id == current_user.id).scalar_subquery(),
+        select(func.count()).where(Archived.resolved_by_id == current_user.id).scalar_subquery()
+    )
+    solved_count = sum((await db.execute(solved_q)).one())
+
+    async def live_and_archived(where):
+        if serializers.FAST_SERIALIZATION:
+            posts = []
+            for model in (Post, Archived):
+                query = serializers.post_select(model).where(where(model)).order_by(desc(model.created_at))
+                posts.extend(await serializers.project_posts(db, query, archived=model is Archived))
+            return sorted(posts, key=lambda p: p["created_at"], reverse=True)
+
+        posts = []
+        for model in (Post, Archived):
+            query = (
+                select(model)
+                .options(
+                    selectinload(model.author),
+                    selectinload(model.volunteer),
+                    selectinload(model.resolved_by)
+                )
+                .where(where(model))
+                .order_by(desc(model.created_at))
+            )
+            posts.extend((await db.execute(query)).scalars().all())
+        return sorted(posts, key=lambda p: p.created_at, reverse=True)
 
     # 3. Get my requests (posts I created)
-    my_requests_q = (
-        select(models.Post)
-        .options(
-            selectinload(models.Post.author),
-            selectinload(models.Post.volunteer),
-            selectinload(models.Post.resolved_by)
-        )
-        .where(models.Post.author_id == current_user.id)
-        .order_by(desc(models.Post.created_at))
-    )
-    
+    my_requests = await live_and_archived(lambda m: m.author_id == current_user.id)
+
     # 4. Get my contributions - includes:
     #    - Posts where I am the active volunteer (volunteer_id)
     #    - Posts where I completed the work (resolved_by_id)
-    my_contribs_q = (
-        select(models.Post)
-        .options(
-            selectinload(models.Post.author),
-            selectinload(models.Post.volunteer),
-            selectinload(models.Post.resolved_by)
-        )
-        .where(
-            or_(
-                models.Post.volunteer_id == current_user.id,
-                models.Post.resolved_by_id == current_user.id
-            )
-        )
-        .order_by(desc(models.Post.created_at))
-    )
-    
-    my_requests = (await db.execute(my_requests_q)).scalars().all()
-    my_contribs = (await db.execute(my_contribs_q)).scalars().all()
+    my_contribs = await live_and_archived(lambda m: or_(
+        m.volunteer_id == current_user.id,
+        m.resolved_by_id == current_user.id
+    ))
 
-    return {
+    stats = {
         # --- FIX: FILTER SENSITIVE DATA ---
         # This converts the DB object to the 'UserPublic' schema 
         # which ONLY has 'username' and 'points'. No password. No email.
@@ -86,10 +94,16 @@ async def get_my_stats(
         "my_requests": my_requests,
         "my_contributions": my_contribs
     }
+    if serializers.FAST_SERIALIZATION:
+        stats["user"] = stats["user"].model_dump()
+        return serializers.FastJSONResponse(stats)
+    return stats
 
 # --- 3. LEADERBOARD ---
 @router.get("/leaderboard", response_model=List[schemas.UserPublic])
 async def get_leaderboard(db: AsyncSession = Depends(get_db)):
+    if serializers.FAST_SERIALIZATION:
+        return serializers.FastJSONResponse(await serializers.project_leaderboard(db))
     # Fetch top 10 users by points
     query = select(models.User).order_by(desc(models.User.points)).limit(10)
     result = await db.execute(query)
@@ -0,0 +1,189 @@
+# backend/scheduler.py
+
+''' periodic jobs (the sweeper, the archiver) run by ONE worker at a time, however many uvicorn workers there are.
+
+    leadership is a postgres session level advisory lock (pg_try_advisory_lock) on a connection the leader
+    keeps for itself. only the worker holding it runs jobs, the others try again every LEADER_RETRY_SECONDS.
+    when the leader exits or its connection dies the lock goes with the session and the next worker to
+    retry takes over, running every job straight away. the leader pings its connection before each round,
+    so a lost lock is noticed within SCHEDULER_TICK_SECONDS.
+    sqlite has no advisory locks, there the lock is an flock on a file next to the database, which covers
+    every worker that can open that file.
+'''
+
+import os
+import time
+import asyncio
+import logging
+from sqlalchemy import text
+
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "True") == "True"
+SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS", "5"))
+LEADER_RETRY_SECONDS = float(os.getenv("LEADER_RETRY_SECONDS", "30"))
+SCHEDULER_LOCK_ID = 72_410_002   # next to migrations.ADVISORY_LOCK_ID
+
+
+# --- LEADER LEASES ---
+
+class AdvisoryLease:
+    def __init__(self, engine, lock_id: int = SCHEDULER_LOCK_ID):
+        self.engine = engine
+        self.lock_id = lock_id
+        self.conn = None
+
+    #True while this worker is the leader
+    async def acquire(self) -> bool:
+        if self.conn is not None:
+            try:
+                await self.conn.execute(text("SELECT 1"))
+                return True
+            except Exception as e:
+                logger.warning(f"[Scheduler] lost the leader connection: {e}")
+                await self.release()
+
+        #autocommit, a leader must not sit idle in a transaction for hours
+        conn = await (await self.engine.connect()).execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            got = (await conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": self.lock_id})).scalar()
+        except Exception:
+            await conn.close()
+            raise
+        if not got:
+            await conn.close()
+            return False
+        self.conn = conn
+        return True
+
+    async def release(self):
+        conn, self.conn = self.conn, None
+        if conn is None:
+            return
+        try:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": self.lock_id})
+        except Exception:
+            pass    # a dead session has already dropped the lock
+        try:
+            await conn.close()
+        except Exception:
+            await conn.invalidate()
+
+
+class FileLease:
+    def __init__(self, path: str):
+        self.path = path
+        self.fd = None
+
+    async def acquire(self) -> bool:
+        if self.fd is not None:
+            return True
+        try:
+            import fcntl
+        except ImportError:   # windows dev box, one worker
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    async def release(self):
+        if self.fd is not None:
+            os.close(self.fd)   # drops the flock
+            self.fd = None
+
+
+class LocalLease:
+    '''in-memory sqlite: nothing is shared between processes, every worker is its own leader'''
+
+    async def acquire(self) -> bool:
+        return True
+
+    async def release(self):
+        pass
+
+def lease_for(engine):
+    if engine.dialect.name == "postgresql":
+        return AdvisoryLease(engine)
+    database = engine.url.database
+    if not database or database == ":memory:":
+        return LocalLease()
+    return FileLease(os.path.abspath(database) + ".scheduler.lock")
+
+
+# --- SCHEDULER ---
+
+class Job:
+    __slots__ = ("name", "interval", "fn", "next_run")
+
+    def __init__(self, name: str, interval: float, fn):
+        self.name, self.interval, self.fn = name, interval, fn
+        self.next_run = 0.0
+
+
+class Scheduler:
+    def __init__(self, engine):
+        self.engine = engine
+        self.jobs = []
+        self.leader = False
+        self.task = None
+
+    def every(self, name: str, seconds: float, fn):
+        self.jobs.append(Job(name, seconds, fn))
+
+    async def run_job(self, job: Job):
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"job.{job.name}"):
+                await job.fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.JOB_ERRORS.labels(job.name).inc()
+            logger.error(f"[Scheduler] {job.name} failed: {e}")
+        finally:
+            metrics.JOB_DURATION.labels(job.name).observe(time.perf_counter() - start)
+            job.next_run = time.monotonic() + job.interval
+
+    async def run(self):
+        lease = lease_for(self.engine)
+        try:
+            while True:
+                try:
+                    leader = await lease.acquire()
+                except Exception as e:
+                    logger.error(f"[Scheduler] leader election failed: {e}")
+                    leader = False
+                if leader != self.leader:
+                    logger.info(f"[Scheduler] {'took over as' if leader else 'no longer'} leader (pid {os.getpid()})")
+                    metrics.SCHEDULER_LEADER.set(int(leader))
+                    for job in self.jobs:   # a new leader doesn't know when the last one ran them
+                        job.next_run = 0.0
+                    self.leader = leader
+                if not leader:
+                    await asyncio.sleep(LEADER_RETRY_SECONDS)
+                    continue
+
+                for job in self.jobs:
+                    if time.monotonic() >= job.next_run:
+                        await self.run_job(job)
+                await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+        finally:
+            await lease.release()
+            metrics.SCHEDULER_LEADER.set(0)
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+        return self
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
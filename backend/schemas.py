@@ -1,6 +1,7 @@
 # backend/schemas.py
 
-from pydantic import BaseModel, EmailStr
+import json
+from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional, List
 from datetime import datetime
 from models import TaskStatus
@@ -98,6 +99,8 @@ class Post(PostBase):
     volunteer_end_timestamp: Optional[datetime] = None
     cleanup_duration_minutes: Optional[int] = None
     verified_points: Optional[int] = None
+    cleanliness_delta: Optional[float] = None # before minus after, from the classifier's check of the proof photo, advisory only
+    duplicate_of_id: Optional[int] = None # set when this report matched an existing open task
     volunteer: Optional[UserPublic] = None # To see who cleaned it
 
     author: Optional[UserPublic] = None     # Use safe user
@@ -106,4 +109,73 @@ class Post(PostBase):
     likes: List[Like] = []
 
     class Config:
-            from_attributes = True
\ No newline at end of file
+            from_attributes = True
+
+
+# --- Bulk import ---
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+class ImportJob(BaseModel):
+    id: str
+    status: str
+    rows_read: int
+    inserted: int
+    rejected: int
+    classified: int
+    classify_failed: int
+    errors: List[ImportRowError] = []
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    #stored as a JSON string on the row
+    @field_validator("errors", mode="before")
+    @classmethod
+    def parse_errors(cls, value):
+        return json.loads(value) if isinstance(value, str) else (value or [])
+
+    class Config:
+        from_attributes = True
+
+
+# --- Delta sync ---
+# flat rows, the client joins them by id (users on author_id / volunteer_id / resolved_by_id, comments on post_id)
+class SyncPost(PostBase):
+    id: int
+    status: TaskStatus
+    predicted_class: Optional[str] = None
+    points: int
+    author_id: int
+    volunteer_id: Optional[int] = None
+    resolved_by_id: Optional[int] = None
+    start_image_url: Optional[str] = None
+    end_image_url: Optional[str] = None
+    proof_image_url: Optional[str] = None
+    volunteer_start_timestamp: Optional[datetime] = None
+    volunteer_end_timestamp: Optional[datetime] = None
+    cleanup_duration_minutes: Optional[int] = None
+    verified_points: Optional[int] = None
+    cleanliness_delta: Optional[float] = None
+    duplicate_of_id: Optional[int] = None
+    created_at: datetime
+    updated_at: datetime
+
+class SyncComment(CommentBase):
+    id: int
+    author_id: int
+    post_id: int
+    created_at: datetime
+    updated_at: datetime
+
+class SyncUser(UserPublic):
+    id: int
+    updated_at: datetime
+
+class SyncPage(BaseModel):
+    posts: List[SyncPost] = []
+    comments: List[SyncComment] = []
+    users: List[SyncUser] = []
+    deleted_posts: List[int] = []   # archived since the last sync, drop them and their comments
+    next: str                       # the since= of the next call
+    has_more: bool                  # call again right away, this page hit the size cap
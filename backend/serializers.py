@@ -0,0 +1,106 @@
+# backend/serializers.py
+
+''' fast read path for the big list responses: feed, profile stats, leaderboard and comments.
+
+    the ORM path loads objects through selectinload, validates them into schemas.Post via from_attributes
+    and then FastAPI validates the result a second time against response_model before json encoding it.
+    here the rows are selected as plain tuples, stitched into dicts shaped exactly like the schemas
+    (same keys, same order) and encoded once with orjson. routes return a FastJSONResponse, so
+    response_model is only used for the docs. FAST_SERIALIZATION=False goes back to the ORM path.
+'''
+
+import os
+from collections import defaultdict
+import orjson
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models, schemas
+
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "True") == "True"
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        #OPT_UTC_Z writes utc datetimes with a trailing "Z", the way pydantic does
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+# nested users are filled in from one users query, everything else is a column with the field's name
+POST_USERS = {"author": "author_id", "volunteer": "volunteer_id", "resolved_by": "resolved_by_id"}
+POST_FIELDS = tuple(schemas.Post.model_fields)
+POST_COLUMNS = tuple(f for f in POST_FIELDS if f not in POST_USERS and f not in ("comments", "likes"))
+COMMENT_FIELDS = tuple(schemas.Comment.model_fields)
+COMMENT_COLUMNS = tuple(f for f in COMMENT_FIELDS if f != "author")
+LIKE_COLUMNS = tuple(schemas.Like.model_fields)
+USER_COLUMNS = tuple(schemas.UserPublic.model_fields)
+
+def _columns(model, names):
+    return [model.__table__.c[n] for n in names]
+
+#select of every schemas.Post column, callers add where / order_by / limit
+def post_select(model=models.Post):
+    return select(*_columns(model, POST_COLUMNS))
+
+#{user_id: {"username", "points"}} for every id in one query
+async def public_users(db: AsyncSession, ids) -> dict:
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+    query = select(models.User.id, *_columns(models.User, USER_COLUMNS)).where(models.User.id.in_(ids))
+    return {row[0]: dict(zip(USER_COLUMNS, row[1:])) for row in (await db.execute(query)).all()}
+
+async def _comments(db: AsyncSession, model, where, order_by):
+    query = select(*_columns(model, COMMENT_COLUMNS)).where(where).order_by(order_by)
+    return [dict(zip(COMMENT_COLUMNS, row)) for row in (await db.execute(query)).all()]
+
+''' runs a post_select() query and returns schemas.Post shaped dicts.
+    4 statements no matter how many posts: posts, comments, likes, users.
+    archived=True reads comments / likes from the archive tables
+'''
+async def project_posts(db: AsyncSession, query, archived: bool = False) -> list:
+    posts = [dict(zip(POST_COLUMNS, row)) for row in (await db.execute(query)).all()]
+    if not posts:
+        return []
+    comment_model = models.ArchivedComment if archived else models.Comment
+    like_model = models.ArchivedLike if archived else models.Like
+    ids = [p["id"] for p in posts]
+
+    comments = defaultdict(list)
+    all_comments = await _comments(db, comment_model, comment_model.post_id.in_(ids), comment_model.id)
+    for c in all_comments:
+        comments[c["post_id"]].append(c)
+
+    likes = defaultdict(list)
+    like_query = select(*_columns(like_model, LIKE_COLUMNS)).where(like_model.post_id.in_(ids)).order_by(like_model.id)
+    for row in (await db.execute(like_query)).all():
+        like = dict(zip(LIKE_COLUMNS, row))
+        likes[like["post_id"]].append(like)
+
+    users = await public_users(
+        db, [p[fk] for p in posts for fk in POST_USERS.values()] + [c["author_id"] for c in all_comments]
+    )
+    for c in all_comments:
+        c["author"] = users.get(c["author_id"])
+
+    result = []
+    for p in posts:
+        for field, fk in POST_USERS.items():
+            p[field] = users.get(p[fk])
+        p["comments"] = comments.get(p["id"], [])
+        p["likes"] = likes.get(p["id"], [])
+        result.append({f: p[f] for f in POST_FIELDS})
+    return result
+
+#schemas.Comment dicts for one post, newest first (same order as crud.get_comments_by_post)
+async def project_comments(db: AsyncSession, post_id: int) -> list:
+    comments = await _comments(db, models.Comment, models.Comment.post_id == post_id, desc(models.Comment.created_at))
+    users = await public_users(db, [c["author_id"] for c in comments])
+    for c in comments:
+        c["author"] = users.get(c["author_id"])
+    return comments
+
+async def project_leaderboard(db: AsyncSession, limit: int = 10) -> list:
+    query = select(*_columns(models.User, USER_COLUMNS)).order_by(desc(models.User.points)).limit(limit)
+    return [dict(zip(USER_COLUMNS, row)) for row in (await db.execute(query)).all()]
@@ -0,0 +1,93 @@
+# backend/serve.py
+
+''' production entry point:  python serve.py   (main.py's __main__ is the dev server with the reloader)
+
+    runs WEB_CONCURRENCY uvicorn worker processes, or one per usable core (cgroup CPU quota and
+    affinity respected, capped at MAX_WORKERS) when it isn't set. uvloop and httptools are used when
+    they're installed. every worker imports main.py on its own, so each gets its own DB engine and pool,
+    classifier http client, response cache and archiver from the lifespan; keep
+    workers x (pool_size + max_overflow) under postgres' max_connections. with more than one worker the
+    prometheus samples go through PROMETHEUS_MULTIPROC_DIR (a fresh temp dir unless it is set) so /metrics
+    reports all of them.
+
+    SIGTERM (docker stop, a rolling deploy) drains: the workers stop accepting, in-flight requests and the
+    ML jobs they queued finish (up to GRACEFUL_TIMEOUT seconds), then the lifespan closes the http
+    client and disposes the engine.
+'''
+
+import os
+import logging
+import tempfile
+import importlib.util
+import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8080"))
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "8"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))   # docker's stop timeout must be longer than this
+KEEP_ALIVE = int(os.getenv("KEEP_ALIVE", "5"))
+
+
+#cores this container may actually use, os.cpu_count() reports the whole host
+def available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:   # macOS / windows
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:   # cgroup v2, "max 100000" when unlimited
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+def worker_count() -> int:
+    configured = int(os.getenv("WEB_CONCURRENCY", "0"))
+    return configured if configured > 0 else min(available_cpus(), MAX_WORKERS)
+
+#several workers share their prometheus samples through files in one directory (see metrics.py),
+#it has to be empty when they start or it carries the last run's counters
+def prepare_metrics_dir(workers: int):
+    if workers <= 1:
+        os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+        return
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="prometheus-")
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith(".db"):
+            os.remove(os.path.join(path, name))
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path   # inherited by the worker processes
+
+def installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+if __name__ == "__main__":
+    workers = worker_count()
+    prepare_metrics_dir(workers)
+    loop = "uvloop" if installed("uvloop") else "asyncio"
+    http = "httptools" if installed("httptools") else "h11"
+    logger.info(f"Serving on {HOST}:{PORT} with {workers} workers ({loop}, {http})")
+    uvicorn.run(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        timeout_keep_alive=KEEP_ALIVE,
+        proxy_headers=True,
+        #X-Forwarded-For is only believed from these addresses, set it to the load balancer's
+        #(never "*": any client could then choose the address rate limits and uploads are keyed on)
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        access_log=os.getenv("ACCESS_LOG") == "True",
+    )
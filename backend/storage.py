@@ -0,0 +1,325 @@
+# backend/storage.py
+
+import io
+import os
+import uuid
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+from fastapi.concurrency import run_in_threadpool
+import tracing
+import http_client
+from jose import JWTError, jwt
+
+from auth_utils import SECRET_KEY, ALGORITHM
+from image_utils import open_image, prepare_image, build_variants, dhash, MAX_UPLOAD_BYTES, THUMB_SIZE
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# Check for Test Mode
+USE_MOCK_CLOUD = os.getenv("USE_MOCK_CLOUD") == "True"
+# where images live: "cloudinary" (default), "local" or "s3"
+# USE_LOCAL_STORAGE / USE_MOCK_CLOUD are kept as shortcuts for the local backend
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary").lower()
+if os.getenv("USE_LOCAL_STORAGE") == "True" or USE_MOCK_CLOUD:
+    STORAGE_BACKEND = "local"
+USE_LOCAL_STORAGE = STORAGE_BACKEND == "local"
+# when on, new posts must point at an upload we can actually find in storage
+SIGNED_UPLOADS = os.getenv("SIGNED_UPLOADS") == "True"
+
+UPLOAD_FOLDER = "community_app_posts"
+UPLOAD_SIGNATURE_TTL_SECONDS = int(os.getenv("UPLOAD_SIGNATURE_TTL_SECONDS", "600"))
+LOCAL_STORAGE_DIR = Path(os.getenv("LOCAL_STORAGE_DIR", BASE_DIR / "local_uploads"))
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://127.0.0.1:8080")
+
+# every upload is stored as the full webp plus these precomputed variants (see image_utils.build_variants)
+VARIANTS = ("thumb", "224")
+
+
+#every upload gets a public_id that encodes the owner, so we can check ownership later without a lookup table
+def new_public_id(user_id: int) -> str:
+    return f"{UPLOAD_FOLDER}/u{user_id}_{uuid.uuid4().hex}"
+
+def owns_public_id(public_id: str, user_id: int) -> bool:
+    return public_id.startswith(f"{UPLOAD_FOLDER}/u{user_id}_") and ".." not in public_id
+
+#True for public_ids we issued ourselves (and therefore have variants)
+def is_managed(public_id: str) -> bool:
+    return public_id.startswith(f"{UPLOAD_FOLDER}/u") and ".." not in public_id
+
+def variant_key(public_id: str, variant: str) -> str:
+    return f"{public_id}_{variant}"
+
+
+# --- BACKENDS ---
+
+class ImageStorage:
+    name = "base"
+    supports_signed_uploads = False
+
+    #writes the full image + variants, returns the url of the full image (blocking, run it in a threadpool)
+    def save_image(self, public_id: str, variants: dict) -> str:
+        for variant in VARIANTS:
+            self.put(variant_key(public_id, variant), variants[variant])
+        return self.put(public_id, variants["full"])
+
+    def put(self, key: str, data: bytes) -> str:
+        raise NotImplementedError
+
+    def url(self, key: str) -> str:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def variant_url(self, public_id: str, variant: str) -> str:
+        return self.url(variant_key(public_id, variant))
+
+    def sign_upload(self, public_id: str, expires_at: datetime) -> dict:
+        raise NotImplementedError
+
+
+class CloudinaryStorage(ImageStorage):
+    '''the sdk (and its requests/urllib3 stack) is imported when the backend is first used, not at startup'''
+    name = "cloudinary"
+    supports_signed_uploads = True
+
+    #cloudinary builds the variants itself (eager), so we only ship the full image.
+    #"224" is scaled (squashed) to 224x224, not cropped: the same input image_utils.build_variants and the
+    #classifier's own resize give the model, whatever the storage backend
+    EAGER = "c_scale,w_224,h_224,f_webp|c_limit,w_480,h_480,q_75,f_webp"
+    VARIANT_TRANSFORMS = {
+        "224": {"crop": "scale", "width": 224, "height": 224, "fetch_format": "webp"},
+        "thumb": {"crop": "limit", "width": 480, "height": 480, "quality": 75, "fetch_format": "webp"},
+    }
+
+    def __init__(self):
+        import cloudinary
+        import cloudinary.api
+        import cloudinary.exceptions
+        import cloudinary.uploader
+        import cloudinary.utils
+        cloudinary.config(
+            cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME"),
+            api_key = os.getenv("CLOUDINARY_API_KEY"),
+            api_secret = os.getenv("CLOUDINARY_API_SECRET")
+        )
+        self.sdk = cloudinary
+
+    def save_image(self, public_id: str, variants: dict) -> str:
+        result = self.sdk.uploader.upload(
+            io.BytesIO(variants["full"]),
+            public_id=public_id,
+            eager=self.EAGER
+        )
+        return result.get("secure_url")
+
+    def put(self, key: str, data: bytes) -> str:
+        return self.sdk.uploader.upload(io.BytesIO(data), public_id=key).get("secure_url")
+
+    def url(self, key: str) -> str:
+        return self.sdk.CloudinaryImage(key).build_url(secure=True, format="webp")
+
+    def variant_url(self, public_id: str, variant: str) -> str:
+        return self.sdk.CloudinaryImage(public_id).build_url(secure=True, **self.VARIANT_TRANSFORMS[variant])
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.sdk.api.resource(key)
+        except self.sdk.exceptions.NotFound:
+            return False
+        return True
+
+    def sign_upload(self, public_id: str, expires_at: datetime) -> dict:
+        config = self.sdk.config()
+        #same result as the server side path: max 1920x1080, webp, quality 85, variants built eagerly
+        params = {
+            "public_id": public_id,
+            "timestamp": int(datetime.now(timezone.utc).timestamp()),
+            "transformation": "c_limit,w_1920,h_1080,q_85",
+            "format": "webp",
+            "eager": self.EAGER,
+        }
+        params["signature"] = self.sdk.utils.api_sign_request(params, config.api_secret)
+        params["api_key"] = config.api_key
+        return {
+            "mode": self.name,
+            "upload_url": f"https://api.cloudinary.com/v1_1/{config.cloud_name}/image/upload",
+            "public_id": public_id,
+            "expires_at": expires_at.isoformat(),
+            "fields": params,
+        }
+
+
+class LocalStorage(ImageStorage):
+    '''files on disk, served by /images/local/. fully offline, for dev and benchmarks'''
+    name = "local"
+    supports_signed_uploads = True
+
+    def __init__(self, root: Path = LOCAL_STORAGE_DIR, base_url: str = PUBLIC_BASE_URL):
+        self.root = Path(root)
+        self.base_url = base_url
+
+    #ValueError for anything that would land outside root ("/etc/x", "a/../../x", symlinks out)
+    def path(self, key: str) -> Path:
+        root = self.root.resolve()
+        path = (root / f"{key}.webp").resolve()
+        if not path.is_relative_to(root):
+            raise ValueError(f"storage key outside {root}: {key!r}")
+        return path
+
+    def put(self, key: str, data: bytes) -> str:
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return self.url(key)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/images/local/{key}"
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).exists()
+
+    def sign_upload(self, public_id: str, expires_at: datetime) -> dict:
+        #the token is the signature for the local stand-in, it only allows writing this one public_id
+        token = jwt.encode({"pid": public_id, "exp": expires_at}, SECRET_KEY, algorithm=ALGORITHM)
+        return {
+            "mode": self.name,
+            "upload_url": self.url(public_id),
+            "public_id": public_id,
+            "expires_at": expires_at.isoformat(),
+            "fields": {"token": token},
+        }
+
+
+class S3Storage(ImageStorage):
+    '''any S3 compatible bucket (AWS, MinIO, R2...). needs boto3 installed'''
+    name = "s3"
+
+    def __init__(self):
+        import boto3  # optional dependency, only needed for this backend
+        self.bucket = os.getenv("S3_BUCKET")
+        self.client = boto3.client("s3", endpoint_url=os.getenv("S3_ENDPOINT_URL"))
+        self.public_base_url = os.getenv(
+            "S3_PUBLIC_BASE_URL",
+            f"{os.getenv('S3_ENDPOINT_URL', 'https://s3.amazonaws.com')}/{self.bucket}"
+        ).rstrip("/")
+
+    def put(self, key: str, data: bytes) -> str:
+        self.client.put_object(Bucket=self.bucket, Key=f"{key}.webp", Body=data, ContentType="image/webp")
+        return self.url(key)
+
+    def url(self, key: str) -> str:
+        return f"{self.public_base_url}/{key}.webp"
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=f"{key}.webp")
+        except ClientError:
+            return False
+        return True
+
+
+BACKENDS = {
+    "cloudinary": CloudinaryStorage,
+    "local": LocalStorage,
+    "s3": S3Storage,
+}
+
+_storage = None
+
+def get_storage() -> ImageStorage:
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND not in BACKENDS:
+            raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}'")
+        _storage = BACKENDS[STORAGE_BACKEND]()
+        logger.info(f"Image storage backend: {_storage.name}")
+    return _storage
+
+
+# --- UPLOADS ---
+
+#header checks + decode + variants + upload, all blocking work so it goes to the threadpool
+#fp is the (spooled) upload file, it is never read into memory as a whole
+async def store_image(fp, public_id: str) -> dict:
+    parent = tracing.current()  # the threadpool doesn't necessarily carry the request's contextvars over
+
+    def work():
+        backend = get_storage()
+        with tracing.span("storage.store_image", parent=parent, backend=backend.name):
+            with tracing.span("image.decode"):
+                img = prepare_image(open_image(fp))
+            with tracing.span("image.variants"):
+                variants = build_variants(img)
+            with tracing.span("storage.save"):
+                url = backend.save_image(public_id, variants)
+            return {
+                "url": url,
+                "variants": {v: backend.variant_url(public_id, v) for v in VARIANTS},
+                "image_hash": dhash(img),
+            }
+    return await run_in_threadpool(work)
+
+#url the classifier should download, the small pre-resized variant when we have one
+def classifier_image_url(public_id: str, image_url: str) -> str:
+    if USE_MOCK_CLOUD or not is_managed(public_id):
+        return image_url
+    return get_storage().variant_url(public_id, "224")
+
+
+#dhash of an upload that didn't pass through store_image (signed uploads go straight to storage).
+#hashed from the small thumb variant, a 9x8 dhash comes out the same as from the full image. None on failure
+async def hash_stored_image(public_id: str):
+    url = get_storage().variant_url(public_id, "thumb") if is_managed(public_id) else get_storage().url(public_id)
+    try:
+        with tracing.span("storage.hash_image"):
+            buffer = io.BytesIO()
+            async with http_client.get().stream("GET", url, timeout=10.0) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    buffer.write(chunk)
+                    if buffer.tell() > MAX_UPLOAD_BYTES:
+                        raise ValueError("image is larger than MAX_UPLOAD_BYTES")
+            buffer.seek(0)
+            return await run_in_threadpool(lambda: dhash(prepare_image(open_image(buffer, THUMB_SIZE))))
+    except Exception as e:
+        logger.warning(f"Could not hash {public_id}: {e}")
+        return None
+
+
+# --- SIGNED UPLOADS ---
+
+def sign_upload(user_id: int) -> dict:
+    backend = get_storage()
+    if not backend.supports_signed_uploads:
+        raise NotImplementedError(f"Signed uploads are not supported by the {backend.name} backend")
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=UPLOAD_SIGNATURE_TTL_SECONDS)
+    return backend.sign_upload(new_public_id(user_id), expires_at)
+
+#checks the token the local stand-in got with an upload was issued for this public_id
+def check_local_upload_token(token: str, public_id: str) -> bool:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return False
+    return payload.get("pid") == public_id
+
+
+# --- VERIFICATION ---
+
+#returns the canonical url of an upload if it exists and belongs to the user, None otherwise
+async def verify_upload(public_id: str, user_id: int):
+    if not owns_public_id(public_id, user_id):
+        return None
+
+    backend = get_storage()
+    with tracing.span("storage.exists", backend=backend.name):
+        exists = await run_in_threadpool(backend.exists, public_id)
+    if not exists:
+        return None
+    return backend.url(public_id)
@@ -0,0 +1,187 @@
+# backend/sweeper.py
+
+''' scheduler jobs (see scheduler.py) for posts that got stuck on the board.
+
+    release_stale_tasks    IN_PROGRESS for longer than STALE_TASK_HOURS: the volunteer walked away, the task goes
+                           back to OPEN so someone else can take it
+    requeue_unclassified   still "Analysing" ANALYSING_TIMEOUT_MINUTES after its classification was last queued
+                           (classify_attempted_at, set at insert and by every requeue): the worker died inside
+                           process_post_ml, so the classifier call is made again. rows of a bulk import still
+                           importing / classifying are left to its classify_batch jobs, and a batch never takes
+                           this worker's ML backlog past admission.py's ML_BACKLOG_LIMIT. past
+                           ANALYSING_GIVE_UP_HOURS after creation the post gets the same "ERROR" class a failed
+                           call gives it
+
+    both walk index ranges (ix_posts_status_volunteer_start, ix_posts_analysing_created_at,
+    ix_posts_analysing_attempted_at) in batches of SWEEP_BATCH_SIZE, each batch its own short transaction,
+    claimed with SKIP LOCKED on postgres.
+'''
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import storage
+import tiles
+import cache
+import metrics
+import admission
+from database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL_SECONDS = int(os.getenv("SWEEP_INTERVAL_SECONDS", "300"))
+SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", "200"))
+STALE_TASK_HOURS = float(os.getenv("STALE_TASK_HOURS", "24"))
+ANALYSING_TIMEOUT_MINUTES = float(os.getenv("ANALYSING_TIMEOUT_MINUTES", "10"))
+ANALYSING_GIVE_UP_HOURS = float(os.getenv("ANALYSING_GIVE_UP_HOURS", "24"))
+SWEEP_CLASSIFY_CONCURRENCY = int(os.getenv("SWEEP_CLASSIFY_CONCURRENCY", "4"))
+
+
+def _claim(db: AsyncSession, query):
+    if db.bind.dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+    return db.execute(query)
+
+#moves the claimed posts' tile counts along with whatever change() does to them
+async def _change(db: AsyncSession, posts, change):
+    before = [(p.latitude, p.longitude, p.status, p.predicted_class) for p in posts]
+    for post in posts:
+        change(post)
+    after = [(p.latitude, p.longitude, p.status, p.predicted_class) for p in posts]
+    await tiles.move_many(db, before, after)
+    await db.commit()
+
+
+# --- STALE TASKS ---
+
+def _reopen(post: models.Post):
+    post.status = models.TaskStatus.OPEN
+    post.volunteer_id = None
+    post.start_image_url = None
+    post.volunteer_start_timestamp = None
+    post.verified_points = None
+
+async def release_batch(db: AsyncSession, cutoff: datetime) -> int:
+    query = (
+        select(models.Post)
+        .where(models.Post.status == models.TaskStatus.IN_PROGRESS, models.Post.volunteer_start_timestamp < cutoff)
+        .order_by(models.Post.volunteer_start_timestamp)
+        .limit(SWEEP_BATCH_SIZE)
+    )
+    posts = (await _claim(db, query)).scalars().all()
+    if not posts:
+        await db.rollback()
+        return 0
+    await _change(db, posts, _reopen)
+    return len(posts)
+
+async def release_stale_tasks() -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=STALE_TASK_HOURS)
+    total = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            released = await release_batch(db, cutoff)
+            total += released
+            if released < SWEEP_BATCH_SIZE:
+                break
+            await asyncio.sleep(0)
+    if total:
+        await cache.bump("posts")
+        logger.info(f"[Sweeper] reopened {total} tasks abandoned for more than {STALE_TASK_HOURS:g}h")
+    return total
+
+
+# --- STUCK CLASSIFICATIONS ---
+
+def _failed(post: models.Post):
+    post.predicted_class = "ERROR"
+    post.points = 0
+
+async def give_up_batch(db: AsyncSession, cutoff: datetime) -> int:
+    query = (
+        select(models.Post)
+        .where(models.Post.predicted_class == "Analysing", models.Post.created_at < cutoff)
+        .order_by(models.Post.created_at)
+        .limit(SWEEP_BATCH_SIZE)
+    )
+    posts = (await _claim(db, query)).scalars().all()
+    if not posts:
+        await db.rollback()
+        return 0
+    await _change(db, posts, _failed)
+    return len(posts)
+
+''' classify(post_id, image_url) is routers/posts.process_post_ml, it stores the result (or "ERROR") itself.
+    a classifier that answers with an error status leaves the post "Analysing", so it comes round again
+    ANALYSING_TIMEOUT_MINUTES after this attempt until ANALYSING_GIVE_UP_HOURS
+'''
+async def requeue_unclassified(classify) -> int:
+    now = datetime.now(timezone.utc)
+    give_up = now - timedelta(hours=ANALYSING_GIVE_UP_HOURS)
+    stuck_before = now - timedelta(minutes=ANALYSING_TIMEOUT_MINUTES)
+    gate = asyncio.Semaphore(SWEEP_CLASSIFY_CONCURRENCY)
+
+    async def one(post_id, url):
+        async with gate:
+            await classify(post_id, url)
+
+    failed = requeued = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            n = await give_up_batch(db, give_up)
+            failed += n
+            if n < SWEEP_BATCH_SIZE:
+                break
+
+        #keyset walk over (classify_attempted_at, id), the classifier calls happen outside any transaction
+        Post, ImportJob = models.Post, models.ImportJob
+        running_imports = select(ImportJob.id).where(ImportJob.status.in_(("importing", "classifying")))
+        cursor = None
+        while True:
+            #every requeued post is a running job in the ML backlog, never more than admission lets through
+            room = min(SWEEP_BATCH_SIZE, admission.ML_BACKLOG_LIMIT - metrics.backlog.pending)
+            if room <= 0:
+                break
+            query = (
+                select(Post.id, Post.classify_attempted_at, Post.image_public_id, Post.image_url)
+                .where(
+                    Post.predicted_class == "Analysing", Post.classify_attempted_at < stuck_before, Post.created_at >= give_up,
+                    or_(Post.import_job_id.is_(None), Post.import_job_id.not_in(running_imports)),
+                )
+                .order_by(Post.classify_attempted_at, Post.id)
+                .limit(room)
+            )
+            if cursor:
+                query = query.where(or_(
+                    Post.classify_attempted_at > cursor[0],
+                    and_(Post.classify_attempted_at == cursor[0], Post.id > cursor[1]),
+                ))
+            rows = (await db.execute(query)).all()
+            if not rows:
+                await db.rollback()
+                break
+            #this is the new attempt, the next sweep only picks them up again once it is ANALYSING_TIMEOUT_MINUTES old.
+            #updated_at is the /sync cursor and stays as it is, nothing a client sees has changed
+            await db.execute(
+                update(Post).where(Post.id.in_([r.id for r in rows]))
+                .values(classify_attempted_at=models.utcnow(), updated_at=Post.updated_at)
+            )
+            await db.commit()
+            jobs = [metrics.tracked_job("requeue_classify", one, r.id, storage.classifier_image_url(r.image_public_id, r.image_url)) for r in rows]
+            await asyncio.gather(*(job() for job in jobs))
+            requeued += len(rows)
+            if len(rows) < room:
+                break
+            cursor = (rows[-1].classify_attempted_at, rows[-1].id)
+
+    if failed:
+        await cache.bump("posts")
+        logger.info(f"[Sweeper] gave up on {failed} posts still unclassified after {ANALYSING_GIVE_UP_HOURS:g}h")
+    if requeued:
+        logger.info(f"[Sweeper] re-ran the classifier for {requeued} posts stuck in Analysing")
+    return requeued
@@ -0,0 +1,98 @@
+# backend/sync.py
+
+''' GET /sync?since=<token>: what changed since the client's last sync, instead of refetching feed pages and stats.
+
+    posts, comments and users carry updated_at (models.utcnow, bumped on every UPDATE). each kind is read
+    as a keyset range over its (updated_at, id) index, starting after the cursor kept in the token.
+    deletions are tombstones: the archiver is the only thing that removes posts, so posts_archive.archived_at
+    is the deletion log, read the same way. a page holds at most SYNC_PAGE_SIZE rows of each kind,
+    has_more tells the client to call again with the new token straight away.
+
+    rows newer than SYNC_LAG_SECONDS are left for the next sync: a transaction that started earlier can
+    still commit a row with an older timestamp, and a cursor that had already moved past it would skip it.
+    the token is opaque to the client (urlsafe base64 JSON of the cursors), no token = a full first sync.
+    signed in users only, rate limited per user (admission.syncs).
+'''
+
+import os
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
+import orjson
+from sqlalchemy import select, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models, schemas
+
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+SYNC_LAG_SECONDS = float(os.getenv("SYNC_LAG_SECONDS", "5"))
+TOKEN_VERSION = 1
+
+# name -> (table, cursor column, columns sent)
+STREAMS = {
+    "posts": (models.Post.__table__, "updated_at", tuple(schemas.SyncPost.model_fields)),
+    "comments": (models.Comment.__table__, "updated_at", tuple(schemas.SyncComment.model_fields)),
+    "users": (models.User.__table__, "updated_at", tuple(schemas.SyncUser.model_fields)),
+    "deleted_posts": (models.ArchivedPost.__table__, "archived_at", ("id",)),
+}
+
+
+class InvalidToken(ValueError):
+    pass
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)   # sqlite hands back naive utc
+
+#{stream: (datetime, id) or None}
+def decode_token(token: str) -> dict:
+    try:
+        data = orjson.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if data.pop("v") != TOKEN_VERSION:
+            raise InvalidToken()
+        return {
+            name: (_utc(datetime.fromisoformat(data[name][0])), int(data[name][1])) if data.get(name) else None
+            for name in STREAMS
+        }
+    except (binascii.Error, orjson.JSONDecodeError, KeyError, TypeError, ValueError, AttributeError):
+        raise InvalidToken()
+
+def encode_token(cursors: dict) -> str:
+    data = {"v": TOKEN_VERSION}
+    for name, cursor in cursors.items():
+        data[name] = [cursor[0].isoformat(), cursor[1]] if cursor else None
+    return base64.urlsafe_b64encode(orjson.dumps(data)).rstrip(b"=").decode()
+
+
+#one page of one stream: (rows, cursor after them, whether more are waiting)
+async def _page(db: AsyncSession, name: str, cursor, horizon: datetime, limit: int):
+    table, cursor_name, columns = STREAMS[name]
+    ts, row_id = table.c[cursor_name], table.c.id
+    query = select(ts, *[table.c[c] for c in columns]).where(ts <= horizon)
+    if cursor:
+        query = query.where(or_(ts > cursor[0], and_(ts == cursor[0], row_id > cursor[1])))
+    rows = (await db.execute(query.order_by(ts, row_id).limit(limit + 1))).all()
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        cursor = (_utc(rows[-1][0]), rows[-1][1])
+    return [dict(zip(columns, row[1:])) for row in rows], cursor, more
+
+async def changes(db: AsyncSession, token: str = None, limit: int = SYNC_PAGE_SIZE) -> dict:
+    horizon = datetime.now(timezone.utc) - timedelta(seconds=SYNC_LAG_SECONDS)
+    if token:
+        cursors = decode_token(token)
+    else:
+        #first sync: every live row, but only deletions from now on (nothing to delete on the client yet)
+        cursors = {name: None for name in STREAMS}
+        cursors["deleted_posts"] = (horizon, 0)
+
+    page, has_more = {}, False
+    for name in STREAMS:
+        rows, cursors[name], more = await _page(db, name, cursors[name], horizon, limit)
+        page[name] = rows
+        has_more = has_more or more
+    page["deleted_posts"] = [row["id"] for row in page["deleted_posts"]]
+    page["next"] = encode_token(cursors)
+    page["has_more"] = has_more
+    return page
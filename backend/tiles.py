@@ -0,0 +1,186 @@
+# backend/tiles.py
+
+''' server side map clustering.
+    every post is counted once per zoom level in tile_aggregates (web mercator "slippy map" tiles),
+    bucketed by status and predicted_class. the counts move incrementally whenever a post is created
+    or its status / class changes, so a map tile is one indexed range lookup, never a scan of posts.
+    every upsert sends its rows sorted by bucket key, so concurrent transactions that touch the shared
+    low zoom rows always lock them in the same order and can't deadlock each other.
+'''
+
+import os
+import math
+import logging
+from collections import defaultdict
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import models
+
+logger = logging.getLogger(__name__)
+
+MAX_ZOOM = int(os.getenv("TILE_MAX_ZOOM", "16"))
+# a tile at zoom z is answered with the cells of zoom z + CLUSTER_DEPTH (2^3 x 2^3 = 64 clusters max)
+CLUSTER_DEPTH = int(os.getenv("TILE_CLUSTER_DEPTH", "3"))
+MAX_LATITUDE = 85.05112878
+
+def tile_for(lat: float, lon: float, zoom: int):
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    n = 1 << zoom
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def _bucket(status, predicted_class):
+    status = status.value if hasattr(status, "value") else status
+    return status or models.TaskStatus.OPEN.value, predicted_class or "Unknown"
+
+def _upsert(db: AsyncSession, rows):
+    insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(models.TileAggregate).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["zoom", "tile_x", "tile_y", "status", "predicted_class"],
+        set_={
+            "count": models.TileAggregate.count + stmt.excluded.count,
+            "lat_sum": models.TileAggregate.lat_sum + stmt.excluded.lat_sum,
+            "lon_sum": models.TileAggregate.lon_sum + stmt.excluded.lon_sum,
+        }
+    )
+
+def _accumulate(totals, lat, lon, bucket, delta: int):
+    for zoom in range(MAX_ZOOM + 1):
+        t = totals[(zoom, *tile_for(lat, lon, zoom), *bucket)]
+        t[0] += delta
+        t[1] += lat * delta
+        t[2] += lon * delta
+
+#upsert parameters, sorted by key (the lock order)
+def _rows(totals):
+    return [
+        {"zoom": k[0], "tile_x": k[1], "tile_y": k[2], "status": k[3], "predicted_class": k[4],
+         "count": v[0], "lat_sum": v[1], "lon_sum": v[2]}
+        for k, v in sorted(totals.items())
+    ]
+
+async def _upsert_totals(db: AsyncSession, totals):
+    rows = _rows(totals)
+    for start in range(0, len(rows), 500):
+        await db.execute(_upsert(db, rows[start:start + 500]))
+
+#adds delta (+1 / -1) to the post's bucket on every zoom level, one statement. joins the caller's transaction
+async def apply(db: AsyncSession, lat, lon, status, predicted_class, delta: int):
+    if lat is None or lon is None:
+        return
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    _accumulate(totals, lat, lon, _bucket(status, predicted_class), delta)
+    await db.execute(_upsert(db, _rows(totals)))
+
+#apply() for a whole batch of (lat, lon, status, predicted_class): deltas are summed per bucket first,
+#so a thousand posts in one city are a handful of upserted rows instead of a thousand statements
+async def apply_many(db: AsyncSession, posts, delta: int):
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    for lat, lon, status, predicted_class in posts:
+        if lat is not None and lon is not None:
+            _accumulate(totals, lat, lon, _bucket(status, predicted_class), delta)
+    await _upsert_totals(db, totals)
+
+#posts moving buckets: -1 on the before tuples and +1 on the after ones, summed and sent together
+async def move_many(db: AsyncSession, before, after):
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    for posts, delta in ((before, -1), (after, +1)):
+        for lat, lon, status, predicted_class in posts:
+            if lat is not None and lon is not None:
+                _accumulate(totals, lat, lon, _bucket(status, predicted_class), delta)
+    await _upsert_totals(db, totals)
+
+''' call BEFORE commit with the post already mutated and its previous status / class,
+    moves the post from the old bucket to the new one if anything changed
+'''
+async def track(db: AsyncSession, post, old_status, old_class):
+    if _bucket(old_status, old_class) == _bucket(post.status, post.predicted_class):
+        return
+    await move_many(
+        db,
+        [(post.latitude, post.longitude, old_status, old_class)],
+        [(post.latitude, post.longitude, post.status, post.predicted_class)],
+    )
+
+
+async def get_tile(db: AsyncSession, z: int, x: int, y: int):
+    cluster_zoom = min(z + CLUSTER_DEPTH, MAX_ZOOM)
+    scale = 1 << (cluster_zoom - z) if cluster_zoom >= z else 1
+    agg = models.TileAggregate
+    query = (
+        select(agg.tile_x, agg.tile_y, agg.status, agg.predicted_class, agg.count, agg.lat_sum, agg.lon_sum)
+        .where(
+            agg.zoom == cluster_zoom,
+            agg.tile_x.between(x * scale, x * scale + scale - 1),
+            agg.tile_y.between(y * scale, y * scale + scale - 1),
+            agg.count > 0,
+        )
+    )
+    cells = {}
+    for tx, ty, status, predicted_class, count, lat_sum, lon_sum in (await db.execute(query)).all():
+        cell = cells.get((tx, ty))
+        if cell is None:
+            cell = cells[(tx, ty)] = {
+                "tile_x": tx, "tile_y": ty, "count": 0, "lat_sum": 0.0, "lon_sum": 0.0,
+                "by_status": defaultdict(int), "by_class": defaultdict(int),
+            }
+        cell["count"] += count
+        cell["lat_sum"] += lat_sum
+        cell["lon_sum"] += lon_sum
+        cell["by_status"][status] += count
+        cell["by_class"][predicted_class] += count
+
+    clusters = []
+    for cell in cells.values():
+        clusters.append({
+            "tile_x": cell["tile_x"],
+            "tile_y": cell["tile_y"],
+            "count": cell["count"],
+            "latitude": cell.pop("lat_sum") / cell["count"],
+            "longitude": cell.pop("lon_sum") / cell["count"],
+            "by_status": dict(cell["by_status"]),
+            "by_class": dict(cell["by_class"]),
+        })
+    return {
+        "z": z, "x": x, "y": y,
+        "cluster_zoom": cluster_zoom,
+        "total": sum(c["count"] for c in clusters),
+        "clusters": clusters,
+    }
+
+
+#full recount from posts on a sync connection, inside the caller's transaction. streams posts in chunks
+def recount(conn):
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    query = (
+        select(models.Post.latitude, models.Post.longitude, models.Post.status, models.Post.predicted_class)
+        .where(models.Post.latitude.isnot(None), models.Post.longitude.isnot(None))
+        .execution_options(yield_per=5000)
+    )
+    for lat, lon, status, predicted_class in conn.execute(query):
+        _accumulate(totals, lat, lon, _bucket(status, predicted_class), +1)
+
+    conn.execute(delete(models.TileAggregate))
+    rows = _rows(totals)
+    for start in range(0, len(rows), 5000):
+        conn.execute(models.TileAggregate.__table__.insert(), rows[start:start + 5000])
+    logger.info(f"Tile aggregates rebuilt: {len(rows)} buckets")
+    return len(rows)
+
+#one off recount, for existing data or if the counts ever drift
+async def rebuild(db: AsyncSession):
+    conn = await db.connection()
+    await conn.run_sync(recount)
+    await db.commit()
+
+#migration 3: fills the new table for databases that already had posts. runs once, under the migration lock
+def backfill_if_empty(conn):
+    if conn.execute(select(models.TileAggregate.id).limit(1)).first():
+        return
+    if conn.execute(select(models.Post.id).limit(1)).first():
+        recount(conn)
@@ -0,0 +1,224 @@
+# backend/tracing.py
+
+''' minimal distributed tracing, W3C traceparent compatible, no collector needed.
+
+    TracingMiddleware starts a root span per request (or continues the caller's trace from its
+    traceparent header), span() times a block as a child of whatever span is current (contextvar),
+    inject() adds traceparent to outbound httpx calls so the classifier joins the same trace.
+    finished spans go to the exporter picked by TRACE_EXPORTER:
+        file    one JSON object per line in TRACE_FILE, works offline, merge both services' files by trace_id
+        memory  last TRACE_MEMORY_SPANS spans, readable from GET /debug/traces
+        none    tracing off (default)
+    sampling is decided once at the root: TRACE_SAMPLE_RATE of new traces, or whatever the caller decided.
+    unsampled requests only carry ids around, no span objects are built or exported.
+    the classifier runs this same file (its Dockerfile copies it in, trash_classifier/main.py imports it from
+    here otherwise) with SERVICE_NAME "classifier", so the two services can't drift apart.
+'''
+
+import os
+import json
+import time
+import random
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "backend")
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")    # file | memory | none
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_MEMORY_SPANS = int(os.getenv("TRACE_MEMORY_SPANS", "5000"))
+
+
+# --- EXPORTERS ---
+
+class FileExporter:
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.file = open(path, "a", buffering=1)   # line buffered, a crash loses at most one span
+
+    def export(self, span: dict):
+        line = json.dumps(span, default=str)
+        with self.lock:
+            self.file.write(line + "\n")
+
+
+class MemoryExporter:
+    def __init__(self, size):
+        self.spans = deque(maxlen=size)
+
+    def export(self, span: dict):
+        self.spans.append(span)
+
+    #most recent traces first, each a list of spans ordered by start time
+    def traces(self, limit: int = 20):
+        grouped = {}
+        for span in reversed(self.spans):
+            grouped.setdefault(span["trace_id"], []).append(span)
+            if len(grouped) > limit:
+                grouped.pop(span["trace_id"])
+                break
+        return [sorted(spans, key=lambda s: s["start"]) for spans in grouped.values()]
+
+
+exporter = None
+if TRACE_EXPORTER == "file":
+    exporter = FileExporter(TRACE_FILE)
+elif TRACE_EXPORTER == "memory":
+    exporter = MemoryExporter(TRACE_MEMORY_SPANS)
+
+
+# --- SPANS ---
+
+class SpanContext:
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id, self.span_id, self.sampled = trace_id, span_id, sampled
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+class Span:
+    __slots__ = ("context", "parent_id", "name", "start", "start_perf", "attributes", "status")
+
+    def __init__(self, name: str, context: SpanContext, parent_id, attributes: dict):
+        self.name, self.context, self.parent_id, self.attributes = name, context, parent_id, attributes
+        self.start = time.time()
+        self.start_perf = time.perf_counter()
+        self.status = "ok"
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, duration_ms: float = None):
+        if duration_ms is None:
+            duration_ms = (time.perf_counter() - self.start_perf) * 1000
+        exporter.export({
+            "service": SERVICE_NAME, "trace_id": self.context.trace_id, "span_id": self.context.span_id,
+            "parent_id": self.parent_id, "name": self.name, "start": round(self.start, 6),
+            "duration_ms": round(duration_ms, 3), "status": self.status, "attributes": self.attributes,
+        })
+
+
+class _NoopSpan:
+    def set(self, key, value):
+        pass
+
+NOOP = _NoopSpan()
+current_context: ContextVar = ContextVar("trace_context", default=None)
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+def parse_traceparent(header: str):
+    parts = header.strip().split("-") if header else []
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = int(parts[3], 16) & 1 == 1
+    except ValueError:
+        return None
+    return SpanContext(parts[1], parts[2], sampled)
+
+def current():
+    return current_context.get()
+
+def is_sampled() -> bool:
+    ctx = current_context.get()
+    return exporter is not None and ctx is not None and ctx.sampled
+
+''' times the block as a child span of the current one (or of parent, for code running in
+    the threadpool where the contextvar may not have been copied). no-op when not sampled
+'''
+@contextmanager
+def span(name: str, parent: SpanContext = None, **attributes):
+    parent = parent or current_context.get()
+    if exporter is None or parent is None or not parent.sampled:
+        yield NOOP
+        return
+    s = Span(name, SpanContext(parent.trace_id, _new_id(8), True), parent.span_id, attributes)
+    token = current_context.set(s.context)
+    try:
+        yield s
+    except BaseException as e:
+        s.status = "error"
+        s.set("error", repr(e)[:200])
+        raise
+    finally:
+        current_context.reset(token)
+        s.end()
+
+#an already timed operation (db statements are timed by the engine hooks), recorded as a finished child span
+def record(name: str, duration_ms: float, **attributes):
+    if not is_sampled():
+        return
+    parent = current_context.get()
+    s = Span(name, SpanContext(parent.trace_id, _new_id(8), True), parent.span_id, attributes)
+    s.start -= duration_ms / 1000
+    s.end(duration_ms)
+
+#headers for an outbound call, the callee continues this trace (and honours the sampling decision)
+def inject(headers: dict = None) -> dict:
+    headers = dict(headers or {})
+    ctx = current_context.get()
+    if ctx is not None:
+        headers["traceparent"] = ctx.traceparent()
+    return headers
+
+
+class TracingMiddleware:
+    '''pure ASGI, one root (or continued) span per request'''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or exporter is None:
+            return await self.app(scope, receive, send)
+
+        incoming = parse_traceparent(dict(scope["headers"]).get(b"traceparent", b"").decode())
+        if incoming is not None:
+            ctx = SpanContext(incoming.trace_id, _new_id(8), incoming.sampled)
+            parent_id = incoming.span_id
+        else:
+            ctx = SpanContext(_new_id(16), _new_id(8), random.random() < TRACE_SAMPLE_RATE)
+            parent_id = None
+
+        token = current_context.set(ctx)
+        if not ctx.sampled:
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                current_context.reset(token)
+
+        root = Span(f"{scope['method']} {scope['path']}", ctx, parent_id, {"http.method": scope["method"]})
+
+        finished = [None]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set("http.status_code", message["status"])
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"traceparent", ctx.traceparent().encode())]}
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished[0] = time.perf_counter()   # background tasks run after this, as their own child spans
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            root.status = "error"
+            root.set("error", repr(e)[:200])
+            raise
+        finally:
+            current_context.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                root.name = f"{scope['method']} {route}"
+            root.set("http.path", scope["path"])
+            root.end(((finished[0] or time.perf_counter()) - root.start_perf) * 1000)
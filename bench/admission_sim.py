@@ -0,0 +1,173 @@
+# bench/admission_sim.py
+''' simulated cleanup drive against the real admission code (backend/admission.py), no database or classifier.
+
+    a small app with the backend's shape is served by uvicorn in this process:
+        GET  /posts/   holds a pooled "connection" for --read-ms
+        POST /posts/   holds one for --write-ms, then queues a classifier job through metrics.queue_job that
+                       waits --ml-seconds and holds a connection again to store the result
+    the pool is an asyncio.Semaphore(--pool-size) whose checkouts are timed into database.pool_pressure,
+    the same way TimedQueuePool does it. --readers keep browsing while --volunteers all start posting
+    at once (honouring Retry-After). the drive runs once without admission / rate limits and once with,
+    and reports read latency, write outcomes and the peak ML backlog and pool waiters of each.
+        python bench/admission_sim.py --volunteers 300 --readers 50 --pool-size 10 --duration 20
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+os.environ.setdefault("SECRET_KEY", "admission-sim")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import httpx
+
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))], 1)
+
+
+def build_app(args, pool, admitted):
+    from fastapi import FastAPI, BackgroundTasks, Depends
+    import admission
+    import metrics
+    from database import pool_pressure
+
+    async def hold(ms):
+        with pool_pressure.measure():
+            await pool.acquire()
+        try:
+            await asyncio.sleep(ms / 1000)
+        finally:
+            pool.release()
+
+    async def classify():
+        await asyncio.sleep(args.ml_seconds * random.uniform(0.8, 1.2))
+        await hold(args.write_ms)
+
+    app = FastAPI()
+
+    @app.get("/posts/")
+    async def feed():
+        await hold(args.read_ms)
+        return []
+
+    @app.post("/posts/", status_code=201, dependencies=[Depends(admission.post_writes)])
+    async def create(background_tasks: BackgroundTasks):
+        await hold(args.write_ms)
+        metrics.queue_job(background_tasks, "classify_post", classify)
+        return {"status": "Analysing"}
+
+    if admitted:
+        app.add_middleware(admission.AdmissionMiddleware)
+    return app
+
+
+async def drive(args, admitted):
+    import uvicorn
+    import admission
+    import metrics
+    from auth_utils import create_access_token
+
+    admission.RATE_LIMIT_ENABLED = admitted
+    admission.post_writes.buckets.clear()
+    admission.pool_pressure.ewma_ms, admission.pool_pressure.waiting = 0.0, 0
+    pool = asyncio.Semaphore(args.pool_size)
+    server = uvicorn.Server(uvicorn.Config(build_app(args, pool, admitted), host="127.0.0.1", port=args.port,
+                                           log_level="warning", lifespan="off"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    url = f"http://127.0.0.1:{args.port}/posts/"
+    deadline = time.perf_counter() + args.duration
+    reads, read_status, writes, write_status = [], Counter(), [], Counter()
+    peaks = {"ml_backlog": 0, "pool_waiting": 0}
+
+    async def reader(client):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            resp = await client.get(url)
+            reads.append((time.perf_counter() - start) * 1000)
+            read_status[resp.status_code] += 1
+            await asyncio.sleep(args.read_think)
+
+    async def volunteer(client, i):
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': f'volunteer{i}'})}"}
+        await asyncio.sleep(random.uniform(0, args.ramp))
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            resp = await client.post(url, headers=headers)
+            writes.append((time.perf_counter() - start) * 1000)
+            write_status[resp.status_code] += 1
+            wait = float(resp.headers.get("retry-after", 0)) or args.write_think
+            await asyncio.sleep(min(wait, max(0.0, deadline - time.perf_counter())))
+
+    async def sampler():
+        while time.perf_counter() < deadline:
+            peaks["ml_backlog"] = max(peaks["ml_backlog"], metrics.backlog.pending)
+            peaks["pool_waiting"] = max(peaks["pool_waiting"], admission.pool_pressure.waiting)
+            await asyncio.sleep(0.1)
+
+    limits = httpx.Limits(max_connections=args.readers + args.volunteers)
+    async with httpx.AsyncClient(timeout=120.0, limits=limits) as client:
+        await asyncio.gather(
+            sampler(),
+            *(reader(client) for _ in range(args.readers)),
+            *(volunteer(client, i) for i in range(args.volunteers)),
+        )
+
+    server.should_exit = server.force_exit = True   # queued jobs are dropped, the next run starts clean
+    await serving
+    metrics.backlog.pending = 0
+
+    return {
+        "reads": {"requests": len(reads), "p50_ms": percentile(reads, 50), "p99_ms": percentile(reads, 99),
+                  "statuses": dict(read_status)},
+        "writes": {"requests": len(writes), "p50_ms": percentile(writes, 50), "p99_ms": percentile(writes, 99),
+                   "statuses": dict(write_status)},
+        "peaks": peaks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volunteers", type=int, default=300)
+    parser.add_argument("--readers", type=int, default=50)
+    parser.add_argument("--pool-size", type=int, default=10, help="pool_size + max_overflow of the real engine")
+    parser.add_argument("--read-ms", type=float, default=5.0)
+    parser.add_argument("--write-ms", type=float, default=20.0)
+    parser.add_argument("--ml-seconds", type=float, default=1.5)
+    parser.add_argument("--read-think", type=float, default=0.2)
+    parser.add_argument("--write-think", type=float, default=2.0)
+    parser.add_argument("--ramp", type=float, default=1.0, help="volunteers start within this many seconds")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--port", type=int, default=8097)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    results = {}
+    for label, admitted in (("without", False), ("with", True)):
+        random.seed(args.seed)
+        results[label] = asyncio.run(drive(args, admitted))
+        r = results[label]
+        print(f"{label:>8} admission: reads p50 {r['reads']['p50_ms']}ms p99 {r['reads']['p99_ms']}ms  "
+              f"writes {r['writes']['statuses']}  peak backlog {r['peaks']['ml_backlog']}  "
+              f"peak pool waiters {r['peaks']['pool_waiting']}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# bench/bulk_import.py
+''' rows/sec into a running backend: one POST /posts/ per report against one streamed POST /posts/bulk.
+
+    both paths get the same generated reports (around the seeded cities). the per post path runs with
+    --concurrency requests in flight, the bulk path streams NDJSON in --chunk-rows chunks and, with
+    --wait, polls GET /posts/bulk/{job_id} until the classification jobs are through as well.
+    start the backend with RATE_LIMIT_ENABLED=False and ADMISSION_ENABLED=False (the per user buckets and
+    the ML backlog limit would throttle the per post path) and CLASSIFIER_MICORSERVICE pointing at
+    bench/stub_classifier.py.
+        python bench/seed.py --users 10 --posts 0
+        python bench/bulk_import.py --url http://127.0.0.1:8080 --rows 5000 --concurrency 20 --wait
+'''
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+CITIES = [(12.9716, 77.5946), (19.0760, 72.8777), (28.6139, 77.2090), (13.0827, 80.2707)]
+
+
+def reports(n, rng):
+    for i in range(n):
+        lat, lon = rng.choice(CITIES)
+        yield {
+            "image_url": f"https://example.com/bench/import-{i}.webp",
+            "image_public_id": f"bench/import-{rng.getrandbits(48)}",
+            "caption": "partner survey report",
+            "latitude": rng.gauss(lat, 0.05),
+            "longitude": rng.gauss(lon, 0.05),
+        }
+
+
+async def login(client, username, password):
+    resp = await client.post("/auth/token", data={"username": username, "password": password})
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+async def per_post(client, headers, rows, concurrency):
+    gate = asyncio.Semaphore(concurrency)
+    statuses = {}
+
+    async def one(row):
+        async with gate:
+            resp = await client.post("/posts/", json=row, headers=headers)
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(row) for row in rows))
+    seconds = time.perf_counter() - start
+    return {"rows": len(rows), "seconds": round(seconds, 2), "rows_per_sec": round(len(rows) / seconds, 1), "statuses": statuses}
+
+
+async def bulk(client, headers, rows, chunk_rows, wait):
+    async def body():
+        for start in range(0, len(rows), chunk_rows):
+            yield "".join(json.dumps(row) + "\n" for row in rows[start:start + chunk_rows]).encode()
+
+    start = time.perf_counter()
+    resp = await client.post("/posts/bulk", content=body(), headers={**headers, "Content-Type": "application/x-ndjson"})
+    resp.raise_for_status()
+    stored = time.perf_counter() - start
+    job = resp.json()
+    result = {
+        "rows": len(rows), "seconds": round(stored, 2), "rows_per_sec": round(len(rows) / stored, 1),
+        "inserted": job["inserted"], "rejected": job["rejected"], "job_id": job["id"],
+    }
+
+    if wait:
+        while job["status"] == "classifying":
+            await asyncio.sleep(0.5)
+            job = (await client.get(f"/posts/bulk/{job['id']}", headers=headers)).json()
+        total = time.perf_counter() - start
+        result.update({
+            "classified_seconds": round(total, 2),
+            "classified_rows_per_sec": round(len(rows) / total, 1),
+            "classified": job["classified"], "classify_failed": job["classify_failed"], "status": job["status"],
+        })
+    return result
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    rows = list(reports(args.rows, rng))
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                 limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        headers = await login(client, args.username, args.password)
+        results = {}
+        if "single" in args.paths:
+            results["single"] = await per_post(client, headers, rows, args.concurrency)
+        if "bulk" in args.paths:
+            results["bulk"] = await bulk(client, headers, rows, args.chunk_rows, args.wait)
+    if "single" in results and "bulk" in results:
+        results["speedup"] = round(results["bulk"]["rows_per_sec"] / results["single"]["rows_per_sec"], 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--username", default="bench_user0")
+    parser.add_argument("--password", default="benchpass")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--paths", nargs="+", choices=("single", "bulk"), default=["single", "bulk"])
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--chunk-rows", type=int, default=200, help="rows per streamed body chunk")
+    parser.add_argument("--wait", action="store_true", help="also wait for the bulk classification jobs")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# bench/classifier_scaling.py
+''' classifier throughput from 1 to N inference processes (trash_classifier/serving.py).
+
+    feeds preprocessed 224x224 images from --concurrency async clients, for each worker count,
+    and reports images/s and latency. "inprocess" is the old single process path for reference.
+    without the real model file, --synthetic builds an untrained MobileNetV2 with the same shape.
+        python bench/classifier_scaling.py --workers 1 2 4 8 --concurrency 32 --duration 20
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "trash_classifier"))
+
+
+def synthetic_model(path):
+    import tensorflow as tf
+    model = tf.keras.applications.MobileNetV2(weights=None, classes=6, input_shape=(224, 224, 3))
+    model.save(path)
+    return path
+
+
+async def drive(predict, concurrency, duration, rng):
+    import numpy as np
+    images = [rng.uniform(-1, 1, (1, 224, 224, 3)).astype(np.float32) for _ in range(16)]
+    samples = []
+    deadline = time.perf_counter() + duration
+
+    async def client(i):
+        n = 0
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            await predict(images[(i + n) % len(images)])
+            samples.append((time.perf_counter() - t0) * 1000)
+            n += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    seconds = time.perf_counter() - start
+    samples.sort()
+    return {"images_per_s": round(len(samples) / seconds, 1), "p50_ms": round(samples[len(samples) // 2], 1),
+            "p99_ms": round(samples[int(len(samples) * 0.99)], 1)}
+
+
+async def main_async(args, model_path):
+    import numpy as np
+    import serving
+    rng = np.random.default_rng(0)
+
+    if args.inprocess:
+        dual = serving.load_dual_model(model_path, -2)
+        async def predict(batch):
+            return dual.predict(batch, verbose=0)
+        await drive(predict, 1, 2, rng)   # warm up
+        print(json.dumps({"mode": "inprocess", "cores": os.cpu_count(), **await drive(predict, args.concurrency, args.duration, rng)}))
+
+    for workers in args.workers:
+        t0 = time.perf_counter()
+        pool = serving.InferencePool(model_path, workers, max_batch=args.max_batch, batch_wait_ms=args.batch_wait_ms).start()
+        startup_s = time.perf_counter() - t0
+        await drive(pool.predict, args.concurrency, 2, rng)
+        result = await drive(pool.predict, args.concurrency, args.duration, rng)
+        await pool.close()
+        print(json.dumps({"mode": "pool", "workers": workers, "threads_per_worker": pool.threads,
+                          "max_batch": args.max_batch, "startup_s": round(startup_s, 1), **result}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "trash_classifier", "waste_classifier_model.h5"))
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--batch-wait-ms", type=float, default=2.0)
+    parser.add_argument("--no-inprocess", dest="inprocess", action="store_false")
+    args = parser.parse_args()
+
+    model_path = synthetic_model(os.path.join(tempfile.mkdtemp(), "synthetic.h5")) if args.synthetic else args.model
+    asyncio.run(main_async(args, model_path))
+
+
+if __name__ == "__main__":
+    main()
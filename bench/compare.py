@@ -0,0 +1,78 @@
+# bench/compare.py
+''' compares two bench/load.py reports and flags regressions.
+
+    a request type regresses when its p50 / p95 / p99 got slower by more than --threshold percent
+    (and by more than --min-ms, so sub-millisecond noise doesn't count), its throughput dropped by more
+    than --threshold percent, or its error rate went up. exits 1 when anything regressed, so CI can gate on it.
+        python bench/compare.py results/base.json results/new.json --threshold 10
+'''
+
+import argparse
+import json
+import sys
+
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def pct(old, new):
+    return (new - old) / old * 100 if old else 0.0
+
+
+def compare(base, new, threshold, min_ms):
+    rows, regressions = [], []
+    for name in sorted(set(base["results"]) | set(new["results"])):
+        b, n = base["results"].get(name), new["results"].get(name)
+        if b is None or n is None:
+            rows.append((name, "only in " + ("new" if b is None else "base"), "", "", ""))
+            continue
+        for key in LATENCY_KEYS:
+            if b.get(key) is None or n.get(key) is None:
+                continue
+            change = pct(b[key], n[key])
+            flag = change > threshold and n[key] - b[key] > min_ms
+            rows.append((name, key, b[key], n[key], f"{change:+.1f}%" + ("  REGRESSION" if flag else "")))
+            if flag:
+                regressions.append(f"{name} {key} {b[key]} -> {n[key]} ({change:+.1f}%)")
+
+        change = pct(b["rps"], n["rps"])
+        flag = change < -threshold
+        rows.append((name, "rps", b["rps"], n["rps"], f"{change:+.1f}%" + ("  REGRESSION" if flag else "")))
+        if flag:
+            regressions.append(f"{name} rps {b['rps']} -> {n['rps']} ({change:+.1f}%)")
+
+        b_err = b["errors"] / b["requests"] if b["requests"] else 0.0
+        n_err = n["errors"] / n["requests"] if n["requests"] else 0.0
+        if n_err > b_err:
+            rows.append((name, "error_rate", f"{b_err:.2%}", f"{n_err:.2%}", "REGRESSION"))
+            regressions.append(f"{name} error rate {b_err:.2%} -> {n_err:.2%}")
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent")
+    parser.add_argument("--min-ms", type=float, default=1.0)
+    parser.add_argument("--json", action="store_true", help="print the regressions as JSON instead of a table")
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    rows, regressions = compare(base, new, args.threshold, args.min_ms)
+    if args.json:
+        print(json.dumps({"base": base["meta"], "new": new["meta"], "regressions": regressions}, indent=2))
+    else:
+        print(f"base: {base['meta'].get('commit')} {base['meta'].get('label') or ''}   new: {new['meta'].get('commit')} {new['meta'].get('label') or ''}")
+        for row in rows:
+            print(f"{row[0]:<16}{row[1]:<12}{str(row[2]):>12}{str(row[3]):>12}   {row[4]}")
+        print(f"\n{len(regressions)} regression(s)" if regressions else "\nno regressions")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
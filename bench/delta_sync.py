@@ -0,0 +1,103 @@
+# bench/delta_sync.py
+''' bytes and time of one app refresh against a running backend: full refetch vs GET /sync.
+
+    full   what the app does today: --pages pages of GET /posts/ plus GET /users/profile/stats
+    sync   GET /sync?since=<token> after --changes new comments, following has_more until it's done
+    the first sync (no token, every live row) is timed too, it's paid once per install.
+    start the backend with SYNC_LAG_SECONDS=1 (the bench waits --lag seconds before the delta sync)
+    and RATE_LIMIT_ENABLED=False.
+        python bench/seed.py --users 1000 --posts 20000
+        python bench/delta_sync.py --url http://127.0.0.1:8080 --pages 5 --changes 20
+'''
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+
+async def login(client, username, password):
+    resp = await client.post("/auth/token", data={"username": username, "password": password})
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+async def timed(client, calls):
+    start = time.perf_counter()
+    size = 0
+    for method, url, kwargs in calls:
+        resp = await client.request(method, url, **kwargs)
+        resp.raise_for_status()
+        size += len(resp.content)
+    return {"requests": len(calls), "bytes": size, "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+async def sync_all(client, headers, token, limit):
+    start = time.perf_counter()
+    size = requests = rows = 0
+    while True:
+        params = {"limit": limit, **({"since": token} if token else {})}
+        resp = await client.get("/sync", params=params, headers=headers)
+        resp.raise_for_status()
+        page = resp.json()
+        requests += 1
+        size += len(resp.content)
+        rows += sum(len(page[k]) for k in ("posts", "comments", "users", "deleted_posts"))
+        token = page["next"]
+        if not page["has_more"]:
+            break
+    return token, {"requests": requests, "bytes": size, "rows": rows, "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        headers = await login(client, args.username, args.password)
+        full_calls = [("GET", "/posts/", {"params": {"skip": i * args.page_size, "limit": args.page_size}})
+                      for i in range(args.pages)]
+        full_calls.append(("GET", "/users/profile/stats", {"headers": headers}))
+
+        results = {"full_refresh": await timed(client, full_calls)}
+        token, results["first_sync"] = await sync_all(client, headers, None, args.limit)
+
+        feed = (await client.get("/posts/", params={"limit": args.page_size})).json()
+        for _ in range(args.changes):
+            post = rng.choice(feed)
+            resp = await client.post("/comments/", params={"post_id": post["id"]},
+                                     json={"content": "bench delta"}, headers=headers)
+            resp.raise_for_status()
+        await asyncio.sleep(args.lag)
+
+        _, results["delta_sync"] = await sync_all(client, headers, token, args.limit)
+    results["bytes_saved"] = round(1 - results["delta_sync"]["bytes"] / results["full_refresh"]["bytes"], 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--username", default="bench_user0")
+    parser.add_argument("--password", default="benchpass")
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--changes", type=int, default=20, help="comments posted between the two syncs")
+    parser.add_argument("--limit", type=int, default=500, help="sync page size")
+    parser.add_argument("--lag", type=float, default=1.5, help="seconds to wait, more than the server's SYNC_LAG_SECONDS")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
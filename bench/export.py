@@ -0,0 +1,82 @@
+# bench/export.py
+''' peak memory of a posts export: the streamed export (backend/export.py) against loading every row first.
+
+    "loaded" is what an ad hoc dump does: one execute().all() and then the same writer over that one
+    big chunk. "streamed" is the export endpoint / CLI path, EXPORT_CHUNK_ROWS rows at a time off a
+    server-side cursor. allocations are traced with tracemalloc, the output is written to /dev/null.
+    run it on databases of different sizes, the streamed peak should stay the same:
+        DATABASE_URL=sqlite:///bench.db python bench/seed.py --posts 100000
+        DATABASE_URL=sqlite:///bench.db python bench/export.py --formats ndjson csv parquet
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+
+async def loaded_chunks(**filters):
+    import export
+    import models
+    from database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        rows = []
+        for table in (models.Post.__table__, models.ArchivedPost.__table__):
+            rows += [tuple(r) for r in (await db.execute(export.export_query(table, **filters))).all()]
+    status_at = export.COLUMNS.index("status")
+    yield [r[:status_at] + (r[status_at].value if r[status_at] is not None else None,) + r[status_at + 1:] for r in rows]
+
+
+async def measure(format, mode, out):
+    import export
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    body = export.WRITERS[format](loaded_chunks()) if mode == "loaded" else export.stream(format)
+    written = 0
+    async for data in body:
+        out.write(data)
+        written += len(data)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"bytes": written, "seconds": round(seconds, 2), "peak_mb": round(peak / 2**20, 1)}
+
+
+async def run(args):
+    import export
+    from database import engine
+
+    export.EXPORT_CHUNK_ROWS = args.chunk_rows
+    results = {}
+    with open(os.devnull, "wb") as out:
+        for format in args.formats:
+            results[format] = {mode: await measure(format, mode, out) for mode in args.modes}
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", nargs="+", choices=("ndjson", "csv", "parquet"), default=["ndjson", "csv"])
+    parser.add_argument("--modes", nargs="+", choices=("loaded", "streamed"), default=["loaded", "streamed"])
+    parser.add_argument("--chunk-rows", type=int, default=2000)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# bench/feed_archive.py
+''' feed latency as finished posts pile up, with and without the archiver.
+
+    keeps a fixed number of active posts, adds finished ones step by step and times GET /posts/
+    (the real get_feed) while they sit in the live table, then again after archive_old_posts().
+    checks the feed's query plan uses ix_posts_active_created_at and that map tile counts still match
+    the live posts after archiving, and exits non-zero when either doesn't hold.
+        python bench/feed_archive.py --active 5000 --finished 0 100000 500000
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+
+async def add_posts(db, models, n, statuses, rng, old):
+    import tiles
+    now = datetime.now(timezone.utc)
+    batch = []
+    for i in range(n):
+        age = timedelta(days=rng.uniform(200, 400) if old else rng.uniform(0, 30))
+        batch.append({
+            "image_url": "https://example.com/x.webp", "image_public_id": "bench",
+            "latitude": 12.97, "longitude": 77.59, "predicted_class": "plastic", "points": 0,
+            "status": rng.choice(statuses), "author_id": 1, "created_at": now - age,
+        })
+        if len(batch) == 20000 or i == n - 1:
+            await db.execute(models.Post.__table__.insert(), batch)
+            await tiles.apply_many(db, [(r["latitude"], r["longitude"], r["status"], r["predicted_class"]) for r in batch], +1)
+            batch = []
+    await db.commit()
+
+
+async def time_feed(db, get_feed, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        await get_feed(skip=0, limit=20, db=db)
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return round(samples[len(samples) // 2], 2)
+
+
+async def explain(db, models):
+    from sqlalchemy import select, desc, text
+    query = (
+        select(models.Post.id)
+        .where(models.Post.status.in_(models.ACTIVE_STATUSES))
+        .order_by(desc(models.Post.created_at))
+        .limit(20)
+    )
+    sql = str(query.compile(db.bind, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if db.bind.dialect.name == "sqlite" else "EXPLAIN "
+    return [" ".join(str(c) for c in row) for row in (await db.execute(text(prefix + sql))).all()]
+
+
+async def main_async(args):
+    from sqlalchemy import func, select
+    import models, archive
+    from database import engine, Base, AsyncSessionLocal
+    from routers.posts import get_feed
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    rng = random.Random(0)
+    async with AsyncSessionLocal() as db:
+        await db.execute(models.User.__table__.insert(), [{"username": "bench", "email": "bench@example.com", "hashed_password": "x", "points": 0}])
+        await add_posts(db, models, args.active, list(models.ACTIVE_STATUSES), rng, old=False)
+        plan = await explain(db, models)
+        print(json.dumps({"plan": plan}))
+        if not any("ix_posts_active_created_at" in line for line in plan):
+            sys.exit("feed query does not use ix_posts_active_created_at")
+
+    finished_so_far = 0
+    for target in args.finished:
+        async with AsyncSessionLocal() as db:
+            await add_posts(db, models, target - finished_so_far, list(models.FINISHED_STATUSES), rng, old=True)
+            finished_so_far = target
+            live_ms = await time_feed(db, get_feed, args.repeat)
+
+        t0 = time.perf_counter()
+        moved = await archive.archive_old_posts(older_than_days=180)
+        archive_s = time.perf_counter() - t0
+        finished_so_far = 0    # they left the live table
+
+        async with AsyncSessionLocal() as db:
+            archived_ms = await time_feed(db, get_feed, args.repeat)
+            live = (await db.execute(select(func.count(models.Post.id)))).scalar()
+            agg = models.TileAggregate
+            mapped = (await db.execute(select(func.coalesce(func.sum(agg.count), 0)).where(agg.zoom == 0))).scalar()
+        if mapped != live:
+            sys.exit(f"tile aggregates count {mapped} posts, the live table has {live}")
+        print(json.dumps({"finished_posts": target, "feed_p50_ms_live": live_ms, "feed_p50_ms_after_archive": archived_ms,
+                          "archived": moved, "archive_s": round(archive_s, 2)}))
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--active", type=int, default=5000)
+    parser.add_argument("--finished", type=int, nargs="+", default=[0, 100_000, 500_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+    os.environ.setdefault("SECRET_KEY", "bench")
+    os.environ.setdefault("ARCHIVE_BATCH_SIZE", "5000")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+# bench/load.py
+''' async load driver for a running backend.
+
+    N virtual users each log in once, then loop over scenarios picked by --mix weight until --duration
+    runs out. every HTTP call is timed and the run is written as JSON (p50 / p95 / p99, throughput, errors
+    per request type) for bench/compare.py.
+
+    scenarios:
+        feed         scrolls 3 pages of GET /posts/, resending ETags like the app does (--no-etags to skip)
+        leaderboard  polls GET /users/leaderboard
+        login        POST /auth/token as a random seeded user (argon2 verify, the expensive one)
+        create       POST /posts/, queues the classifier call (point the backend at bench/stub_classifier.py)
+        tiles        GET /posts/tiles/{z}/{x}/{y} around the seeded cities
+        stats        GET /users/profile/stats for the logged in user
+
+        python bench/seed.py --users 1000 --posts 20000
+        python bench/load.py --url http://127.0.0.1:8080 --users 1000 --concurrency 50 --duration 60 \\
+            --mix feed=50,leaderboard=20,login=10,create=10,tiles=10 --out results/base.json
+'''
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+SCENARIOS = ("feed", "leaderboard", "login", "create", "tiles", "stats")
+CITIES = [(12.9716, 77.5946), (19.0760, 72.8777), (28.6139, 77.2090), (13.0827, 80.2707)]
+
+
+def percentile(sorted_samples, p):
+    if not sorted_samples:
+        return None
+    rank = max(0, math.ceil(p / 100 * len(sorted_samples)) - 1)
+    return round(sorted_samples[rank], 2)
+
+
+def tile_for(lat, lon, zoom):
+    n = 1 << zoom
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return x, y
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.recording = False
+
+    async def call(self, name, fn, *args, ok=(200, 201, 304), **kwargs):
+        t0 = time.perf_counter()
+        try:
+            resp = await fn(*args, **kwargs)
+            status = resp.status_code
+        except httpx.HTTPError as e:
+            resp, status = None, type(e).__name__
+        elapsed = (time.perf_counter() - t0) * 1000
+        if self.recording:
+            self.samples[name].append(elapsed)
+            self.statuses[name][str(status)] += 1
+            if status not in ok:
+                self.errors[name] += 1
+        return resp
+
+
+class VirtualUser:
+    def __init__(self, client, rec, rng, args):
+        self.client, self.rec, self.rng, self.args = client, rec, rng, args
+        self.username = f"bench_user{rng.randrange(args.users)}"
+        self.headers = {}
+        self.etags = {}
+
+    async def login(self, name="login"):
+        user = f"bench_user{self.rng.randrange(self.args.users)}" if name == "login" else self.username
+        resp = await self.rec.call(name, self.client.post, "/auth/token",
+                                   data={"username": user, "password": self.args.password})
+        return resp.json()["access_token"] if resp is not None and resp.status_code == 200 else None
+
+    async def get(self, name, url):
+        headers = dict(self.headers)
+        if self.args.etags and url in self.etags:
+            headers["If-None-Match"] = self.etags[url]
+        resp = await self.rec.call(name, self.client.get, url, headers=headers)
+        if resp is not None and resp.headers.get("etag"):
+            self.etags[url] = resp.headers["etag"]
+
+    async def feed(self):
+        for page in range(3):
+            await self.get("feed", f"/posts/?skip={page * 20}&limit=20")
+
+    async def leaderboard(self):
+        await self.get("leaderboard", "/users/leaderboard")
+
+    async def stats(self):
+        await self.get("stats", "/users/profile/stats")
+
+    async def tiles(self):
+        lat, lon = self.rng.choice(CITIES)
+        z = self.rng.choice([8, 11, 14])
+        x, y = tile_for(lat, lon, z)
+        await self.get("tiles", f"/posts/tiles/{z}/{x}/{y}")
+
+    async def create(self):
+        lat, lon = self.rng.choice(CITIES)
+        body = {
+            "image_url": "https://example.com/bench/new.webp", "image_public_id": f"bench/new-{self.rng.getrandbits(48)}",
+            "caption": "load test report", "latitude": self.rng.gauss(lat, 0.05), "longitude": self.rng.gauss(lon, 0.05),
+        }
+        await self.rec.call("create", self.client.post, "/posts/", json=body, headers=self.headers)
+
+    async def run(self, mix, deadline):
+        token = await self.login("session_login")
+        if token:
+            self.headers = {"Authorization": f"Bearer {token}"}
+        names, weights = zip(*mix.items())
+        while time.perf_counter() < deadline:
+            scenario = self.rng.choices(names, weights=weights)[0]
+            await getattr(self, scenario)()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def summarize(rec, seconds):
+    result = {}
+    for name, samples in sorted(rec.samples.items()):
+        samples.sort()
+        result[name] = {
+            "requests": len(samples),
+            "errors": rec.errors[name],
+            "rps": round(len(samples) / seconds, 2),
+            "mean_ms": round(sum(samples) / len(samples), 2),
+            "p50_ms": percentile(samples, 50),
+            "p95_ms": percentile(samples, 95),
+            "p99_ms": percentile(samples, 99),
+            "max_ms": round(samples[-1], 2),
+            "statuses": dict(rec.statuses[name]),
+        }
+    everything = sorted(s for samples in rec.samples.values() for s in samples)
+    result["_total"] = {
+        "requests": len(everything),
+        "errors": sum(rec.errors.values()),
+        "rps": round(len(everything) / seconds, 2),
+        "p50_ms": percentile(everything, 50),
+        "p95_ms": percentile(everything, 95),
+        "p99_ms": percentile(everything, 99),
+    }
+    return result
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def main_async(args):
+    rec = Recorder()
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        rng = random.Random(args.seed)
+        vus = [VirtualUser(client, rec, random.Random(rng.random()), args) for _ in range(args.concurrency)]
+
+        if args.warmup:
+            deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*(vu.run(mix, deadline) for vu in vus))
+
+        rec.recording = True
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(vu.run(mix, deadline) for vu in vus))
+        seconds = time.perf_counter() - start
+
+    report = {
+        "meta": {
+            "url": args.url, "concurrency": args.concurrency, "duration_s": round(seconds, 1), "mix": mix,
+            "etags": args.etags, "seed": args.seed, "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"), "label": args.label,
+        },
+        "results": summarize(rec, seconds),
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(text)
+    print(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--users", type=int, default=1000, help="how many bench_user{i} bench/seed.py created")
+    parser.add_argument("--password", default="benchpass")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--mix", default="feed=50,leaderboard=20,login=10,create=10,tiles=10")
+    parser.add_argument("--no-etags", dest="etags", action="store_false")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", default=None, help="free text stored in the report, e.g. the branch")
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# bench/map_tiles.py
+''' map tile latency at several zoom levels: tile_aggregates lookup vs scanning posts in the tile bbox.
+
+    seeds N posts around a city into a throwaway sqlite db (or DATABASE_URL), rebuilds the aggregates,
+    then times tiles.get_tile against the naive "select every post in the box and cluster in python".
+        python bench/map_tiles.py --posts 1000000 --zooms 4 8 12 16
+'''
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+CITY = (12.9716, 77.5946)   # Bengaluru
+
+
+def tile_bounds(z, x, y):
+    n = 1 << z
+    lon_min = x / n * 360.0 - 180.0
+    lon_max = (x + 1) / n * 360.0 - 180.0
+    lat_max = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    lat_min = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return lat_min, lat_max, lon_min, lon_max
+
+
+async def seed(db, models, n, rng):
+    await db.execute(models.User.__table__.insert(), [{"username": "bench", "email": "bench@example.com", "hashed_password": "x", "points": 0}])
+    statuses = list(models.TaskStatus)
+    classes = ["cardboard", "glass", "metal", "paper", "plastic", "trash"]
+    batch = []
+    for i in range(n):
+        batch.append({
+            "image_url": "https://example.com/x.webp", "image_public_id": f"bench/{i}",
+            "latitude": rng.gauss(CITY[0], 0.08), "longitude": rng.gauss(CITY[1], 0.08),
+            "status": rng.choice(statuses), "predicted_class": rng.choice(classes),
+            "points": 0, "author_id": 1,
+        })
+        if len(batch) == 20000:
+            await db.execute(models.Post.__table__.insert(), batch)
+            batch = []
+    if batch:
+        await db.execute(models.Post.__table__.insert(), batch)
+    await db.commit()
+
+
+async def naive_tile(db, models, z, x, y):
+    from sqlalchemy import select
+    lat_min, lat_max, lon_min, lon_max = tile_bounds(z, x, y)
+    query = select(models.Post.latitude, models.Post.longitude, models.Post.status, models.Post.predicted_class).where(
+        models.Post.latitude.between(lat_min, lat_max), models.Post.longitude.between(lon_min, lon_max)
+    )
+    return len((await db.execute(query)).all())
+
+
+async def main_async(args):
+    import models, tiles
+    from database import engine, Base, AsyncSessionLocal
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    rng = random.Random(0)
+    async with AsyncSessionLocal() as db:
+        t0 = time.perf_counter()
+        await seed(db, models, args.posts, rng)
+        seed_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        await tiles.rebuild(db)
+        rebuild_s = time.perf_counter() - t0
+    print(json.dumps({"posts": args.posts, "seed_s": round(seed_s, 1), "rebuild_s": round(rebuild_s, 1)}))
+
+    for z in args.zooms:
+        x, y = tiles.tile_for(*CITY, z)
+        async with AsyncSessionLocal() as db:
+            for name, fn in (("aggregates", lambda: tiles.get_tile(db, z, x, y)), ("scan", lambda: naive_tile(db, models, z, x, y))):
+                samples = []
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    await fn()
+                    samples.append((time.perf_counter() - t0) * 1000)
+                samples.sort()
+                print(json.dumps({"zoom": z, "mode": name, "p50_ms": round(samples[len(samples) // 2], 2),
+                                  "max_ms": round(samples[-1], 2)}))
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--zooms", type=int, nargs="+", default=[4, 8, 12, 16])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+    os.environ.setdefault("SECRET_KEY", "bench")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
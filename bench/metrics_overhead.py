@@ -0,0 +1,79 @@
+# bench/metrics_overhead.py
+''' per request cost of MetricsMiddleware.
+
+    drives a small FastAPI app (one templated route, like the real ones) straight through ASGI,
+    no sockets, so the difference between the two runs is the middleware itself.
+        python bench/metrics_overhead.py --requests 50000
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+
+def build_app(with_metrics):
+    from fastapi import FastAPI
+    from metrics import MetricsMiddleware
+
+    app = FastAPI()
+
+    @app.get("/posts/{post_id}")
+    async def read(post_id: int):
+        return {"id": post_id}
+
+    if with_metrics:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def drive(app, n):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    samples = []
+    for i in range(n):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": f"/posts/{i % 1000}", "raw_path": f"/posts/{i % 1000}".encode(), "root_path": "",
+            "query_string": b"", "headers": [], "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 8080),
+        }
+        t0 = time.perf_counter()
+        await app(scope, receive, send)
+        samples.append((time.perf_counter() - t0) * 1e6)
+    samples.sort()
+    return {"p50_us": round(samples[len(samples) // 2], 1), "p99_us": round(samples[int(len(samples) * 0.99)], 1),
+            "mean_us": round(sum(samples) / len(samples), 1)}
+
+
+async def main_async(args):
+    results = {}
+    for name, with_metrics in (("baseline", False), ("metrics", True)):
+        app = build_app(with_metrics)
+        await drive(app, 1000)    # warm up
+        results[name] = await drive(app, args.requests)
+        print(json.dumps({"mode": name, "requests": args.requests, **results[name]}))
+    print(json.dumps({"overhead_us_p50": round(results["metrics"]["p50_us"] - results["baseline"]["p50_us"], 1)}))
+
+    from prometheus_client import generate_latest
+    t0 = time.perf_counter()
+    body = generate_latest()
+    print(json.dumps({"scrape_ms": round((time.perf_counter() - t0) * 1000, 2), "scrape_bytes": len(body)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50000)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# bench/serialization.py
+''' per page serialization cost of GET /posts/: ORM + pydantic + json vs row projection + orjson.
+
+    seeds a throwaway sqlite db with a page of posts (each with comments and likes), then times the
+    real get_feed on both paths and measures allocations with tracemalloc. also checks both paths
+    produce the same JSON, so the fast path can't quietly change the API contract.
+        python bench/serialization.py --posts 100 --comments 5 --likes 10
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+
+async def seed(db, models, args, rng):
+    users = [{"username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": "x", "points": rng.randint(0, 500)}
+             for i in range(50)]
+    await db.execute(models.User.__table__.insert(), users)
+    posts, comments, likes = [], [], []
+    for i in range(1, args.posts + 1):
+        posts.append({
+            "image_url": f"https://example.com/{i}.webp", "image_public_id": f"bench/{i}", "caption": "pile near the bus stop",
+            "latitude": 12.97 + rng.random() / 100, "longitude": 77.59 + rng.random() / 100,
+            "predicted_class": "plastic", "points": 20, "status": models.TaskStatus.OPEN, "author_id": rng.randint(1, 50),
+            "volunteer_id": rng.choice([None, rng.randint(1, 50)]),
+        })
+        comments += [{"content": "on my way", "author_id": rng.randint(1, 50), "post_id": i} for _ in range(args.comments)]
+        likes += [{"user_id": u, "post_id": i} for u in rng.sample(range(1, 51), args.likes)]
+    await db.execute(models.Post.__table__.insert(), posts)
+    await db.execute(models.Comment.__table__.insert(), comments)
+    await db.execute(models.Like.__table__.insert(), likes)
+    await db.commit()
+
+
+''' what FastAPI does with response_model on the ORM path: validate from attributes,
+    dump to json-able python, then json.dumps in JSONResponse.render
+'''
+def fastapi_render(adapter, objs):
+    content = adapter.dump_python(adapter.validate_python(objs, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+async def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    tracemalloc.start()
+    await fn()
+    _, peak = tracemalloc.get_traced_memory()
+    blocks = sum(s.count for s in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+    return {"p50_ms": round(samples[len(samples) // 2], 3), "p95_ms": round(samples[int(len(samples) * 0.95)], 3),
+            "peak_kb": round(peak / 1024, 1), "live_blocks": blocks}
+
+
+async def main_async(args):
+    from typing import List
+    from pydantic import TypeAdapter
+    import models, schemas, serializers
+    from database import engine, Base, AsyncSessionLocal
+    from routers.posts import get_feed
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        await seed(db, models, args, random.Random(0))
+
+    adapter = TypeAdapter(List[schemas.Post])
+    async with AsyncSessionLocal() as db:
+        async def orm_page():
+            serializers.FAST_SERIALIZATION = False
+            db.expunge_all()
+            return fastapi_render(adapter, await get_feed(skip=0, limit=args.posts, db=db))
+
+        async def fast_page():
+            serializers.FAST_SERIALIZATION = True
+            return (await get_feed(skip=0, limit=args.posts, db=db)).body
+
+        #serialization only: rows / objects already loaded, just the encode step
+        serializers.FAST_SERIALIZATION = False
+        objs = await get_feed(skip=0, limit=args.posts, db=db)
+        serializers.FAST_SERIALIZATION = True
+        rows = await serializers.project_posts(db, serializers.post_select().limit(args.posts)
+                                               .order_by(models.Post.created_at.desc()))
+
+        async def orm_encode():
+            return fastapi_render(adapter, objs)
+
+        async def fast_encode():
+            return serializers.FastJSONResponse(rows).body
+
+        same = json.loads(await orm_page()) == json.loads(await fast_page())
+        print(json.dumps({"posts": args.posts, "comments_per_post": args.comments, "likes_per_post": args.likes,
+                          "same_output": same, "page_bytes": len(await fast_page())}))
+        for name, fn in (("orm_page", orm_page), ("fast_page", fast_page), ("orm_encode", orm_encode), ("fast_encode", fast_encode)):
+            print(json.dumps({"mode": name, **await measure(fn, args.repeat)}))
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--comments", type=int, default=5)
+    parser.add_argument("--likes", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+    os.environ.setdefault("SECRET_KEY", "bench")
+    os.environ.setdefault("ARCHIVER_ENABLED", "False")
+    os.environ.setdefault("SCHEDULER_ENABLED", "False")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# bench/server_runner.py
+''' requests/sec of the old launcher against backend/serve.py.
+
+    starts the backend once per launcher, runs bench/load.py against it with the same arguments,
+    then SIGTERMs it and times the drain. the database in DATABASE_URL must already be seeded
+    (bench/seed.py), and CLASSIFIER_URL should point at bench/stub_classifier.py if the mix creates posts.
+        dev      uvicorn main:app --reload, single process (what the Dockerfile used to run)
+        serve    python serve.py, WEB_CONCURRENCY workers or auto sized, uvloop + httptools when installed
+
+        python bench/server_runner.py --launchers dev serve --workers 4 --duration 30 \\
+            --mix feed=60,leaderboard=30,tiles=10 --out results/runner.json
+'''
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..", "backend")
+
+
+def command(launcher, port):
+    if launcher == "dev":
+        return [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--reload"]
+    return [sys.executable, "serve.py"]
+
+
+def wait_ready(url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url + "/", timeout=1.0).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    return False
+
+
+def run(launcher, args, load_args):
+    url = f"http://127.0.0.1:{args.port}"
+    env = dict(os.environ, HOST="127.0.0.1", PORT=str(args.port))
+    if args.workers:
+        env["WEB_CONCURRENCY"] = str(args.workers)
+    server = subprocess.Popen(command(launcher, args.port), cwd=BACKEND_DIR, env=env, start_new_session=True)
+    try:
+        if not wait_ready(url, args.startup_timeout):
+            raise SystemExit(f"{launcher}: backend did not come up on {url}")
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            report = f.name
+        subprocess.run([sys.executable, os.path.join(BENCH_DIR, "load.py"), "--url", url, "--label", launcher,
+                        "--out", report, *load_args], check=True)
+        with open(report) as f:
+            result = json.load(f)
+        os.unlink(report)
+    finally:
+        start = time.perf_counter()
+        os.killpg(server.pid, signal.SIGTERM)    # the reloader and the workers are in the group
+        try:
+            server.wait(timeout=args.startup_timeout + 30)
+        except subprocess.TimeoutExpired:
+            os.killpg(server.pid, signal.SIGKILL)
+            server.wait()
+        drain = time.perf_counter() - start
+    return {"total": result["results"]["_total"], "drain_seconds": round(drain, 2), "exit_code": server.returncode}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--launchers", nargs="+", choices=("dev", "serve"), default=["dev", "serve"])
+    parser.add_argument("--workers", type=int, default=0, help="WEB_CONCURRENCY for serve.py, 0 = auto")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--out", default=None)
+    args, load_args = parser.parse_known_args()   # everything else goes to load.py
+
+    results = {}
+    for launcher in args.launchers:
+        results[launcher] = run(launcher, args, load_args)
+        total = results[launcher]["total"]
+        print(f"{launcher:>6}: {total['rps']:>9.1f} req/s  p50 {total['p50_ms']}ms  p99 {total['p99_ms']}ms  "
+              f"errors {total['errors']}  drain {results[launcher]['drain_seconds']}s")
+
+    if "dev" in results and "serve" in results and results["dev"]["total"]["rps"]:
+        print(f"speedup: {results['serve']['total']['rps'] / results['dev']['total']['rps']:.2f}x")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"workers": args.workers or "auto", "load_args": load_args, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# bench/sqlite_concurrency.py
+''' mixed read / write throughput on a sqlite file: the plain aiosqlite engine vs the sqlite profile in database.py.
+
+    every mode gets a fresh copy of the same seeded file and runs in its own --processes processes (the engine
+    is built at import time, and uvicorn workers are processes too), each with --tasks concurrent tasks:
+        read   the real get_feed (GET /posts/)
+        write  what POST /posts/ does in the database: a new post and its tile counts, one commit
+    --write-ratio of the operations are writes. reports ops/s, p50 / p99 per kind and the errors
+    ("database is locked") of each mode.
+        python bench/sqlite_concurrency.py --processes 4 --tasks 16 --write-ratio 0.2 --duration 15
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND)
+
+MODES = {"default": "False", "profile": "True"}   # SQLITE_TUNING
+
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))], 2)
+
+
+async def seed(args):
+    import models, migrations, tiles
+    from database import engine, AsyncSessionLocal
+
+    await migrations.upgrade(engine)
+    rng = random.Random(args.seed)
+    async with AsyncSessionLocal() as db:
+        await db.execute(models.User.__table__.insert(), [{"username": "bench", "email": "bench@example.com", "hashed_password": "x", "points": 0}])
+        rows = [{
+            "image_url": "https://example.com/x.webp", "image_public_id": "bench", "caption": "seed",
+            "latitude": rng.gauss(12.97, 0.05), "longitude": rng.gauss(77.59, 0.05),
+            "predicted_class": rng.choice(["plastic", "glass", "paper"]), "points": 10,
+            "status": models.TaskStatus.OPEN, "author_id": 1,
+        } for _ in range(args.posts)]
+        await db.execute(models.Post.__table__.insert(), rows)
+        await tiles.apply_many(db, [(r["latitude"], r["longitude"], r["status"], r["predicted_class"]) for r in rows], +1)
+        await db.commit()
+    await engine.dispose()
+
+
+async def drive(args):
+    import models, tiles
+    from database import AsyncSessionLocal, dispose_engines
+    from routers.posts import get_feed
+
+    deadline = time.perf_counter() + args.duration
+    latencies = {"read": [], "write": []}
+    errors = Counter()
+
+    async def worker(i):
+        rng = random.Random(args.seed * 1000 + os.getpid() + i)
+        while time.perf_counter() < deadline:
+            kind = "write" if rng.random() < args.write_ratio else "read"
+            start = time.perf_counter()
+            try:
+                async with AsyncSessionLocal() as db:
+                    if kind == "read":
+                        await get_feed(skip=0, limit=20, db=db)
+                    else:
+                        lat, lon = rng.gauss(12.97, 0.05), rng.gauss(77.59, 0.05)
+                        db.add(models.Post(
+                            image_url="https://example.com/y.webp", image_public_id="bench", latitude=lat, longitude=lon,
+                            predicted_class="Analysing", points=0, author_id=1, status=models.TaskStatus.OPEN,
+                        ))
+                        await tiles.apply(db, lat, lon, models.TaskStatus.OPEN, "Analysing", +1)
+                        await db.commit()
+            except Exception as e:
+                errors[f"{kind}: {type(e).__name__}: {str(e).splitlines()[0][:80]}"] += 1
+                continue
+            latencies[kind].append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(worker(i) for i in range(args.tasks)))
+    await dispose_engines()
+    return {"latencies": latencies, "errors": dict(errors)}
+
+
+def run_mode(args, mode, seeded, workdir):
+    path = os.path.join(workdir, f"{mode}.db")
+    shutil.copy(seeded, path)
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}", SQLITE_TUNING=MODES[mode], SECRET_KEY="bench",
+               ARCHIVER_ENABLED="False", SCHEDULER_ENABLED="False", SQL_DEBUG="False")
+    child = [sys.executable, os.path.abspath(__file__), "--child", "drive"] + [
+        f"--{k.replace('_', '-')}={v}" for k, v in vars(args).items() if k in ("tasks", "write_ratio", "duration", "seed")
+    ]
+    procs = [subprocess.Popen(child, env=env, stdout=subprocess.PIPE, cwd=BACKEND) for _ in range(args.processes)]
+    results = [json.loads(p.communicate()[0].decode().strip().splitlines()[-1]) for p in procs]
+
+    reads = [ms for r in results for ms in r["latencies"]["read"]]
+    writes = [ms for r in results for ms in r["latencies"]["write"]]
+    errors = Counter()
+    for r in results:
+        errors.update(r["errors"])
+    return {
+        "ops_per_sec": round((len(reads) + len(writes)) / args.duration, 1),
+        "reads_per_sec": round(len(reads) / args.duration, 1),
+        "writes_per_sec": round(len(writes) / args.duration, 1),
+        "read_p50_ms": percentile(reads, 50), "read_p99_ms": percentile(reads, 99),
+        "write_p50_ms": percentile(writes, 50), "write_p99_ms": percentile(writes, 99),
+        "errors": dict(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--tasks", type=int, default=16, help="concurrent tasks per process")
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--posts", type=int, default=20000, help="seeded posts")
+    parser.add_argument("--modes", nargs="+", choices=tuple(MODES), default=list(MODES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--child", choices=("seed", "drive"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child == "seed":
+        asyncio.run(seed(args))
+        return
+    if args.child == "drive":
+        print(json.dumps(asyncio.run(drive(args))))
+        return
+
+    workdir = tempfile.mkdtemp(prefix="sqlite-bench-")
+    seeded = os.path.join(workdir, "seed.db")
+    #seeded with the plain engine, so the file starts in the default rollback journal mode
+    subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "seed", f"--posts={args.posts}", f"--seed={args.seed}"],
+                   env=dict(os.environ, DATABASE_URL=f"sqlite:///{seeded}", SQLITE_TUNING="False", SECRET_KEY="bench"),
+                   cwd=BACKEND, check=True)
+
+    results = {}
+    for mode in args.modes:
+        results[mode] = run_mode(args, mode, seeded, workdir)
+        r = results[mode]
+        print(f"{mode:>8}: {r['ops_per_sec']} ops/s (reads {r['reads_per_sec']}/s p99 {r['read_p99_ms']}ms, "
+              f"writes {r['writes_per_sec']}/s p99 {r['write_p99_ms']}ms)  errors {sum(r['errors'].values())}")
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
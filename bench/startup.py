@@ -0,0 +1,125 @@
+# bench/startup.py
+''' backend cold start: import time of main.py and time to the first answered request.
+
+    import   python -X importtime -c "import main", the median over --runs fresh interpreters, plus the
+             modules with the biggest cumulative import time and whether the lazy ones (PIL, cloudinary,
+             passlib) got pulled in at startup again
+    ready    spawn uvicorn, poll GET / until it answers. the first run starts on an empty database
+             (migrations run), the rest only do the schema version check
+    with --baseline a previous report is compared and the script exits 1 when either median got more than
+    --threshold slower, so it can sit in CI next to bench/compare.py.
+        python bench/startup.py --runs 5 --out results/startup.json
+        python bench/startup.py --runs 5 --baseline results/startup.json
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+LAZY_MODULES = ("PIL", "cloudinary", "passlib")
+
+
+def parse_importtime(stderr):
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(cumulative) / 1000, len(name) - len(name.lstrip()))
+    #top level imports are the least indented ones, their cumulative times add up to the total
+    top = min(depth for _, depth in modules.values())
+    total = sum(ms for ms, depth in modules.values() if depth == top)
+    return total, {name: ms for name, (ms, _) in modules.items()}
+
+
+def measure_import(env, runs):
+    totals, last = [], {}
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                              cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise SystemExit(proc.stderr[-2000:])
+        total, last = parse_importtime(proc.stderr)
+        totals.append(total)
+    slowest = sorted(last.items(), key=lambda kv: kv[1], reverse=True)[:15]
+    return {
+        "median_ms": round(statistics.median(totals), 1),
+        "runs_ms": [round(t, 1) for t in totals],
+        "slowest": {name: round(ms, 1) for name, ms in slowest},
+        "lazy_loaded_at_import": [m for m in LAZY_MODULES if m in last],
+    }
+
+
+def measure_ready(env, port, timeout):
+    url = f"http://127.0.0.1:{port}/"
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+                              cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if httpx.get(url, timeout=0.5).status_code == 200:
+                    return (time.perf_counter() - start) * 1000
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+        raise SystemExit(f"backend did not answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--database-url", default=None, help="default: a fresh sqlite file")
+    parser.add_argument("--baseline", default=None, help="an earlier report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="startup-")
+    database_url = args.database_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'startup.db')}"
+    env = dict(os.environ, DATABASE_URL=database_url, ARCHIVER_ENABLED="False", SCHEDULER_ENABLED="False",
+               STORAGE_BACKEND="local")
+
+    imports = measure_import(env, args.runs)
+    ready = [measure_ready(env, args.port, args.timeout) for _ in range(args.runs)]
+    report = {
+        "import": imports,
+        "ready": {
+            "first_ms": round(ready[0], 1),   # empty database, migrations included
+            "median_ms": round(statistics.median(ready[1:] or ready), 1),
+            "runs_ms": [round(r, 1) for r in ready],
+        },
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            base = json.load(f)
+        regressions = []
+        for phase in ("import", "ready"):
+            before, after = base[phase]["median_ms"], report[phase]["median_ms"]
+            if after > before * (1 + args.threshold):
+                regressions.append(f"{phase}: {before}ms -> {after}ms")
+        if regressions:
+            print("startup regression: " + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# bench/stub_classifier.py
+''' stand-in for trash_classifier with the same endpoints and response shapes but no tensorflow.
+
+    sleeps for a configurable "inference" time instead of running the model and never downloads the image,
+    so load tests measure the backend, not the model. point the backend at it with
+        python bench/stub_classifier.py --port 6970 --latency-ms 80 --jitter-ms 20
+        CLASSIFIER_MICORSERVICE=http://127.0.0.1:6970 python backend/main.py
+'''
+
+import argparse
+import asyncio
+import random
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+from typing import Optional
+
+CLASSES = ["cardboard", "glass", "metal", "paper", "plastic", "trash"]
+POINTS = {"cardboard": 5, "paper": 8, "glass": 15, "metal": 25, "plastic": 30, "trash": 10}
+DUSTBIN = {c: " Blue Dustbin (Dry Waste / Recyclable)" for c in CLASSES}
+DUSTBIN["trash"] = " Black Dustbin (General / Non-Recyclable Waste)"
+
+
+class PredictRequest(BaseModel):
+    image_url: str
+    post_id: Optional[int] = None
+
+class VerifyRequest(BaseModel):
+    original_url: str
+    start_url: Optional[str] = None
+    end_url: str
+    post_id: Optional[int] = None
+
+class SimilarRequest(BaseModel):
+    post_id: Optional[int] = None
+    image_url: Optional[str] = None
+    k: int = 10
+    exact: bool = False
+
+
+def build_app(latency_ms: float, jitter_ms: float, error_rate: float, seed: int) -> FastAPI:
+    app = FastAPI(title="Stub Waste Classifier")
+    rng = random.Random(seed)
+    stored = []
+    seen = {}   # url -> prediction, like the real prediction cache
+
+    async def fake_inference():
+        await asyncio.sleep(max(0.0, rng.gauss(latency_ms, jitter_ms)) / 1000)
+        if rng.random() < error_rate:
+            raise HTTPException(status_code=500, detail="stub classifier failure")
+        predicted_class = rng.choice(CLASSES)
+        return {
+            "predicted_class": predicted_class,
+            "confidence": f"{rng.uniform(0.5, 1.0):.2%}",
+            "recommended_dustbin": DUSTBIN[predicted_class],
+            "points": POINTS[predicted_class],
+        }
+
+    @app.get("/")
+    def root():
+        return {"message": "stub trash classifier is UP"}
+
+    @app.post("/predict_with_urls")
+    async def predict(req: PredictRequest):
+        result = await fake_inference()
+        seen[req.image_url] = result
+        if req.post_id is not None:
+            stored.append(req.post_id)
+        return result
+
+    @app.post("/verify_cleanup")
+    async def verify_cleanup(req: VerifyRequest):
+        urls = {r: u for r, u in (("original", req.original_url), ("start", req.start_url), ("end", req.end_url)) if u}
+        missing = [r for r, u in urls.items() if u not in seen]
+        if missing:
+            await fake_inference()   # one "forward pass" for every unseen image
+            for role in missing:
+                predicted_class = rng.choice(CLASSES)
+                seen[urls[role]] = {
+                    "predicted_class": predicted_class,
+                    "confidence": f"{rng.uniform(0.5, 1.0):.2%}",
+                    "recommended_dustbin": DUSTBIN[predicted_class],
+                    "points": POINTS[predicted_class],
+                }
+        images = {r: {**seen[u], "cached": r not in missing} for r, u in urls.items()}
+        return {
+            "images": images,
+            "before": "start" if "start" in urls else "original",
+            "cleanliness_delta": round(rng.uniform(-0.2, 1.0), 4),
+            "inferred": len(missing),
+        }
+
+    @app.post("/embed_with_urls")
+    async def embed(req: PredictRequest):
+        result = await fake_inference()
+        result["embedding"] = [round(rng.random(), 5) for _ in range(16)]
+        return result
+
+    @app.post("/similar")
+    async def similar(req: SimilarRequest):
+        if req.post_id is not None and req.post_id not in stored:
+            raise HTTPException(status_code=404, detail="No embedding stored for this post")
+        picks = rng.sample(stored, min(req.k, len(stored)))
+        return {"results": [{"post_id": p, "score": round(rng.uniform(0.5, 1.0), 4)} for p in picks if p != req.post_id]}
+
+    @app.get("/vectors/stats")
+    def vector_stats():
+        return {"count": len(stored), "dim": 16, "ivf": False}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6970)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    app = build_app(args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# bench/sweeper.py
+''' the sweeper jobs on a big posts table, and leader election between schedulers.
+
+    seeds --posts posts (mostly open / finished) with --stale abandoned IN_PROGRESS tasks and --stuck posts
+    left in "Analysing", prints the query plans of both sweeps (they should use ix_posts_status_volunteer_start
+    and ix_posts_analysing_created_at, not scan posts) and times release_stale_tasks / requeue_unclassified
+    (the classifier call is a --classify-ms sleep). then runs --schedulers Scheduler instances side by side
+    for --election-seconds and counts which of them ran a job: exactly one should have.
+        python bench/sweeper.py --posts 500000 --stale 2000 --stuck 2000
+    the database is a temp sqlite file unless DATABASE_URL is set (run migrations.py against it first).
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+
+async def seed(db, models, args, rng):
+    now = datetime.now(timezone.utc)
+    statuses = [models.TaskStatus.OPEN, models.TaskStatus.COMPLETED, models.TaskStatus.PENDING_APPROVAL]
+    kinds = ["normal"] * (args.posts - args.stale - args.stuck) + ["stale"] * args.stale + ["stuck"] * args.stuck
+    rng.shuffle(kinds)
+    batch = []
+    for kind in kinds:
+        row = {
+            "image_url": "https://example.com/x.webp", "image_public_id": "bench",
+            "latitude": 12.97, "longitude": 77.59, "predicted_class": "plastic", "points": 10,
+            "status": rng.choice(statuses), "author_id": 1,
+            "created_at": now - timedelta(hours=rng.uniform(1, 2000)),
+        }
+        if kind == "stale":
+            row.update(status=models.TaskStatus.IN_PROGRESS, volunteer_id=1,
+                       volunteer_start_timestamp=now - timedelta(hours=rng.uniform(30, 200)))
+        elif kind == "stuck":
+            row.update(predicted_class="Analysing", points=0, created_at=now - timedelta(minutes=rng.uniform(15, 600)))
+        elif row["status"] == models.TaskStatus.OPEN and rng.random() < 0.1:   # fresh tasks the sweep must leave alone
+            row.update(status=models.TaskStatus.IN_PROGRESS, volunteer_id=1,
+                       volunteer_start_timestamp=now - timedelta(minutes=rng.uniform(1, 600)))
+        batch.append(row)
+        if len(batch) == 20000:
+            await db.execute(models.Post.__table__.insert(), batch)
+            batch = []
+    if batch:
+        await db.execute(models.Post.__table__.insert(), batch)
+    await db.commit()
+
+
+async def explain(db, query):
+    from sqlalchemy import text
+    sql = str(query.compile(db.bind, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if db.bind.dialect.name == "sqlite" else "EXPLAIN "
+    return [" ".join(str(c) for c in row) for row in (await db.execute(text(prefix + sql))).all()]
+
+
+async def plans(db, models, sweeper):
+    from sqlalchemy import select
+    now = datetime.now(timezone.utc)
+    stale = (select(models.Post.id)
+             .where(models.Post.status == models.TaskStatus.IN_PROGRESS,
+                    models.Post.volunteer_start_timestamp < now - timedelta(hours=sweeper.STALE_TASK_HOURS))
+             .order_by(models.Post.volunteer_start_timestamp).limit(sweeper.SWEEP_BATCH_SIZE))
+    stuck = (select(models.Post.id)
+             .where(models.Post.predicted_class == "Analysing", models.Post.created_at < now)
+             .order_by(models.Post.created_at).limit(sweeper.SWEEP_BATCH_SIZE))
+    return {"release_stale_tasks": await explain(db, stale), "requeue_unclassified": await explain(db, stuck)}
+
+
+async def election(engine, n, seconds):
+    from scheduler import Scheduler
+    ran = Counter()
+    schedulers = []
+    for i in range(n):
+        s = Scheduler(engine)
+        async def job(i=i):
+            ran[i] += 1
+        s.every("count", 0.1, job)
+        schedulers.append(s.start())
+    await asyncio.sleep(seconds)
+    for s in schedulers:
+        await s.stop()
+    return {"schedulers": n, "runs_by_scheduler": dict(ran), "leaders": len(ran)}
+
+
+async def main_async(args):
+    import models, sweeper, migrations, scheduler
+    from database import engine, AsyncSessionLocal
+
+    await migrations.upgrade(engine)
+    rng = random.Random(args.seed)
+    async with AsyncSessionLocal() as db:
+        await db.execute(models.User.__table__.insert(), [{"username": "bench", "email": "bench@example.com", "hashed_password": "x", "points": 0}])
+        await seed(db, models, args, rng)
+        print(json.dumps({"plans": await plans(db, models, sweeper)}, indent=2))
+
+    async def classify(post_id, url):
+        await asyncio.sleep(args.classify_ms / 1000)
+
+    t0 = time.perf_counter()
+    released = await sweeper.release_stale_tasks()
+    release_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    requeued = await sweeper.requeue_unclassified(classify)
+    requeue_s = time.perf_counter() - t0
+    print(json.dumps({"posts": args.posts, "released": released, "release_s": round(release_s, 2),
+                      "requeued": requeued, "requeue_s": round(requeue_s, 2)}))
+
+    scheduler.SCHEDULER_TICK_SECONDS = scheduler.LEADER_RETRY_SECONDS = 0.1
+    print(json.dumps(await election(engine, args.schedulers, args.election_seconds)))
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=200_000)
+    parser.add_argument("--stale", type=int, default=1000)
+    parser.add_argument("--stuck", type=int, default=1000)
+    parser.add_argument("--classify-ms", type=float, default=5.0)
+    parser.add_argument("--schedulers", type=int, default=4)
+    parser.add_argument("--election-seconds", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+    os.environ.setdefault("SECRET_KEY", "bench")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# bench/trace_tree.py
+''' prints traces from TRACE_EXPORTER=file output as indented trees, slowest traces first.
+
+    pass the backend's and the classifier's files together, spans are joined by trace_id / parent_id
+    so one post creation shows the request, its db statements, the background job, the classifier
+    call and the classifier's download / preprocess / model.predict stages in one tree.
+        python bench/trace_tree.py backend/traces.jsonl trash_classifier/traces.jsonl --top 5
+'''
+
+import argparse
+import json
+from collections import defaultdict
+
+
+def load(paths):
+    traces = defaultdict(list)
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    span = json.loads(line)
+                    traces[span["trace_id"]].append(span)
+    return traces
+
+
+def print_tree(spans, collapse_db):
+    children = defaultdict(list)
+    ids = {s["span_id"] for s in spans}
+    for s in spans:
+        children[s["parent_id"] if s["parent_id"] in ids else None].append(s)
+
+    def walk(span, depth, t0):
+        kids = sorted(children[span["span_id"]], key=lambda s: s["start"])
+        offset = (span["start"] - t0) * 1000
+        flag = "" if span["status"] == "ok" else "  !" + span["attributes"].get("error", "error")
+        print(f"{'  ' * depth}{span['name']:<{50 - 2 * depth}} {span['duration_ms']:>9.1f}ms  +{offset:.1f}ms  [{span['service']}]{flag}")
+        if collapse_db:
+            db = [k for k in kids if k["name"] == "db"]
+            if db:
+                print(f"{'  ' * (depth + 1)}{len(db)} db statements{'':<{36 - 2 * depth}}{sum(k['duration_ms'] for k in db):>9.1f}ms")
+            kids = [k for k in kids if k["name"] != "db"]
+        for kid in kids:
+            walk(kid, depth + 1, t0)
+
+    roots = sorted(children[None], key=lambda s: s["start"])
+    t0 = roots[0]["start"] if roots else 0
+    for root in roots:
+        walk(root, 0, t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--top", type=int, default=10, help="show the N slowest traces")
+    parser.add_argument("--name", default=None, help="only traces whose root span contains this, e.g. 'POST /posts/'")
+    parser.add_argument("--show-db", action="store_true", help="list every db span instead of a summary line")
+    args = parser.parse_args()
+
+    traces = load(args.files)
+    ranked = []
+    for trace_id, spans in traces.items():
+        roots = [s for s in spans if s["parent_id"] is None] or spans
+        if args.name and not any(args.name in s["name"] for s in roots):
+            continue
+        end = max(s["start"] + s["duration_ms"] / 1000 for s in spans)
+        ranked.append(((end - min(s["start"] for s in spans)) * 1000, trace_id, spans))
+    ranked.sort(reverse=True)
+
+    for total_ms, trace_id, spans in ranked[:args.top]:
+        print(f"\ntrace {trace_id}  {total_ms:.1f}ms end to end, {len(spans)} spans")
+        print_tree(spans, collapse_db=not args.show_db)
+
+
+if __name__ == "__main__":
+    main()
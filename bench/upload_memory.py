@@ -0,0 +1,99 @@
+# bench/upload_memory.py
+''' peak RSS of the upload pipeline under concurrent large uploads, old path vs bounded path.
+
+    before: await file.read() -> Image.open(BytesIO) -> thumbnail -> webp   (the old images.py)
+    after : image_utils.open_image(spooled file) -> prepare_image -> build_variants  (header check + draft decode)
+
+    each mode runs in its own process so the peaks don't mix:
+        python bench/upload_memory.py --concurrency 8 --width 8000 --height 6000
+'''
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+
+def peak_rss_mb() -> float:
+    #VmHWM is the real high water mark on linux, ru_maxrss is the fallback (KB on linux, bytes on mac)
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def make_jpeg(path: str, width: int, height: int):
+    import numpy as np
+    from PIL import Image
+    #noise compresses badly, so the file is as big as a real high res photo (or bigger)
+    pixels = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(path, format="JPEG", quality=90)
+
+
+def before(path: str):
+    from PIL import Image
+    with open(path, "rb") as f:
+        contents = f.read()
+    img = Image.open(io.BytesIO(contents))
+    img.thumbnail((1920, 1080))
+    out = io.BytesIO()
+    img.save(out, format="WEBP", quality=85)
+    return len(out.getvalue())
+
+
+def after(path: str):
+    from image_utils import open_image, prepare_image, build_variants
+    with open(path, "rb") as f:
+        variants = build_variants(prepare_image(open_image(f)))
+    return sum(len(v) for v in variants.values())
+
+
+def run_mode(mode: str, path: str, concurrency: int, rounds: int):
+    baseline = peak_rss_mb()
+    fn = before if mode == "before" else after
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fn, [path] * concurrency * rounds))
+    print(json.dumps({"mode": mode, "baseline_mb": round(baseline, 1), "peak_rss_mb": round(peak_rss_mb(), 1)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["before", "after"])
+    parser.add_argument("--image")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--width", type=int, default=8000)
+    parser.add_argument("--height", type=int, default=6000)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.image, args.concurrency, args.rounds)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "big.jpg")
+        make_jpeg(path, args.width, args.height)
+        print(f"image: {args.width}x{args.height}, {os.path.getsize(path) / 1024 / 1024:.1f} MB, concurrency {args.concurrency}")
+        for mode in ("before", "after"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--image", path,
+                 "--concurrency", str(args.concurrency), "--rounds", str(args.rounds)],
+                capture_output=True, text=True, check=True
+            )
+            print(out.stdout.strip())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# bench/vector_search.py
+''' query latency and memory of the embedding store at 100k and 1M vectors.
+
+    vectors are random clustered float16 (dim 1280 = MobileNetV2 pooled features),
+    reports exact brute force vs IVF latency, IVF recall@k against exact, file size and RSS.
+        python bench/vector_search.py --sizes 100000 1000000 --dim 1280
+'''
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "trash_classifier"))
+from vector_store import VectorStore  # noqa: E402
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(samples_ms):
+    arr = np.array(samples_ms)
+    return {"p50_ms": round(float(np.percentile(arr, 50)), 3), "p95_ms": round(float(np.percentile(arr, 95)), 3)}
+
+
+def fill(store: VectorStore, n: int, dim: int, rng, batch: int = 50000):
+    #clustered data so the IVF buckets mean something, like real photos of similar trash
+    centers = rng.standard_normal((512, dim)).astype(np.float32)
+    for start in range(0, n, batch):
+        size = min(batch, n - start)
+        vectors = centers[rng.integers(0, len(centers), size)] + 0.3 * rng.standard_normal((size, dim)).astype(np.float32)
+        store.add_batch(np.arange(start, start + size), vectors)
+    store.flush()
+
+
+def run(n: int, dim: int, queries: int, k: int, nlist: int, nprobe: int):
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(tmp, dim, initial_capacity=n)
+        t0 = time.perf_counter()
+        fill(store, n, dim, rng)
+        fill_s = time.perf_counter() - t0
+
+        query_ids = rng.integers(0, n, queries)
+        exact_ms, exact_results = [], []
+        for qid in query_ids:
+            q = store.get(qid)
+            t0 = time.perf_counter()
+            exact_results.append({i for i, _ in store.search(q, k)})
+            exact_ms.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        store.build_ivf(nlist=nlist, nprobe=nprobe)
+        ivf_build_s = time.perf_counter() - t0
+
+        ivf_ms, recall = [], []
+        for qid, truth in zip(query_ids, exact_results):
+            q = store.get(qid)
+            t0 = time.perf_counter()
+            found = {i for i, _ in store.search_approx(q, k)}
+            ivf_ms.append((time.perf_counter() - t0) * 1000)
+            recall.append(len(found & truth) / max(1, len(truth)))
+
+        return {
+            "vectors": n,
+            "dim": dim,
+            "file_mb": round(os.path.getsize(store.vectors_path) / 1024 / 1024, 1),
+            "rss_mb": round(rss_mb(), 1),
+            "fill_s": round(fill_s, 2),
+            "exact": percentiles(exact_ms),
+            "ivf": {**percentiles(ivf_ms), "build_s": round(ivf_build_s, 2), "nlist": nlist,
+                    "nprobe": nprobe, f"recall@{k}": round(float(np.mean(recall)), 3)},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=1280)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, default=16)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        print(json.dumps(run(n, args.dim, args.queries, args.k, args.nlist, args.nprobe)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,33 @@
 import os
+import sys
+import asyncio
+import warnings
 from io import BytesIO
 import uvicorn
 import numpy as np
-import tensorflow as tf
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from PIL import Image
 from pydantic import BaseModel
+from typing import Optional
 import httpx
-app = FastAPI(title="Waste Classifier API")
+from vector_store import VectorStore
+import metrics
+try:
+    import tracing   # backend/tracing.py, copied in by the Dockerfile
+except ImportError:   # run from the repo, the one copy lives in backend/ (appended, our own modules win)
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+    import tracing
+tracing.SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "classifier")
+import profiling
+import serving
+import verification
 
 # load model 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, "waste_classifier_model.h5")
-
-# model = load_model(MODEL_PATH)
-model = tf.keras.models.load_model(MODEL_PATH)
 CLASS_NAMES = ['cardboard', 'glass', 'metal', 'paper', 'plastic', 'trash']
 DUSTBIN_MAP = {
     'cardboard': ' Blue Dustbin (Dry Waste / Recyclable)',
@@ -36,40 +48,225 @@ POINTS_DIC = {
 }
 class PredictRequest(BaseModel):
     image_url: str
+    post_id: Optional[int] = None   # when set, the embedding is stored for "similar reports"
+
+class VerifyRequest(BaseModel):
+    original_url: str               # the report, same url the post was classified with
+    start_url: Optional[str] = None # the volunteer's "before" photo
+    end_url: str                    # the "after" photo
+    post_id: Optional[int] = None   # only for the logs / traces
+
+class SimilarRequest(BaseModel):
+    post_id: Optional[int] = None   # an already stored report...
+    image_url: Optional[str] = None # ...or a new image
+    k: int = 10
+    exact: bool = False             # brute force even when the IVF index is on
+
+# --- EMBEDDINGS ---
+# the penultimate layer comes out of the SAME forward pass as the softmax, no second inference
+EMBEDDING_LAYER = int(os.getenv("EMBEDDING_LAYER", "-2"))
+
+# --- SERVING MODE ---
+# 0: the model runs in this process. N: N inference processes fed through shared memory (see serving.py),
+# this process then only does HTTP, download and preprocessing and never imports tensorflow
+# either way the model is loaded by the lifespan, once per uvicorn worker (see serve.py)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+pool = None
+dual_model = None
+EMBEDDING_DIM = None    # known once the model is loaded
+
+# image downloads share one client per worker, opened by the lifespan
+http_client: httpx.AsyncClient = None
+
+# softmax scores by image url, so /verify_cleanup doesn't run images it has already seen again
+predictions = verification.PredictionCache()
+
+# the store's rows and count live in this process' memory, so only one process may write to it:
+# with it on serve.py runs a single worker (scale inference with INFERENCE_WORKERS), off -> /similar answers 503
+VECTOR_STORE_ENABLED = os.getenv("VECTOR_STORE_ENABLED", "True") == "True"
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", os.path.join(BASE_DIR, "embeddings"))
+# predictions only add to the mapped pages, the msync + meta.json write happens at most this often, in a thread
+VECTOR_FLUSH_SECONDS = float(os.getenv("VECTOR_FLUSH_SECONDS", "5"))
+vector_store = None
+
+def open_vector_store(dim: int) -> VectorStore:
+    store = VectorStore(VECTOR_STORE_DIR, dim)
+    # approximate search, only worth it once there are a lot of vectors
+    if os.getenv("USE_IVF_INDEX") == "True" and len(store) >= int(os.getenv("IVF_MIN_VECTORS", "10000")):
+        store.build_ivf(
+            nlist=int(os.getenv("IVF_NLIST", "256")),
+            nprobe=int(os.getenv("IVF_NPROBE", "8"))
+        )
+    return store
+
+async def flush_vectors_periodically():
+    while True:
+        await asyncio.sleep(VECTOR_FLUSH_SECONDS)
+        if vector_store.dirty:
+            try:
+                await run_in_threadpool(vector_store.flush)
+            except Exception as e:
+                print(f"vector store flush failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global pool, dual_model, vector_store, EMBEDDING_DIM, http_client
+    if INFERENCE_WORKERS > 0:
+        pool = serving.InferencePool(
+            MODEL_PATH, INFERENCE_WORKERS, embedding_layer=EMBEDDING_LAYER,
+            threads=int(os.getenv("INFERENCE_THREADS", "0")) or None
+        ).start()
+        EMBEDDING_DIM = pool.embedding_dim
+    else:
+        dual_model = serving.load_dual_model(MODEL_PATH, EMBEDDING_LAYER)
+        EMBEDDING_DIM = int(np.prod(dual_model.outputs[0].shape[1:]))
+    flusher = None
+    if VECTOR_STORE_ENABLED:
+        vector_store = open_vector_store(EMBEDDING_DIM)
+        flusher = asyncio.create_task(flush_vectors_periodically())
+    http_client = httpx.AsyncClient(timeout=30.0)
+    yield
+    #in-flight predictions have finished by now, uvicorn drains them before the lifespan shutdown
+    if flusher is not None:
+        flusher.cancel()
+        await asyncio.gather(flusher, return_exceptions=True)
+    await http_client.aclose()
+    if pool is not None:
+        await pool.close()
+    if vector_store is not None:
+        await run_in_threadpool(vector_store.flush)
+    metrics.mark_process_dead()
 
-#prepares the image for model prediction
-def preprocess_image(image_bytes: bytes) -> np.ndarray:
-    
-    img = Image.open(BytesIO(image_bytes)).convert('RGB')
-    img = img.resize((224, 224))
-    img_array = tf.keras.preprocessing.image.img_to_array(img)
-    img_array = np.expand_dims(img_array, axis=0)
-    preprocessed_img = tf.keras.applications.mobilenet_v2.preprocess_input(img_array)
+app = FastAPI(title="Waste Classifier API", lifespan=lifespan)
+
+# --- LIMITS ---
+# nothing is buffered past these caps and the image header is checked before the full decode
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(15 * 1024 * 1024)))    # 15 MB
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "50000000"))              # 50 MP
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+# PIL raises DecompressionBombError past 2x this and warns past 1x (turned into an error below)
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+def looks_like_image(head: bytes) -> bool:
+    return (
+        head.startswith((b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a"))
+        or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")
+    )
+
+#reads only the header, the pixels are decoded later
+def open_image(fp) -> Image.Image:
+    head = fp.read(16)
+    fp.seek(0)
+    if not looks_like_image(head):
+        raise HTTPException(status_code=400, detail="File provided is not an image")
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            img = Image.open(fp)
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise HTTPException(status_code=413, detail="Image dimensions are too large")
+    except Exception:
+        raise HTTPException(status_code=400, detail="File provided is not an image")
+    if img.size[0] * img.size[1] > MAX_IMAGE_PIXELS:
+        raise HTTPException(status_code=413, detail="Image dimensions are too large")
+    return img
+
+#downloads in chunks, gives up as soon as the body is too big or isn't an image
+async def download_image(url: str) -> BytesIO:
+    with profiling.stage("download"):
+        return await _download(url)
+
+async def _download(url: str) -> BytesIO:
+    buf = BytesIO()
+    async with http_client.stream("GET", url) as resp:
+        if resp.status_code != 200:
+            raise HTTPException(status_code=400, detail="Could not download image from URL")
+        length = resp.headers.get("content-length")
+        if length and length.isdigit() and int(length) > MAX_IMAGE_BYTES:
+            raise HTTPException(status_code=413, detail="Image is too large")
+
+        checked = False
+        async for chunk in resp.aiter_bytes(DOWNLOAD_CHUNK_BYTES):
+            buf.write(chunk)
+            if buf.tell() > MAX_IMAGE_BYTES:
+                raise HTTPException(status_code=413, detail="Image is too large")
+            if not checked and buf.tell() >= 16:
+                if not looks_like_image(buf.getvalue()[:16]):
+                    raise HTTPException(status_code=400, detail="URL does not point to an image")
+                checked = True
+    metrics.IMAGE_BYTES.observe(buf.tell())
+    buf.seek(0)
+    return buf
+
+#prepares the image for model prediction, fp is a file like object (spooled upload or BytesIO)
+def preprocess_image(fp) -> np.ndarray:
+    with profiling.stage("decode"):
+        img = open_image(fp)
+        img.draft('RGB', (224, 224))    # jpeg decodes at a reduced scale, big photos never hit memory at full size
+        img = img.convert('RGB')
+    with profiling.stage("resize"):
+        if img.size != (224, 224):  # backend already sends a 224x224 variant for new posts
+            img = img.resize((224, 224))
+    with profiling.stage("preprocess_input"):
+        img_array = np.asarray(img, dtype=np.float32)
+        img_array = np.expand_dims(img_array, axis=0)
+        preprocessed_img = img_array / 127.5 - 1.0     # mobilenet_v2.preprocess_input, scales to [-1, 1]
     return preprocessed_img
 
+#(features, scores), on the worker pool when there is one
+async def infer(processed_image: np.ndarray):
+    if pool is not None:
+        return await pool.predict(processed_image)  # batch size / inference time are recorded by the pool
+    metrics.BATCH_SIZE.observe(processed_image.shape[0])
+    with metrics.INFERENCE_SECONDS.time():
+        return dual_model.predict(processed_image, verbose=0)
+
+def softmax(x: np.ndarray) -> np.ndarray:
+    e = np.exp(x - np.max(x))
+    return e / e.sum()
+
+#softmax scores -> the prediction response
+def describe(score: np.ndarray) -> dict:
+    predicted_class = CLASS_NAMES[np.argmax(score)]
+    points_awarded = POINTS_DIC.get(predicted_class, 0)
+    confidence = float(np.max(score))
+    return {
+        'predicted_class': predicted_class,
+        'confidence': f"{confidence:.2%}",
+        'recommended_dustbin': DUSTBIN_MAP.get(predicted_class),
+        'points':points_awarded
+    }
+
+#one forward pass -> (prediction response, embedding). cache_key (the image url) keeps the scores for /verify_cleanup
+async def classify(processed_image: np.ndarray, cache_key: str = None):
+    with profiling.stage("predict"):
+        features, prediction = await infer(processed_image)
+    with profiling.stage("postprocess"):
+        score = softmax(prediction[0])
+        predictions.put(cache_key, score)
+        result = describe(score)
+    return result, features[0].reshape(-1)
+
+def store_embedding(post_id, embedding: np.ndarray):
+    if post_id is not None and vector_store is not None:
+        with profiling.stage("store_embedding"):
+            vector_store.add(post_id, embedding)   # written out by flush_vectors_periodically
+
 #prediction Endpoint using image file 
 @app.post("/predict_with_file")
 async def predict(file: UploadFile = File(...)):
     """Predicts the class of uploaded waste image."""
     if not file.filename:
         raise HTTPException(status_code=400, detail="No image file provided")
+    if file.size is not None and file.size > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Image is too large")
 
     try:
-        image_bytes = await file.read()
-        processed_image = preprocess_image(image_bytes)
-
-        prediction = model.predict(processed_image)
-        score = tf.nn.softmax(prediction[0])
-        predicted_class = CLASS_NAMES[np.argmax(score)]
-        points_awarded = POINTS_DIC.get(predicted_class, 0)
-        confidence = float(np.max(score))
-
-        return JSONResponse(content={
-            'predicted_class': predicted_class,
-            'confidence': f"{confidence:.2%}",
-            'recommended_dustbin': DUSTBIN_MAP.get(predicted_class),
-            'points':points_awarded
-        })
+        processed_image = preprocess_image(file.file)
+        result, _ = await classify(processed_image)
+        return JSONResponse(content=result)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -81,34 +278,126 @@ def root():
 @app.post("/predict_with_urls")
 async def prediction(req: PredictRequest):
     try:
-        #downloads the image bytes from the URL asynchronously
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(req.image_url)
-            
-            if resp.status_code != 200:
-                raise HTTPException(status_code=400, detail="Could not download image from URL")
-            
-            image_bytes = resp.content
-
-        processed_image = preprocess_image(image_bytes)
-
-        prediction = model.predict(processed_image)
-        score = tf.nn.softmax(prediction[0])
-        predicted_class = CLASS_NAMES[np.argmax(score)]
-
-        points_awarded = POINTS_DIC.get(predicted_class, 0)
-        confidence = float(np.max(score))
-
-        return JSONResponse(content={
-            'predicted_class': predicted_class,
-            'confidence': f"{confidence:.2%}",
-            'recommended_dustbin': DUSTBIN_MAP.get(predicted_class),
-            'points':points_awarded
-        })
+        #downloads the image bytes from the URL asynchronously, bounded by MAX_IMAGE_BYTES
+        image_io = await download_image(req.image_url)
+        processed_image = preprocess_image(image_io)
+        result, embedding = await classify(processed_image, cache_key=req.image_url)
+        store_embedding(req.post_id, embedding)
+        return JSONResponse(content=result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# same as /predict_with_urls but also returns the embedding
+@app.post("/embed_with_urls")
+async def embed(req: PredictRequest):
+    try:
+        image_io = await download_image(req.image_url)
+        result, embedding = await classify(preprocess_image(image_io), cache_key=req.image_url)
+        store_embedding(req.post_id, embedding)
+        result["embedding"] = embedding.astype(float).round(5).tolist()
+        return JSONResponse(content=result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# paired before / after check at proof submission (see verification.py)
+@app.post("/verify_cleanup")
+async def verify_cleanup(req: VerifyRequest):
+    urls = {"original": req.original_url, "start": req.start_url, "end": req.end_url}
+    urls = {role: url for role, url in urls.items() if url}
+    scores = {role: predictions.get(url) for role, url in urls.items()}
+    missing = [role for role, score in scores.items() if score is None]
+    try:
+        if missing:
+            images = await asyncio.gather(*(download_image(urls[role]) for role in missing))
+            batch = np.concatenate([preprocess_image(image_io) for image_io in images])
+            with profiling.stage("predict"):
+                _, prediction = await infer(batch)     # every image not seen before in one forward pass
+            for role, row in zip(missing, prediction):
+                scores[role] = softmax(row)
+                predictions.put(urls[role], scores[role])
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    before = "start" if "start" in scores else "original"
+    return {
+        "images": {role: {**describe(score), "cached": role not in missing} for role, score in scores.items()},
+        "before": before,
+        "cleanliness_delta": round(verification.cleanliness_delta(scores[before], scores["end"]), 4),
+        "inferred": len(missing),
+    }
+
+# "similar reports": nearest stored embeddings by cosine similarity
+@app.post("/similar")
+async def similar(req: SimilarRequest):
+    if vector_store is None:
+        raise HTTPException(status_code=503, detail="Vector store is disabled")
+    if req.post_id is not None:
+        query = vector_store.get(req.post_id)
+        if query is None:
+            raise HTTPException(status_code=404, detail="No embedding stored for this post")
+    elif req.image_url:
+        _, query = await classify(preprocess_image(await download_image(req.image_url)))
+    else:
+        raise HTTPException(status_code=400, detail="Give a post_id or an image_url")
+
+    k = max(1, min(req.k, 100))
+    search = vector_store.search if req.exact else vector_store.search_approx
+    results = search(query, k=k, exclude_id=req.post_id)
+    return {"results": [{"post_id": post_id, "score": round(score, 4)} for post_id, score in results]}
+
+@app.get("/vectors/stats")
+def vector_stats():
+    if vector_store is None:
+        raise HTTPException(status_code=503, detail="Vector store is disabled")
+    return {
+        "count": len(vector_store),
+        "dim": EMBEDDING_DIM,
+        "ivf": vector_store.ivf is not None,
+    }
+
+
+# --- REQUEST BODY CAP ---
+# rejects oversized uploads straight from the content-length header, before anything is read
+@app.middleware("http")
+async def limit_body_size(request: Request, call_next):
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > MAX_IMAGE_BYTES + 64 * 1024:
+        return JSONResponse(status_code=413, content={"detail": "Request body too large"})
+    return await call_next(request)
+
+# per stage timings -> Server-Timing header, /stats/stages, optional sampling profiles (see profiling.py)
+app.add_middleware(profiling.StageTimingMiddleware)
+# continues the backend's trace from the traceparent header
+app.add_middleware(tracing.TracingMiddleware)
+# added after the body cap so it is outermost and counts the 413s as well
+app.add_middleware(metrics.MetricsMiddleware)
+
+#rolling per stage latency of recent successful predictions
+@app.get("/stats/stages")
+def stage_stats():
+    return profiling.stage_stats()
+
+#recent traces, only with TRACE_EXPORTER=memory (local debugging)
+@app.get("/debug/traces", include_in_schema=False)
+def recent_traces(limit: int = 20):
+    if not isinstance(tracing.exporter, tracing.MemoryExporter):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return tracing.exporter.traces(limit)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    if vector_store is not None:
+        metrics.VECTORS.set(len(vector_store))
+    return metrics.metrics_response()
+
 
+#dev server with the reloader, production runs serve.py
 if __name__ == "__main__":
     print("http://127.0.0.1:6969") #this should produce a link fir microservice
     uvicorn.run("main:app", host="0.0.0.0", port=6969, reload=True)
@@ -0,0 +1,73 @@
+# trash_classifier/metrics.py
+
+''' prometheus metrics for the classifier, scraped from GET /metrics.
+    same http metrics as the backend (its own copy, the classifier image only ships this folder)
+    plus model side numbers: inference time, batch size and downloaded image size.
+    with several workers serve.py sets PROMETHEUS_MULTIPROC_DIR and /metrics adds up every worker's samples.
+'''
+
+import os
+import time
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest
+from prometheus_client import multiprocess
+from starlette.responses import Response
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route"], buckets=BUCKETS)
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served", ["method"], multiprocess_mode="livesum")
+
+INFERENCE_SECONDS = Histogram("classifier_inference_seconds", "one forward pass of the model", buckets=BUCKETS)
+BATCH_SIZE = Histogram("classifier_batch_size", "images per forward pass", buckets=(1, 2, 4, 8, 16, 32, 64))
+IMAGE_BYTES = Histogram("classifier_image_bytes", "downloaded image size",
+                        buckets=(16e3, 64e3, 256e3, 1e6, 4e6, 16e6))
+STAGE_SECONDS = Histogram("classifier_stage_seconds", "time per prediction stage", ["stage"], buckets=BUCKETS)
+VECTORS = Gauge("classifier_vectors_stored", "embeddings in the vector store", multiprocess_mode="livemax")
+PREDICTION_CACHE = Counter("classifier_prediction_cache_total", "cached softmax lookups by image url", ["result"])
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+
+class MetricsMiddleware:
+    '''pure ASGI, routes are labelled with their template so the number of series stays fixed'''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        in_flight = IN_FLIGHT.labels(method)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            LATENCY.labels(method, route).observe(elapsed)
+            REQUESTS.labels(method, route, str(status[0])).inc()
+
+
+#lifespan shutdown, drops this worker's live gauges from the sums
+def mark_process_dead():
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+def metrics_response() -> Response:
+    if not MULTIPROC_DIR:
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,182 @@
+# trash_classifier/profiling.py
+
+''' where does a prediction spend its time?
+
+    stage("decode") times a block and files it under the current request's StageTimer (a contextvar set by
+    StageTimingMiddleware), so the helpers deep in main.py don't need a timer passed around. each stage is also
+    a tracing span and a prometheus histogram. per request the stages go back in a Server-Timing header
+    (browser devtools / curl -v show them) and successful requests feed rolling windows for GET /stats/stages.
+
+    opt-in sampling profiler: every PROFILE_EVERY_N-th request (0 = off), or any request carrying
+    "X-Profile: 1" when PROFILE_ON_HEADER=True, is sampled every PROFILE_INTERVAL_MS and its stacks are
+    written to PROFILE_DIR as folded stacks ("a;b;c 12" lines), the input format of flamegraph.pl / speedscope.
+    it samples the event loop thread, so requests running concurrently show up in the same profile.
+'''
+
+import os
+import sys
+import time
+import threading
+import itertools
+from collections import deque, Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import metrics
+import tracing
+
+STAGE_WINDOW = int(os.getenv("STAGE_WINDOW", "1000"))     # recent requests kept per stage
+PROFILE_EVERY_N = int(os.getenv("PROFILE_EVERY_N", "0"))
+PROFILE_ON_HEADER = os.getenv("PROFILE_ON_HEADER") == "True"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+
+# the order stages are reported in
+STAGES = ("download", "decode", "resize", "preprocess_input", "predict", "postprocess", "store_embedding")
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+        self.start = time.perf_counter()
+
+    def add(self, name: str, ms: float):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def header(self) -> str:
+        parts = [f"{name};dur={ms:.2f}" for name, ms in self.stages.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.2f}")
+        return ", ".join(parts)
+
+
+current_timer: ContextVar = ContextVar("stage_timer", default=None)
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        with tracing.span(f"classifier.{name}"):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.STAGE_SECONDS.labels(name).observe(elapsed)
+        timer = current_timer.get()
+        if timer is not None:
+            timer.add(name, elapsed * 1000)
+
+
+# --- ROLLING STATS ---
+
+windows = {}
+_windows_lock = threading.Lock()
+
+def record(timer: StageTimer):
+    with _windows_lock:
+        for name, ms in timer.stages.items():
+            windows.setdefault(name, deque(maxlen=STAGE_WINDOW)).append(ms)
+        windows.setdefault("total", deque(maxlen=STAGE_WINDOW)).append((time.perf_counter() - timer.start) * 1000)
+
+def _percentile(samples, p):
+    return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))], 2)
+
+def stage_stats() -> dict:
+    with _windows_lock:
+        snapshot = {name: sorted(w) for name, w in windows.items()}
+    order = [s for s in STAGES if s in snapshot] + sorted(set(snapshot) - set(STAGES))
+    total_mean = sum(snapshot["total"]) / len(snapshot["total"]) if snapshot.get("total") else 0.0
+    stats = {}
+    for name in order:
+        samples = snapshot[name]
+        mean = sum(samples) / len(samples)
+        stats[name] = {
+            "count": len(samples),
+            "mean_ms": round(mean, 2),
+            "p50_ms": _percentile(samples, 50),
+            "p95_ms": _percentile(samples, 95),
+            "p99_ms": _percentile(samples, 99),
+            "max_ms": round(samples[-1], 2),
+            "share": round(mean / total_mean, 3) if total_mean and name != "total" else None,
+        }
+    return {"window": STAGE_WINDOW, "stages": stats}
+
+
+# --- SAMPLING PROFILER ---
+
+class SamplingProfiler:
+    '''samples one thread's python stack from a side thread, cheap enough to leave on for single requests'''
+
+    def __init__(self, thread_id: int, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self, label: str) -> str:
+        self.stopped.set()
+        self.thread.join()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{int(time.time() * 1000)}-{label}.folded")
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+_request_counter = itertools.count(1)
+
+def should_profile(headers: dict) -> bool:
+    if PROFILE_ON_HEADER and headers.get(b"x-profile") == b"1":
+        return True
+    return PROFILE_EVERY_N > 0 and next(_request_counter) % PROFILE_EVERY_N == 0
+
+
+class StageTimingMiddleware:
+    '''pure ASGI, only for the prediction routes: timer per request, Server-Timing header, optional profile'''
+
+    def __init__(self, app, paths=("/predict_with_urls", "/predict_with_file", "/embed_with_urls")):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        timer = StageTimer()
+        token = current_timer.set(timer)
+        profiler = SamplingProfiler(threading.get_ident()).start() if should_profile(dict(scope["headers"])) else None
+        label = scope["path"].strip("/")
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = list(message.get("headers", [])) + [(b"server-timing", timer.header().encode())]
+                if profiler is not None:   # the work is done once the response starts
+                    headers.append((b"x-profile-file", os.path.basename(profiler.stop(label)).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_timer.reset(token)
+            if profiler is not None and not profiler.stopped.is_set():
+                profiler.stop(label)
+            if status[0] == 200:
+                record(timer)
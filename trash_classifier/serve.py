@@ -0,0 +1,95 @@
+# trash_classifier/serve.py
+
+''' production entry point:  python serve.py   (main.py's __main__ is the dev server with the reloader)
+
+    every uvicorn worker loads its own copy of the model in the lifespan, so the default worker count
+    is sized by cores per model copy rather than one per core:
+        INFERENCE_WORKERS=0   cores // THREADS_PER_MODEL workers, each model limited to that many TF threads
+        INFERENCE_WORKERS=N   1 worker, the N inference processes (serving.py) already spread the model
+    WEB_CONCURRENCY overrides either, except that the vector store has a single writer: while it is on
+    (VECTOR_STORE_ENABLED, the default) there is always exactly one worker, scale with INFERENCE_WORKERS. uvloop and httptools are used when installed.
+    SIGTERM drains: in-flight predictions finish (up to GRACEFUL_TIMEOUT seconds), then the lifespan
+    stops the inference pool and flushes the vector store.
+'''
+
+import os
+import tempfile
+import importlib.util
+import uvicorn
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8080"))
+THREADS_PER_MODEL = int(os.getenv("THREADS_PER_MODEL", "4"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+
+#cores this container may actually use, os.cpu_count() reports the whole host
+def available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+def worker_count() -> int:
+    configured = int(os.getenv("WEB_CONCURRENCY", "0"))
+    if os.getenv("VECTOR_STORE_ENABLED", "True") == "True":
+        if configured > 1:
+            print(f"WEB_CONCURRENCY={configured} ignored, the vector store needs a single worker (use INFERENCE_WORKERS)")
+        return 1
+    if configured > 0:
+        return configured
+    if int(os.getenv("INFERENCE_WORKERS", "0")) > 0:
+        return 1
+    return max(1, available_cpus() // THREADS_PER_MODEL)
+
+#several workers share their prometheus samples through files in one directory (see metrics.py),
+#it has to be empty when they start or it carries the last run's counters
+def prepare_metrics_dir(workers: int):
+    if workers <= 1:
+        os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+        return
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="prometheus-")
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith(".db"):
+            os.remove(os.path.join(path, name))
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path   # inherited by the worker processes
+
+def installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+if __name__ == "__main__":
+    workers = worker_count()
+    prepare_metrics_dir(workers)
+    if int(os.getenv("INFERENCE_WORKERS", "0")) == 0:
+        #the workers are spawned after this and inherit the env, so N model copies don't fight over every core
+        threads = str(max(1, available_cpus() // workers))
+        os.environ.setdefault("OMP_NUM_THREADS", threads)
+        os.environ.setdefault("TF_NUM_INTRAOP_THREADS", threads)
+        os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+    loop = "uvloop" if installed("uvloop") else "asyncio"
+    http = "httptools" if installed("httptools") else "h11"
+    print(f"Serving on {HOST}:{PORT} with {workers} workers ({loop}, {http})")
+    uvicorn.run(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+        #only changes the client address in the access log: X-Forwarded-For is believed from these
+        #addresses, set it to whatever proxies the backend's calls (the backend itself calls direct)
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        access_log=os.getenv("ACCESS_LOG") == "True",
+    )
@@ -0,0 +1,242 @@
+# trash_classifier/serving.py
+
+''' multi process inference.
+
+    with INFERENCE_WORKERS=N the HTTP process only downloads, decodes and preprocesses; N worker processes
+    each hold their own copy of the model. every worker owns two shared memory blocks, one for the input
+    batch (MAX_BATCH x 224 x 224 x 3 float32) and one for the outputs (embeddings + class scores), so a
+    tensor is written once by the front end and read in place by the worker: the pipe between them only
+    carries ("run", n) / ("ok", n), never pixels.
+
+    requests that arrive together are micro-batched: a worker's dispatcher takes the first waiting image
+    and keeps collecting for up to BATCH_WAIT_MS or until MAX_BATCH. each worker gets INFERENCE_THREADS
+    TF threads (default: cores / workers) so N workers don't fight over the same cores.
+'''
+
+import os
+import asyncio
+import logging
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+INPUT_SHAPE = (224, 224, 3)
+MAX_BATCH = int(os.getenv("MAX_BATCH", "16"))
+BATCH_WAIT_MS = float(os.getenv("BATCH_WAIT_MS", "2"))
+
+
+#softmax model + the penultimate layer as a second output, used in-process by main.py and by every worker
+def load_dual_model(model_path: str, embedding_layer: int):
+    import tensorflow as tf
+    model = tf.keras.models.load_model(model_path)
+    return tf.keras.Model(inputs=model.inputs, outputs=[model.layers[embedding_layer].output, model.output])
+
+
+def _untrack(shm):
+    #the attaching side must not let the resource tracker unlink a block it doesn't own (fixed in 3.13 with track=False)
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+def _worker_main(model_path, embedding_layer, threads, conn):
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    dual = load_dual_model(model_path, embedding_layer)
+    emb_dim = int(np.prod(dual.outputs[0].shape[1:]))
+    n_out = int(np.prod(dual.outputs[1].shape[1:]))
+    conn.send(("ready", emb_dim, n_out))
+
+    _, in_name, out_name, max_batch = conn.recv()
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    _untrack(in_shm)
+    _untrack(out_shm)
+    inputs = np.ndarray((max_batch, *INPUT_SHAPE), dtype=np.float32, buffer=in_shm.buf)
+    features = np.ndarray((max_batch, emb_dim), dtype=np.float32, buffer=out_shm.buf)
+    scores = np.ndarray((max_batch, n_out), dtype=np.float32, offset=max_batch * emb_dim * 4, buffer=out_shm.buf)
+
+    try:
+        while True:
+            msg = conn.recv()
+            if msg[0] == "stop":
+                break
+            n = msg[1]
+            try:
+                f, s = dual.predict_on_batch(inputs[:n])
+                features[:n] = np.asarray(f).reshape(n, -1)
+                scores[:n] = np.asarray(s).reshape(n, -1)
+                conn.send(("ok", n))
+            except Exception as e:
+                conn.send(("error", repr(e)))
+    finally:
+        del inputs, features, scores
+        in_shm.close()
+        out_shm.close()
+
+
+class _Job:
+    __slots__ = ("batch", "future")
+
+    def __init__(self, batch, future):
+        self.batch, self.future = batch, future
+
+
+class Worker:
+    def __init__(self, index, ctx, model_path, embedding_layer, threads, max_batch):
+        self.index = index
+        self.max_batch = max_batch
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(model_path, embedding_layer, threads, child),
+            name=f"inference-{index}", daemon=True,
+        )
+        self.process.start()
+        child.close()
+
+    #waits for the model to load, then hands the worker its shared memory
+    def attach(self):
+        max_batch = self.max_batch
+        _, self.emb_dim, self.n_out = self.conn.recv()
+        self.in_shm = shared_memory.SharedMemory(create=True, size=max_batch * int(np.prod(INPUT_SHAPE)) * 4)
+        self.out_shm = shared_memory.SharedMemory(create=True, size=max_batch * (self.emb_dim + self.n_out) * 4)
+        self.inputs = np.ndarray((max_batch, *INPUT_SHAPE), dtype=np.float32, buffer=self.in_shm.buf)
+        self.features = np.ndarray((max_batch, self.emb_dim), dtype=np.float32, buffer=self.out_shm.buf)
+        self.scores = np.ndarray((max_batch, self.n_out), dtype=np.float32,
+                                 offset=max_batch * self.emb_dim * 4, buffer=self.out_shm.buf)
+        self.conn.send(("attach", self.in_shm.name, self.out_shm.name, max_batch))
+        return self
+
+    #blocking round trip, runs in a thread so the event loop keeps serving
+    def run(self, n):
+        self.conn.send(("run", n))
+        reply = self.conn.recv()
+        if reply[0] != "ok":
+            raise RuntimeError(f"inference worker {self.index} failed: {reply[1]}")
+
+    def close(self):
+        try:
+            self.conn.send(("stop",))
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.terminate()
+        del self.inputs, self.features, self.scores
+        for shm in (self.in_shm, self.out_shm):
+            shm.close()
+            shm.unlink()
+
+
+class InferencePool:
+    def __init__(self, model_path: str, workers: int, embedding_layer: int = -2,
+                 threads: int = None, max_batch: int = MAX_BATCH, batch_wait_ms: float = BATCH_WAIT_MS):
+        self.model_path, self.embedding_layer = model_path, embedding_layer
+        self.size = workers
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait_ms / 1000
+        self.ctx = mp.get_context("spawn")    # never fork a process that has TF loaded
+        self.workers = []
+        self.queue = None
+        self.dispatchers = []
+
+    def _spawn(self, index) -> Worker:
+        return Worker(index, self.ctx, self.model_path, self.embedding_layer, self.threads, self.max_batch)
+
+    @property
+    def embedding_dim(self) -> int:
+        return self.workers[0].emb_dim
+
+    def start(self):
+        #all processes start first so the models load in parallel
+        self.workers = [self._spawn(i) for i in range(self.size)]
+        for w in self.workers:
+            w.attach()
+        self.queue = asyncio.Queue()
+        self.dispatchers = [asyncio.create_task(self._dispatch(w)) for w in self.workers]
+        logger.info(f"Inference pool: {self.size} workers x {self.threads} threads, max batch {self.max_batch}")
+        return self
+
+    async def close(self):
+        for task in self.dispatchers:
+            task.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        for w in self.workers:
+            w.close()
+
+    #(features, scores) for a preprocessed (n, 224, 224, 3) batch, same as dual_model.predict
+    async def predict(self, batch: np.ndarray):
+        if batch.shape[0] > self.max_batch:
+            parts = [await self.predict(batch[i:i + self.max_batch]) for i in range(0, batch.shape[0], self.max_batch)]
+            return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(_Job(batch, future))
+        return await future
+
+    async def _collect(self, first):
+        jobs, n = [first], first.batch.shape[0]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_wait
+        carry = None
+        while n < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                job = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if n + job.batch.shape[0] > self.max_batch:
+                carry = job
+                break
+            jobs.append(job)
+            n += job.batch.shape[0]
+        return jobs, n, carry
+
+    async def _dispatch(self, worker: Worker):
+        loop = asyncio.get_running_loop()
+        carry = None
+        while True:
+            first = carry or await self.queue.get()
+            jobs, n, carry = await self._collect(first)
+
+            offset = 0
+            for job in jobs:
+                k = job.batch.shape[0]
+                worker.inputs[offset:offset + k] = job.batch
+                offset += k
+
+            metrics.BATCH_SIZE.observe(n)
+            try:
+                with metrics.INFERENCE_SECONDS.time():
+                    await loop.run_in_executor(None, worker.run, n)
+            except Exception as e:
+                logger.error(f"[Inference] worker {worker.index}: {e}")
+                for job in jobs:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                if not worker.process.is_alive():   # crashed (OOM, segfault in TF): replace it
+                    index = self.workers.index(worker)
+                    await loop.run_in_executor(None, worker.close)
+                    worker = await loop.run_in_executor(None, lambda: self._spawn(worker.index).attach())
+                    self.workers[index] = worker
+                continue
+
+            offset = 0
+            for job in jobs:
+                k = job.batch.shape[0]
+                if not job.future.done():
+                    job.future.set_result((worker.features[offset:offset + k].copy(), worker.scores[offset:offset + k].copy()))
+                offset += k
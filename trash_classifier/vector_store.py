@@ -0,0 +1,227 @@
+# trash_classifier/vector_store.py
+''' embeddings of report images, stored as a float16 matrix memory-mapped on disk.
+
+    vectors.f16  (capacity x dim float16, unit length so dot product == cosine)
+    ids.i64      (capacity int64, the post id of every row)
+    meta.json    (dim, count, capacity)
+
+    search is brute force numpy top-k (exact) or an IVF index (k-means buckets, approximate).
+    adds only touch the mapped pages, flush() (msync + meta.json) is the caller's to schedule and is safe
+    to run in a thread next to adds. meta.json is replaced atomically and written after the data it counts,
+    so a crash loses at most the rows added since the last flush, never the store.
+'''
+
+import json
+import os
+import threading
+import numpy as np
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+#indices of the k largest scores, sorted best first
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+class VectorStore:
+    CHUNK_ROWS = 65536      # rows scored at once, keeps the float32 copy small even at 1M vectors
+
+    def __init__(self, path: str, dim: int, initial_capacity: int = 1024):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.meta_path = os.path.join(path, "meta.json")
+        self.vectors_path = os.path.join(path, "vectors.f16")
+        self.ids_path = os.path.join(path, "ids.i64")
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if meta["dim"] != dim:
+                raise ValueError(f"Vector store at {path} has dim {meta['dim']}, model gives {dim}")
+        else:
+            meta = {"dim": dim, "count": 0, "capacity": initial_capacity}
+
+        self.dim = dim
+        self.count = meta["count"]
+        self.capacity = meta["capacity"]
+        self._open()
+        self.rows = {int(item_id): row for row, item_id in enumerate(self.ids[:self.count])}
+        self.ivf = None
+        self.dirty = False
+        self.lock = threading.RLock()   # adds vs the snapshot a flush takes
+
+    def _open(self):
+        mode = "r+" if os.path.exists(self.vectors_path) else "w+"
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float16, mode=mode, shape=(self.capacity, self.dim))
+        self.ids = np.memmap(self.ids_path, dtype=np.int64, mode=mode, shape=(self.capacity,))
+
+    def _meta(self) -> dict:
+        return {"dim": self.dim, "count": self.count, "capacity": self.capacity}
+
+    #temp file + rename, a crash mid-write leaves the old meta.json in place
+    def _save_meta(self, meta: dict):
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.meta_path)
+
+    def _grow(self, needed: int):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        self.flush()   # under the lock already (add_batch), the lock is reentrant
+        del self.vectors, self.ids
+        for path, row_bytes in ((self.vectors_path, self.dim * 2), (self.ids_path, 8)):
+            with open(path, "r+b") as f:
+                f.truncate(capacity * row_bytes)
+        self.capacity = capacity
+        self._open()
+
+    def flush(self):
+        with self.lock:
+            vectors, ids, meta = self.vectors, self.ids, self._meta()
+            self.dirty = False
+        vectors.flush()
+        ids.flush()
+        self._save_meta(meta)
+
+    def __len__(self):
+        return self.count
+
+    #adds or replaces vectors, one row per id. nothing is written to disk here, see flush()
+    def add_batch(self, item_ids, matrix: np.ndarray):
+        matrix = normalize(np.atleast_2d(matrix))
+        with self.lock:
+            new = [i for i in dict.fromkeys(int(i) for i in item_ids) if i not in self.rows]
+            if self.count + len(new) > self.capacity:
+                self._grow(self.count + len(new))
+            for item_id in new:
+                self.rows[item_id] = self.count
+                self.ids[self.count] = item_id
+                self.count += 1
+
+            rows = np.array([self.rows[int(i)] for i in item_ids], dtype=np.int64)
+            self.vectors[rows] = matrix.astype(np.float16)
+            if self.ivf is not None:
+                self.ivf.assign(rows, matrix)
+            self.dirty = True
+
+    def add(self, item_id: int, vector: np.ndarray):
+        self.add_batch([item_id], vector)
+
+    def get(self, item_id: int):
+        row = self.rows.get(int(item_id))
+        return None if row is None else np.asarray(self.vectors[row], dtype=np.float32)
+
+    #exact cosine top-k over every row, chunked so memory stays flat
+    def search(self, query: np.ndarray, k: int = 10, exclude_id: int = None):
+        q = normalize(query).ravel()
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, self.count, self.CHUNK_ROWS):
+            end = min(start + self.CHUNK_ROWS, self.count)
+            scores = np.asarray(self.vectors[start:end], dtype=np.float32) @ q
+            keep = top_k(scores, k + 1)
+            best_rows = np.concatenate([best_rows, keep + start])
+            best_scores = np.concatenate([best_scores, scores[keep]])
+        order = top_k(best_scores, k + 1)
+        return self._results(best_rows[order], best_scores[order], k, exclude_id)
+
+    def _results(self, rows, scores, k, exclude_id):
+        results = []
+        for row, score in zip(rows, scores):
+            item_id = int(self.ids[row])
+            if item_id == exclude_id:
+                continue
+            results.append((item_id, float(score)))
+        return results[:k]
+
+    def build_ivf(self, nlist: int = 256, nprobe: int = 8, iterations: int = 10):
+        self.ivf = IVFIndex(self, nlist=nlist, nprobe=nprobe)
+        self.ivf.train(iterations)
+        return self.ivf
+
+    #approximate search through the IVF index when there is one, exact otherwise
+    def search_approx(self, query: np.ndarray, k: int = 10, exclude_id: int = None):
+        if self.ivf is None:
+            return self.search(query, k, exclude_id)
+        rows, scores = self.ivf.search(normalize(query).ravel(), k + 1)
+        return self._results(rows, scores, k, exclude_id)
+
+
+class IVFIndex:
+    ''' inverted file index: spherical k-means puts every vector in one of nlist buckets,
+        a query only scores the vectors in its nprobe closest buckets
+    '''
+
+    def __init__(self, store: VectorStore, nlist: int = 256, nprobe: int = 8):
+        self.store = store
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        self.lists = []
+        self.labels = np.empty(0, dtype=np.int64)   # bucket of every row, -1 = not assigned yet
+
+    def _nearest(self, matrix: np.ndarray) -> np.ndarray:
+        return np.argmax(matrix @ self.centroids.T, axis=1)
+
+    def train(self, iterations: int = 10, sample_size: int = 50000, seed: int = 0):
+        store = self.store
+        rng = np.random.default_rng(seed)
+        nlist = max(1, min(self.nlist, store.count))
+        sample_rows = rng.choice(store.count, size=min(sample_size, store.count), replace=False)
+        sample = np.asarray(store.vectors[np.sort(sample_rows)], dtype=np.float32)
+
+        self.centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+        for _ in range(iterations):
+            labels = self._nearest(sample)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    self.centroids[c] = members.mean(axis=0)
+            self.centroids = normalize(self.centroids)
+
+        #assign every stored row in chunks
+        labels = np.empty(store.count, dtype=np.int64)
+        for start in range(0, store.count, store.CHUNK_ROWS):
+            end = min(start + store.CHUNK_ROWS, store.count)
+            labels[start:end] = self._nearest(np.asarray(store.vectors[start:end], dtype=np.float32))
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(nlist + 1))
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(nlist)]
+        self.labels = labels
+
+    #new or replaced rows after training
+    def assign(self, rows: np.ndarray, matrix: np.ndarray):
+        if rows.max() >= len(self.labels):
+            grown = np.full(max(rows.max() + 1, 2 * len(self.labels)), -1, dtype=np.int64)
+            grown[:len(self.labels)] = self.labels
+            self.labels = grown
+        for row, label in zip(rows, self._nearest(matrix)):
+            old = self.labels[row]
+            if old == label:
+                continue
+            if old >= 0:
+                self.lists[old] = self.lists[old][self.lists[old] != row]
+            self.lists[label] = np.append(self.lists[label], row)
+            self.labels[row] = label
+
+    def search(self, q: np.ndarray, k: int):
+        probes = top_k(self.centroids @ q, self.nprobe)
+        rows = np.concatenate([self.lists[c] for c in probes]) if len(probes) else np.empty(0, dtype=np.int64)
+        if not len(rows):
+            return rows, np.empty(0, dtype=np.float32)
+        rows = np.sort(rows)    # sequential reads from the memmap
+        scores = np.asarray(self.store.vectors[rows], dtype=np.float32) @ q
+        keep = top_k(scores, k)
+        return rows[keep], scores[keep]
@@ -0,0 +1,58 @@
+# trash_classifier/verification.py
+
+''' POST /verify_cleanup: the original report, the volunteer's "before" photo and the "after" photo in one call.
+
+    the original (classified when the post was made) and the start photo (classified at start_work) may
+    already be in PredictionCache. the cache is per worker process, so that only helps when the same worker
+    classified them (always with one worker, about 1 in N with N). whatever is missing goes through the
+    model as ONE batch, so a verification costs a single forward pass of at most 3 images.
+
+    cleanliness_delta: the reported waste class's probability before minus after, in [-1, 1]. "before" is
+    the start photo when there is one, else the original. the model only knows waste types and has no
+    "clean" class, so this measures how much the end photo stopped looking like THAT waste type: a photo of
+    different trash also scores high, a clean spot the model still calls some waste can score low. it is a
+    hint for the author approving the work, not a payout.
+'''
+
+import os
+from collections import OrderedDict
+import numpy as np
+
+import metrics
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "4096"))
+
+
+class PredictionCache:
+    ''' LRU of softmax scores by image url, per worker process. an upload is never overwritten (a new
+        photo gets a new public_id), so a url keeps meaning the same pixels
+    '''
+
+    def __init__(self, size: int = PREDICTION_CACHE_SIZE):
+        self.size = size
+        self.scores = OrderedDict()
+
+    def get(self, url: str):
+        scores = self.scores.get(url)
+        if scores is None:
+            metrics.PREDICTION_CACHE.labels("miss").inc()
+            return None
+        self.scores.move_to_end(url)
+        metrics.PREDICTION_CACHE.labels("hit").inc()
+        return scores
+
+    def put(self, url: str, scores: np.ndarray):
+        if not url or self.size <= 0:
+            return
+        self.scores[url] = scores
+        self.scores.move_to_end(url)
+        if len(self.scores) > self.size:
+            self.scores.popitem(last=False)
+
+    def __len__(self):
+        return len(self.scores)
+
+
+def cleanliness_delta(before: np.ndarray, after: np.ndarray) -> float:
+    reported = int(np.argmax(before))
+    return float(before[reported] - after[reported])